@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: payload size and encode time of the tabular result formats
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pydantic_core
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data.encoding import RESULT_FORMATS, encode_page, json_dumps
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """Generate a frame with numeric, string, date and missing values"""
+    rng = np.random.default_rng(0)
+    amount = rng.normal(100, 25, rows).round(2)
+    amount[::50] = np.nan
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'amount': amount,
+        'quantity': rng.integers(0, 1000, rows),
+        'region': rng.choice(['north', 'south', 'east', 'west'], rows),
+        'customer': [f'customer-{i % 5000}' for i in range(rows)],
+        'created': pd.date_range('2020-01-01', periods=rows, freq='min'),
+    })
+
+
+def timed(fn, repeat: int):
+    """Return the result and the fastest of ``repeat`` runs in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def report(name: str, encode, repeat: int) -> None:
+    payload, encode_time = timed(encode, repeat)
+    # pydantic-core is what the MCP SDK serializes tool results with; the Flask routes use orjson
+    body, sdk_time = timed(lambda: pydantic_core.to_json(payload), repeat)
+    _, orjson_time = timed(lambda: json_dumps(payload), repeat)
+    print(f"{name:<18} {len(body) / 1e6:>10.1f} {encode_time * 1000:>11.1f} "
+          f"{sdk_time * 1000:>13.1f} {orjson_time * 1000:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    print(f"{'format':<18} {'size (MB)':>10} {'encode (ms)':>11} {'pydantic (ms)':>13} {'orjson (ms)':>11}")
+    # The previous layout: to_dict() records (NaN and Timestamps passed through as-is)
+    report('records (to_dict)', lambda: {'data': df.to_dict(orient='records')}, args.repeat)
+    for fmt in RESULT_FORMATS:
+        report(fmt, lambda: encode_page(df, fmt), args.repeat)
+    # What jsonify did for the Flask routes before
+    _, stdlib_time = timed(lambda: json.dumps({'data': df.to_dict(orient='records')}, default=str), 1)
+    print(f"\nstdlib json of to_dict records: {stdlib_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
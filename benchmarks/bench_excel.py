@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Excel parse time per engine, and concurrent parses in threads vs. worker processes
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data.excel import ENGINE_PREFERENCE, ExcelLoader, engine_available, read_excel
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """Generate a frame with numeric, string and date columns"""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'amount': rng.normal(100, 25, rows).round(2),
+        'quantity': rng.integers(0, 1000, rows),
+        'region': rng.choice(['north', 'south', 'east', 'west'], rows),
+        'customer': [f'customer-{i % 5000}' for i in range(rows)],
+        'created': pd.date_range('2020-01-01', periods=rows, freq='min'),
+    })
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.xlsx')
+        make_frame(args.rows).to_excel(path, index=False)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 1e6:.1f} MB workbook\n")
+
+        print(f"{'engine':<10} {'parse (ms)':>10}")
+        engines = [engine for engine in ENGINE_PREFERENCE['.xlsx'] if engine_available(engine)]
+        for engine in engines:
+            print(f"{engine:<10} {timed(lambda: read_excel(path, engine=engine)) * 1000:>10.1f}")
+
+        n = args.concurrency
+        print(f"\n{n} concurrent parses (default engine {engines[0]})")
+        with ThreadPoolExecutor(n) as threads:
+            in_threads = timed(lambda: list(threads.map(lambda _: read_excel(path), range(n))))
+        loader = ExcelLoader(processes=n)
+        try:
+            with ThreadPoolExecutor(n) as threads:
+                # The first round starts the worker processes
+                list(threads.map(lambda _: loader.read(path), range(n)))
+                in_processes = timed(lambda: list(threads.map(lambda _: loader.read(path), range(n))))
+        finally:
+            loader.shutdown()
+        print(f"{'threads':<10} {in_threads * 1000:>10.1f} ms")
+        print(f"{'processes':<10} {in_processes * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark: policy decisions/sec of the compiled Rego engine vs. the old if/elif chain and an HTTP round trip
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from policy.batch import allow_bitmap, batch_inputs
+from policy.cache import DecisionCache
+from policy.rego import PolicyEngine
+
+POLICY_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'policies'))
+
+INPUTS = [
+    ('simple', {'user': {'role': 'admin'}, 'action': 'write'}),
+    ('simple', {'user': {'role': 'user'}, 'action': 'write'}),
+    ('advanced', {'user': {'role': 'user', 'department': 'eng'}, 'action': 'write',
+                  'document': {'department': 'eng'}}),
+    ('advanced', {'user': {'role': 'guest'}, 'action': 'read', 'document': {'department': 'ops'}}),
+    ('attribute_based', {'user': {'role': 'user', 'clearance_level': 2, 'groups': ['hr', 'eng']},
+                         'document': {'classification_level': 3, 'group': 'eng'}}),
+    ('attribute_based', {'user': {'role': 'user', 'clearance_level': 1, 'groups': ['hr']},
+                         'document': {'classification_level': 3, 'group': 'eng'}}),
+]
+
+
+def legacy_chain(policy_name, input_data):
+    """The hand-written evaluation evaluate_opa_policy used before the policies were compiled"""
+    if policy_name == "simple":
+        user_role = input_data.get("user", {}).get("role", "")
+        action = input_data.get("action", "")
+        return user_role == "admin" or (user_role == "user" and action == "read")
+    if policy_name == "advanced":
+        user_role = input_data.get("user", {}).get("role", "")
+        user_department = input_data.get("user", {}).get("department", "")
+        doc_department = input_data.get("document", {}).get("department", "")
+        action = input_data.get("action", "")
+        return (user_role == "admin" or (user_role == "user" and action == "read")
+                or (user_role == "user" and action == "write" and user_department == doc_department))
+    if policy_name == "attribute_based":
+        user_role = input_data.get("user", {}).get("role", "")
+        user_clearance = input_data.get("user", {}).get("clearance_level", 0)
+        doc_classification = input_data.get("document", {}).get("classification_level", 0)
+        return user_role == "admin" or (user_role == "user" and user_clearance >= doc_classification)
+    return False
+
+
+def serve_decisions(engine):
+    """Serve OPA's data API (POST /v1/data/<package>/<rule>) from the engine on a local port"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out as separate writes; don't let Nagle hold the body back
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            package, rule = self.path[len("/v1/data/"):].rsplit("/", 1)
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            payload = json.dumps({"result": engine.evaluate(package.replace("/", "."), body["input"], rule)})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def http_decider(url):
+    """Ask an OPA-compatible server over one keep-alive connection, as a sidecar client would"""
+    parsed = urllib.parse.urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port)
+    connection.connect()
+    connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def decide(policy_name, input_data):
+        connection.request("POST", f"/v1/data/{policy_name}/allow", json.dumps({"input": input_data}),
+                           {"Content-Type": "application/json"})
+        return json.loads(connection.getresponse().read()).get("result", False)
+    return decide
+
+
+def rate(decide, decisions):
+    """Return decisions per second over ``decisions`` calls cycling through INPUTS"""
+    start = time.perf_counter()
+    for i in range(decisions):
+        decide(*INPUTS[i % len(INPUTS)])
+    return decisions / (time.perf_counter() - start)
+
+
+def batch_vs_calls(engine, size):
+    """Authorize ``size`` documents for one user: one call per document vs. one batch call"""
+    subject = {'user': {'role': 'user', 'clearance_level': 2, 'groups': ['eng']}, 'action': 'read'}
+    documents = [{'id': i, 'classification_level': i % 4, 'group': ('eng', 'hr', 'ops')[i % 3]} for i in range(size)]
+
+    start = time.perf_counter()
+    responses = []
+    for document in documents:
+        input_data = {**subject, 'document': document}
+        responses.append({"allowed": engine.evaluate('attribute_based', input_data) is True,
+                          "policy": 'attribute_based', "input": input_data})
+    separate = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = {"policy": 'attribute_based', **allow_bitmap(
+        engine.evaluate_many('attribute_based', batch_inputs(subject=subject, resources=documents),
+                             vary='document'))}
+    batched = time.perf_counter() - start
+    print(f"\n{size:,} documents for one user")
+    print(f"{'':<26} {'ms':>12} {'response KB':>12}")
+    print(f"{'separate calls':<26} {separate * 1000:>12.1f} {len(json.dumps(responses)) / 1024:>12.1f}")
+    print(f"{'one batch call':<26} {batched * 1000:>12.1f} {len(json.dumps(batch)) / 1024:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--decisions', type=int, default=200_000)
+    parser.add_argument('--http-decisions', type=int, default=2_000)
+    parser.add_argument('--batch', type=int, default=10_000, help='documents authorized for one user')
+    parser.add_argument('--opa-url', help='also benchmark a running OPA server, e.g. http://localhost:8181')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = PolicyEngine.from_directory(POLICY_DIR)
+    print(f"compiled {len(engine.policies)} policies in {(time.perf_counter() - start) * 1000:.2f} ms\n")
+
+    def compiled(policy_name, input_data):
+        return engine.evaluate(policy_name, input_data) is True
+
+    cache = DecisionCache()
+
+    def cached(policy_name, input_data):
+        return cache.decide(engine.decision_key(policy_name, input_data), engine.revision,
+                            lambda: compiled(policy_name, input_data))
+
+    print(f"{'evaluator':<26} {'decisions/s':>12} {'us/decision':>12}")
+    results = [("if/elif chain", rate(legacy_chain, args.decisions)),
+               ("compiled rego", rate(compiled, args.decisions)),
+               ("compiled rego + cache", rate(cached, args.decisions))]
+    server, url = serve_decisions(engine)
+    http = http_decider(url)
+    results.append(("http round trip (local)", rate(http, args.http_decisions)))
+    http_cache = DecisionCache()
+
+    def http_cached(policy_name, input_data):
+        return http_cache.decide((policy_name, engine.decision_key(policy_name, input_data)), "",
+                                 lambda: http(policy_name, input_data))
+    results.append(("http + cache (local)", rate(http_cached, args.http_decisions)))
+    server.shutdown()
+    if args.opa_url:
+        results.append(("http round trip (opa)", rate(http_decider(args.opa_url), args.http_decisions)))
+    for name, per_second in results:
+        print(f"{name:<26} {per_second:>12,.0f} {1e6 / per_second:>12.2f}")
+    batch_vs_calls(engine, args.batch)
+    stats = http_cache.stats()
+    print(f"\nhttp cache: hit ratio {stats['hit_ratio']:.3f}, saved {stats['saved_seconds'] * 1000:.0f} ms "
+          f"of {stats['mean_evaluation_ms']:.3f} ms round trips")
+
+
+if __name__ == "__main__":
+    main()
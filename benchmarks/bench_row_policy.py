@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: row-level security on a large table, per-row policy evaluation vs. the vectorized mask
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data.cache import DatasetCache
+from policy.rego import PolicyEngine
+from policy.rows import row_mask, subject_key
+
+POLICY_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'policies'))
+SUBJECT = {'user': {'role': 'user', 'clearance_level': 2, 'groups': ['eng', 'finance']}}
+
+
+def make_frame(rows: int, categorical: bool) -> pd.DataFrame:
+    """Generate documents with a classification level and an owning group"""
+    rng = np.random.default_rng(0)
+    groups = rng.choice(['eng', 'hr', 'ops', 'finance', 'legal', 'sales'], rows)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'classification_level': rng.integers(0, 5, rows),
+        'group': pd.Categorical(groups) if categorical else groups,
+        'title': [f'document-{i}' for i in range(rows)],
+    })
+
+
+def timed(fn, repeat: int):
+    """Return the result and the fastest of ``repeat`` runs in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--sample', type=int, default=50_000, help='rows evaluated one by one, then extrapolated')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    policy = PolicyEngine.from_directory(POLICY_DIR).policies['attribute_based']
+    print(f"{args.rows:,} rows, subject {SUBJECT}\n")
+    print(f"{'group column':<14} {'method':<22} {'ms':>10} {'rows allowed':>14}")
+    for categorical in (False, True):
+        frame = make_frame(args.rows, categorical)
+        label = 'category' if categorical else 'object'
+
+        # Per-row evaluation, as a loop over evaluate_opa_policy would do it
+        records = frame[['classification_level', 'group']].head(args.sample).astype(object).to_dict('records')
+        _, per_row = timed(lambda: [policy.evaluate({**SUBJECT, 'document': row}) for row in records], 1)
+        per_row *= args.rows / len(records)
+        print(f"{label:<14} {'per-row (extrapolated)':<22} {per_row * 1000:>10.0f} {'':>14}")
+
+        mask, vectorized = timed(lambda: row_mask(policy, frame, SUBJECT), args.repeat)
+        print(f"{label:<14} {'vectorized mask':<22} {vectorized * 1000:>10.1f} {int(mask.sum()):>14,}")
+
+        # What read_csv_excel does: positions cached with the dataset per subject attributes
+        cache = DatasetCache(max_bytes=4 * 1024 ** 3)
+        entry = cache.put('documents.csv', frame, (0, 0))
+        name = ('policy', 'attribute_based', '', subject_key(policy, SUBJECT))
+        compute = lambda df: np.flatnonzero(row_mask(policy, df, SUBJECT))
+        cache.derive(entry, name, compute)
+        _, cached = timed(lambda: cache.derive(entry, name, compute), args.repeat)
+        _, page = timed(lambda: frame.take(cache.derive(entry, name, compute)[:100]), args.repeat)
+        print(f"{label:<14} {'cached positions':<22} {cached * 1000:>10.3f}")
+        print(f"{label:<14} {'100-row page, cached':<22} {page * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reload time from a columnar sidecar vs. raw CSV/Excel parsing
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data.loader import read_frame
+from data.sidecar import SidecarStore
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """Generate a frame with numeric, string and date columns"""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'amount': rng.normal(100, 25, rows).round(2),
+        'quantity': rng.integers(0, 1000, rows),
+        'region': rng.choice(['north', 'south', 'east', 'west'], rows),
+        'customer': [f'customer-{i % 5000}' for i in range(rows)],
+        'created': pd.date_range('2020-01-01', periods=rows, freq='min').astype(str),
+    })
+
+
+def best_of(fn, repeat: int) -> float:
+    """Return the fastest of ``repeat`` runs in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench(path: str, store: SidecarStore, repeat: int) -> None:
+    parse = best_of(lambda: read_frame(path), repeat)
+    store.read_through(path, read_frame)
+    digest = store.digest(path)
+    reload = best_of(lambda: store.load(digest), repeat)
+    name = os.path.basename(path)
+    size = os.path.getsize(path) / 1e6
+    sidecar = os.path.getsize(store.path_for(digest)) / 1e6
+    print(f"{name:<14} {size:>9.1f} {sidecar:>11.1f} {parse * 1000:>10.1f} {reload * 1000:>11.1f} {parse / reload:>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--csv-rows', type=int, default=1_000_000)
+    parser.add_argument('--excel-rows', type=int, default=50_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SidecarStore(os.path.join(tmp, 'sidecars'), 16 * 1024 ** 3)
+        if not store.enabled:
+            sys.exit("pyarrow is required for sidecars")
+        csv_path = os.path.join(tmp, 'data.csv')
+        make_frame(args.csv_rows).to_csv(csv_path, index=False)
+        xlsx_path = os.path.join(tmp, 'data.xlsx')
+        make_frame(args.excel_rows).to_excel(xlsx_path, index=False)
+
+        print(f"{'file':<14} {'size (MB)':>9} {'sidecar MB':>11} {'parse (ms)':>10} {'reload (ms)':>11} {'speedup':>9}")
+        bench(csv_path, store, args.repeat)
+        bench(xlsx_path, store, 1)
+
+
+if __name__ == "__main__":
+    main()
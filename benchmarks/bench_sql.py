@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: a join + aggregation through sql_query's engines vs. the equivalent pandas chain
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data.sql import SqliteSnapshot, duckdb, run_duckdb, run_sqlite
+
+QUERY = """
+SELECT c.region, COUNT(*) AS orders, SUM(o.amount) AS revenue
+FROM orders o JOIN customers c ON c.customer_id = o.customer_id
+WHERE o.quantity > 100
+GROUP BY c.region
+ORDER BY revenue DESC
+"""
+
+
+def make_frames(rows: int, customers: int):
+    """Generate an orders fact table and a customers dimension table"""
+    rng = np.random.default_rng(0)
+    orders = pd.DataFrame({
+        'order_id': np.arange(rows),
+        'customer_id': rng.integers(0, customers, rows),
+        'amount': rng.normal(100, 25, rows).round(2),
+        'quantity': rng.integers(0, 1000, rows),
+    })
+    regions = np.array(['north', 'south', 'east', 'west'])
+    customer_frame = pd.DataFrame({
+        'customer_id': np.arange(customers),
+        'region': regions[rng.integers(0, len(regions), customers)],
+    })
+    return orders, customer_frame
+
+
+def pandas_chain(orders: pd.DataFrame, customers: pd.DataFrame) -> pd.DataFrame:
+    """What a client does today: filter, then join and aggregate the downloaded frames"""
+    filtered = orders[orders['quantity'] > 100]
+    joined = filtered.merge(customers, on='customer_id')
+    result = joined.groupby('region').agg(orders=('order_id', 'size'), revenue=('amount', 'sum'))
+    return result.reset_index().sort_values('revenue', ascending=False)
+
+
+def timed(fn, repeat: int):
+    """Return the result and the fastest of ``repeat`` runs in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--customers', type=int, default=50_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    orders, customers = make_frames(args.rows, args.customers)
+    print(f"{args.rows} orders x {args.customers} customers\n")
+    print(f"{'engine':<22} {'time (ms)':>10}")
+
+    expected, pandas_time = timed(lambda: pandas_chain(orders, customers), args.repeat)
+    print(f"{'pandas chain':<22} {pandas_time * 1000:>10.1f}")
+
+    snapshots, build_time = timed(
+        lambda: {'orders': SqliteSnapshot(orders), 'customers': SqliteSnapshot(customers)}, 1)
+    print(f"{'sqlite snapshot build':<22} {build_time * 1000:>10.1f}")
+    (result, _), query_time = timed(lambda: run_sqlite(QUERY, snapshots, 1000, 600), args.repeat)
+    print(f"{'sqlite query':<22} {query_time * 1000:>10.1f}")
+    assert result['orders'].tolist() == expected['orders'].tolist()
+
+    if duckdb is not None:
+        frames = {'orders': orders, 'customers': customers}
+        (result, _), duck_time = timed(lambda: run_duckdb(QUERY, frames, 1000, 600), args.repeat)
+        print(f"{'duckdb query':<22} {duck_time * 1000:>10.1f}")
+        assert result['orders'].tolist() == expected['orders'].tolist()
+    else:
+        print(f"{'duckdb query':<22} {'not installed':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory of numpy-backed vs. Arrow-backed vs. memory-mapped frames on a wide CSV
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, SRC)
+
+from data.cache import frame_nbytes
+from data.loader import read_frame
+from data.sidecar import SidecarStore
+
+MODES = ("numpy", "arrow", "arrow-mmap")
+
+
+def make_wide_csv(path: str, rows: int) -> None:
+    """Write a CSV shaped like our exports: many string columns plus numerics and dates"""
+    rng = np.random.default_rng(0)
+    columns = {}
+    for i in range(12):
+        cardinality = [10, 1000, rows][i % 3]
+        columns[f'label_{i}'] = pd.Series(rng.integers(0, cardinality, rows)).map(lambda v: f'value-{v:08d}')
+    for i in range(10):
+        columns[f'metric_{i}'] = rng.normal(0, 1, rows).round(4)
+    for i in range(4):
+        columns[f'count_{i}'] = rng.integers(0, 10_000, rows)
+    for i in range(4):
+        columns[f'date_{i}'] = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1500, rows), unit='D')
+    pd.DataFrame(columns).to_csv(path, index=False)
+
+
+def rss() -> dict:
+    """Return resident memory split into private (anon) and file-backed pages, in MB"""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+def measure(mode: str, csv_path: str, sidecar_dir: str) -> dict:
+    """Load the CSV in one storage mode and report memory figures"""
+    gc.collect()
+    before = rss()
+    start = time.perf_counter()
+    if mode == "arrow-mmap":
+        store = SidecarStore(sidecar_dir, 1 << 40)
+        frame = store.read_through(csv_path, lambda p: read_frame(p, "arrow"), namespace="arrow", arrow_backed=True)
+    else:
+        frame = read_frame(csv_path, mode)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    after = rss()
+    return {
+        "mode": mode,
+        "seconds": elapsed,
+        "deep_mb": frame_nbytes(frame) / 1e6,
+        "rss_mb": after['VmRSS'] - before['VmRSS'],
+        "private_mb": after['RssAnon'] - before['RssAnon'],
+        "shared_mb": after['RssFile'] - before['RssFile'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--measure', nargs=3, metavar=('MODE', 'CSV', 'SIDECAR_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'wide.csv')
+        make_wide_csv(csv_path, args.rows)
+        sidecar_dir = os.path.join(tmp, 'sidecars')
+        # Write the sidecar up front so the mmap run measures a warm reload
+        SidecarStore(sidecar_dir, 1 << 40).read_through(csv_path, lambda p: read_frame(p, "arrow"), namespace="arrow")
+
+        print(f"wide.csv: {args.rows} rows x 30 columns, {os.path.getsize(csv_path) / 1e6:.1f} MB")
+        print(f"{'mode':<12} {'load (s)':>9} {'deep MB':>9} {'RSS MB':>9} {'private MB':>11} {'shared MB':>10}")
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, __file__, '--measure', mode, csv_path, sidecar_dir],
+                check=True, capture_output=True, text=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{r['mode']:<12} {r['seconds']:>9.2f} {r['deep_mb']:>9.1f} {r['rss_mb']:>9.1f} "
+                  f"{r['private_mb']:>11.1f} {r['shared_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Grouped aggregations over cached datasets
+"""
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .query import QueryError
+
+AGGREGATE_FUNCS = ("count", "size", "sum", "mean", "min", "max", "nunique", "quantile")
+NUMERIC_FUNCS = ("sum", "mean", "quantile")
+
+
+def compile_aggregations(by: Union[str, Sequence[str]], aggregations: Sequence[Mapping[str, Any]],
+                         df: pd.DataFrame) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Validate aggregation specs against a frame and fill in default aliases
+
+    Each spec is ``{"func": ..., "column": ..., "alias": ...}``; ``quantile``
+    also takes ``q`` in [0, 1] and ``size`` counts rows so needs no column.
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    if not keys:
+        raise QueryError("At least one group-by column is required")
+    missing = [key for key in keys if key not in df.columns]
+    if missing:
+        raise QueryError(f"Unknown group-by columns: {', '.join(map(str, missing))}")
+    if not aggregations:
+        raise QueryError("At least one aggregation is required")
+    compiled = []
+    for i, spec in enumerate(aggregations):
+        path = f"aggregations[{i}]"
+        func = spec.get("func")
+        if func not in AGGREGATE_FUNCS:
+            raise QueryError(f"{path}: unknown function {func!r}; expected one of {', '.join(AGGREGATE_FUNCS)}")
+        column = spec.get("column")
+        if func != "size" and column not in df.columns:
+            raise QueryError(f"{path}: unknown column {column!r}")
+        if func in NUMERIC_FUNCS and not pd.api.types.is_numeric_dtype(df[column]):
+            raise QueryError(f"{path}: {func} needs a numeric column")
+        q = None
+        if func == "quantile":
+            q = spec.get("q")
+            if isinstance(q, bool) or not isinstance(q, (int, float)) or not 0 <= q <= 1:
+                raise QueryError(f"{path}: quantile needs q between 0 and 1")
+        if func == "size":
+            default_alias = "size"
+        elif func == "quantile":
+            default_alias = f"{column}_p{q * 100:g}"
+        else:
+            default_alias = f"{column}_{func}"
+        compiled.append({"func": func, "column": column, "q": q, "alias": spec.get("alias") or default_alias})
+    aliases = [spec["alias"] for spec in compiled]
+    if len(set(aliases)) != len(aliases) or set(aliases) & set(keys):
+        raise QueryError("Aggregation aliases must be unique and differ from the group-by columns")
+    return keys, compiled
+
+
+def aggregate_frame(df: pd.DataFrame, keys: List[str], specs: List[Dict[str, Any]],
+                    positions: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """Run compiled aggregations grouped by key columns, one row per group
+
+    Every aggregation uses pandas' vectorized groupby kernels over a single
+    grouping; only the key and aggregated columns are touched.
+    """
+    needed = list(dict.fromkeys(keys + [spec["column"] for spec in specs if spec["func"] != "size"]))
+    source = df[needed]
+    if positions is not None:
+        # Select the rows first so only they are widened below
+        source = source.take(positions)
+    narrow = {c: np.float64 for c in needed if c not in keys and source[c].dtype == np.float32}
+    if narrow:
+        # Downcast float32 columns (see data.dtypes) hold exact float64 values;
+        # widen them so sums and means accumulate at full precision
+        source = source.astype(narrow)
+    grouped = source.groupby(keys, sort=True, observed=True, dropna=False)
+    results = {}
+    for spec in specs:
+        func, column = spec["func"], spec["column"]
+        if func == "size":
+            results[spec["alias"]] = grouped.size()
+        elif func == "quantile":
+            results[spec["alias"]] = grouped[column].quantile(spec["q"])
+        else:
+            results[spec["alias"]] = grouped[column].agg(func)
+    return pd.DataFrame(results).reset_index()
@@ -0,0 +1,405 @@
+"""
+Dataset cache for the MCP Server
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (inode, size, mtime_ns) of a file; any change means the cached frame is stale
+FileSignature = Tuple[int, int, int]
+
+EVICTION_POLICIES = ("lru", "lfu")
+# Bytes compared at each end of a file's old contents to tell an append from a rewrite
+FINGERPRINT_BYTES = 4096
+
+# Extends a cached dataset whose file grew: returns the new frame and the derived
+# values that stay valid, or None when the file has to be parsed again
+Appender = Callable[["CachedDataset", FileSignature], Optional[Tuple[pd.DataFrame, Dict[Hashable, Any]]]]
+
+
+def file_signature(file_path: str) -> FileSignature:
+    """Return the signature used to detect that a file changed on disk"""
+    st = os.stat(file_path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def prefix_fingerprint(file_path: str, size: int) -> str:
+    """Hash the first and the last few KB of the first ``size`` bytes of a file
+
+    A file that was only appended to keeps the fingerprint of its old size;
+    rewriting it almost always changes one of the two blocks.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(min(size, FINGERPRINT_BYTES))
+        start = max(size - FINGERPRINT_BYTES, 0)
+        f.seek(start)
+        tail = f.read(size - start)
+    return hashlib.sha1(head + b"\0" + tail).hexdigest()
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Return the deep memory usage of a DataFrame in bytes"""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def object_nbytes(value: Any) -> int:
+    """Return the memory usage of a derived value stored next to a dataset"""
+    if isinstance(value, pd.DataFrame):
+        return frame_nbytes(value)
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    # numpy arrays and helper structures such as column indexes expose nbytes
+    return int(getattr(value, "nbytes", 0))
+
+
+def dataset_version(key: str, signature: FileSignature) -> str:
+    """Short identifier of a specific version of a file's contents"""
+    raw = "{}:{}:{}:{}".format(key, *signature)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def cache_key(file_path: str, part: Optional[str] = None) -> str:
+    """Normalize a path so different spellings of the same file share an entry
+
+    ``part`` names one dataset within a file, such as an Excel sheet; each part
+    gets its own entry (and so its own version).
+    """
+    path = os.path.realpath(os.path.expanduser(file_path))
+    return path if part is None else f"{path}[{part}]"
+
+
+@dataclass
+class CachedDataset:
+    """A parsed dataset together with the file signature it was loaded from"""
+    key: str
+    signature: FileSignature
+    frame: pd.DataFrame
+    nbytes: int
+    hits: int = 0
+    # Results computed from the frame (filter positions, sort permutations, ...)
+    derived: Dict[Hashable, Any] = field(default_factory=dict)
+    # prefix_fingerprint() of the parsed bytes; set when the file did not change
+    # while it was parsed, so rows appended later can be parsed on their own
+    fingerprint: Optional[str] = None
+
+    @property
+    def version(self) -> str:
+        """Short identifier of the file contents this frame was parsed from"""
+        return dataset_version(self.key, self.signature)
+
+
+class DatasetCache:
+    """Memory-budgeted cache of parsed datasets keyed by file path
+
+    Entries are invalidated when the file's inode, size or mtime changes and
+    evicted (LRU or LFU) once the deep memory usage of all cached frames
+    exceeds ``max_bytes``. With an ``appender``, a file that only grew (same
+    inode, larger size, unchanged fingerprint of the old contents) is handed
+    to it to parse just the new rows instead of being invalidated.
+    """
+
+    def __init__(self, max_bytes: int, policy: str = "lru", appender: Optional[Appender] = None):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.appender = appender
+        self._entries: "OrderedDict[str, CachedDataset]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Per-file locks so concurrent misses for the same file parse it only once
+        self._loading: Dict[str, threading.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._oversized = 0
+        self._coalesced = 0
+        self._appends = 0
+
+    def get(self, file_path: str, part: Optional[str] = None) -> Optional[CachedDataset]:
+        """Return the cached dataset for a file if it is present and still fresh"""
+        return self._lookup(file_path, part, count=True)
+
+    def refresh(self, file_path: str, part: Optional[str] = None) -> Optional[CachedDataset]:
+        """Bring a cached dataset up to date with its file without counting a lookup
+
+        Returns the fresh entry, or None when it is not cached (any more).
+        """
+        return self._lookup(file_path, part, count=False)
+
+    def _lookup(self, file_path: str, part: Optional[str], count: bool) -> Optional[CachedDataset]:
+        key = cache_key(file_path, part)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += count
+                return None
+            signature = self._signature_or_none(cache_key(file_path))
+            if signature == entry.signature:
+                if count:
+                    entry.hits += 1
+                    self._hits += 1
+                    self._entries.move_to_end(key)
+                return entry
+            if self.appender is None or entry.fingerprint is None or signature is None:
+                logger.info(f"Invalidating cached dataset: {key}")
+                self._remove(key)
+                self._invalidations += 1
+                self._misses += count
+                return None
+        return self._append(entry, signature, count)
+
+    def _appended(self, entry: CachedDataset, signature: FileSignature) -> bool:
+        """Check whether a file only grew since the entry was parsed from it"""
+        if signature[0] != entry.signature[0] or signature[1] <= entry.signature[1]:
+            return False
+        try:
+            return prefix_fingerprint(entry.key, entry.signature[1]) == entry.fingerprint
+        except OSError:
+            return False
+
+    def _append(self, entry: CachedDataset, signature: FileSignature, count: bool) -> Optional[CachedDataset]:
+        """Replace an entry with one extended by the rows appended to its file, or drop it"""
+        with self._single_flight(entry.key):
+            with self._lock:
+                current = self._entries.get(entry.key)
+                if current is not entry:
+                    # Extended (or dropped) by the caller we were waiting for
+                    if current is not None and current.signature == self._signature_or_none(entry.key):
+                        self._coalesced += 1
+                        self._hits += count
+                        return current
+                    self._misses += count
+                    return None
+            extended = None
+            if self._appended(entry, signature):
+                try:
+                    extended = self.appender(entry, signature)
+                except Exception as e:
+                    logger.warning(f"Could not append to cached dataset {entry.key}: {str(e)}")
+            if extended is not None:
+                frame, derived = extended
+                # The appender parsed exactly up to the new signature's size, even if the file grew since
+                replacement = self._entry(entry.key, entry.key, frame, signature, derived,
+                                          entry.hits + count, exact=True)
+            with self._lock:
+                if self._entries.get(entry.key) is entry:
+                    self._remove(entry.key)
+                if extended is None:
+                    logger.info(f"Invalidating cached dataset: {entry.key}")
+                    self._invalidations += 1
+                    self._misses += count
+                    return None
+                logger.info(f"Appended {len(frame) - len(entry.frame)} rows to cached dataset: {entry.key}")
+                self._appends += 1
+                self._hits += count
+                return self._insert(replacement)
+
+    def put(self, file_path: str, frame: pd.DataFrame, signature: FileSignature,
+            part: Optional[str] = None) -> CachedDataset:
+        """Add a dataset to the cache, evicting others to stay within budget"""
+        return self._insert(self._entry(cache_key(file_path, part), cache_key(file_path), frame, signature))
+
+    def _entry(self, key: str, path: str, frame: pd.DataFrame, signature: FileSignature,
+               derived: Optional[Dict[Hashable, Any]] = None, hits: int = 0,
+               exact: bool = False) -> CachedDataset:
+        derived = dict(derived or {})
+        nbytes = frame_nbytes(frame) + sum(object_nbytes(value) for value in derived.values())
+        entry = CachedDataset(key=key, signature=signature, frame=frame, nbytes=nbytes, hits=hits, derived=derived)
+        # Only a frame parsed from exactly the bytes the signature describes can be extended
+        if self.appender is not None and (exact or self._signature_or_none(path) == signature):
+            try:
+                entry.fingerprint = prefix_fingerprint(path, signature[1])
+            except OSError:
+                pass
+        return entry
+
+    def _insert(self, entry: CachedDataset) -> CachedDataset:
+        key = entry.key
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if entry.nbytes > self.max_bytes:
+                # Too large to ever fit; hand it back without caching
+                logger.warning(f"Dataset {key} ({entry.nbytes} bytes) exceeds cache budget")
+                self._oversized += 1
+                return entry
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            self._evict(keep=key)
+        return entry
+
+    def get_or_load(self, file_path: str, loader: Callable[[str], pd.DataFrame],
+                    part: Optional[str] = None) -> CachedDataset:
+        """Return the cached dataset for a file, loading it with ``loader`` on a miss"""
+        entry = self.get(file_path, part)
+        if entry is not None:
+            return entry
+        return self.load(file_path, loader, part)
+
+    def load(self, file_path: str, loader: Callable[[str], pd.DataFrame],
+             part: Optional[str] = None) -> CachedDataset:
+        """Parse a file with ``loader`` and add the result to the cache
+
+        Concurrent loads of the same file are coalesced: one caller parses and
+        the others wait for it and share the cached result.
+        """
+        path = cache_key(file_path)
+        key = cache_key(file_path, part)
+        with self._single_flight(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.signature == self._signature_or_none(path):
+                    # Loaded by the caller we were waiting for
+                    self._coalesced += 1
+                    return entry
+            # Take the signature before parsing so a concurrent rewrite invalidates us
+            signature = file_signature(path)
+            frame = loader(path)
+            return self.put(path, frame, signature, part)
+
+    @contextmanager
+    def _single_flight(self, key: str) -> Iterator[None]:
+        """Serialize loads (and appends) of one dataset"""
+        with self._lock:
+            lock = self._loading.setdefault(key, threading.Lock())
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                self._waiters[key] -= 1
+                if not self._waiters[key]:
+                    del self._waiters[key]
+                    del self._loading[key]
+
+    def derive(self, entry: CachedDataset, name: Hashable, compute: Callable[[pd.DataFrame], Any]) -> Any:
+        """Return a value derived from a dataset, computing and caching it on first use
+
+        Derived values count against the memory budget of their dataset and are
+        dropped together with it.
+        """
+        with self._lock:
+            if name in entry.derived:
+                return entry.derived[name]
+        value = compute(entry.frame)
+        with self._lock:
+            if name in entry.derived:
+                return entry.derived[name]
+            self.store(entry, name, value)
+        return value
+
+    def store(self, entry: CachedDataset, name: Hashable, value: Any) -> None:
+        """Attach (or replace) a derived value on a dataset and re-account its memory"""
+        nbytes = object_nbytes(value)
+        with self._lock:
+            if name in entry.derived:
+                nbytes -= object_nbytes(entry.derived[name])
+            entry.derived[name] = value
+            entry.nbytes += nbytes
+            if self._entries.get(entry.key) is entry:
+                self._bytes += nbytes
+                self._evict(keep=entry.key)
+
+    def resize(self, entry: CachedDataset, nbytes: int) -> None:
+        """Account ``nbytes`` more for a derived value of a dataset that grew in place"""
+        with self._lock:
+            entry.nbytes += nbytes
+            if self._entries.get(entry.key) is entry:
+                self._bytes += nbytes
+                self._evict(keep=entry.key)
+
+    def derived_of(self, entry: CachedDataset, kind: str) -> Dict[Any, Any]:
+        """Return derived values stored under ``(kind, name)`` keys, keyed by name"""
+        with self._lock:
+            return {name[1]: value for name, value in entry.derived.items()
+                    if isinstance(name, tuple) and len(name) == 2 and name[0] == kind}
+
+    def discard(self, entry: CachedDataset, name: Hashable) -> None:
+        """Drop a derived value from a dataset"""
+        with self._lock:
+            if name not in entry.derived:
+                return
+            nbytes = object_nbytes(entry.derived.pop(name))
+            entry.nbytes -= nbytes
+            if self._entries.get(entry.key) is entry:
+                self._bytes -= nbytes
+
+    def invalidate(self, file_path: str, part: Optional[str] = None) -> bool:
+        """Drop a dataset from the cache"""
+        key = cache_key(file_path, part)
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            self._invalidations += 1
+            return True
+
+    def keys(self) -> List[str]:
+        """Return the keys of the cached datasets, least recently used first"""
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self) -> None:
+        """Drop every cached dataset"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters for operators"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "policy": self.policy,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "oversized": self._oversized,
+                "coalesced_loads": self._coalesced,
+                "appends": self._appends,
+            }
+
+    @staticmethod
+    def _signature_or_none(key: str) -> Optional[FileSignature]:
+        try:
+            return file_signature(key)
+        except OSError:
+            return None
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.nbytes
+
+    def _evict(self, keep: str) -> None:
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            victim = self._choose_victim(keep)
+            logger.info(f"Evicting cached dataset: {victim}")
+            self._remove(victim)
+            self._evictions += 1
+
+    def _choose_victim(self, keep: str) -> str:
+        candidates = [key for key in self._entries if key != keep]
+        if self.policy == "lfu":
+            # Least hits first; ties go to the least recently used entry
+            return min(candidates, key=lambda key: self._entries[key].hits)
+        return candidates[0]
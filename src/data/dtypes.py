@@ -0,0 +1,154 @@
+"""
+Load-time dtype optimization that shrinks parsed datasets
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Rows inspected to decide each column's target type
+SAMPLE_ROWS = 10_000
+# Strings become categoricals when at most this fraction of sampled values is distinct
+MAX_CATEGORY_RATIO = 0.5
+# Only unambiguous ISO 8601 dates are parsed
+ISO_DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?(?:Z|[+-]\d{2}:?\d{2})?$"
+
+INTEGER_TYPES = (np.int8, np.int16, np.int32)
+
+
+def _sample(df: pd.DataFrame, rows: int) -> pd.DataFrame:
+    if len(df) <= rows:
+        return df
+    positions = np.sort(np.random.default_rng(0).choice(len(df), size=rows, replace=False))
+    return df.iloc[positions]
+
+
+def _integer_target(series: pd.Series) -> Optional[np.dtype]:
+    if not len(series):
+        return None
+    low, high = series.min(), series.max()
+    for candidate in INTEGER_TYPES:
+        info = np.iinfo(candidate)
+        if info.min <= low and high <= info.max:
+            return np.dtype(candidate) if np.dtype(candidate).itemsize < series.dtype.itemsize else None
+    return None
+
+
+def plan_dtypes(df: pd.DataFrame, sample_rows: int = SAMPLE_ROWS,
+                max_category_ratio: float = MAX_CATEGORY_RATIO) -> Dict[Any, str]:
+    """Choose a smaller type for each column, looking only at a sample of rows
+
+    Returns ``{column: target}`` with targets ``int8``/``int16``/``int32``,
+    ``float32``, ``category`` or ``datetime``. Integer ranges use the full
+    column (a vectorized min/max); everything else is decided on the sample
+    and only checked against the full column when it is converted.
+    """
+    sample = _sample(df, sample_rows)
+    plan = {}
+    for column in df.columns:
+        series = df[column]
+        dtype = series.dtype
+        if not isinstance(dtype, np.dtype):
+            continue
+        if dtype.kind == "i":
+            target = _integer_target(series)
+            if target is not None:
+                plan[column] = target.name
+        elif dtype == np.float64:
+            values = sample[column].to_numpy()
+            if np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True):
+                plan[column] = "float32"
+        elif dtype == object:
+            values = sample[column].dropna()
+            if not len(values) or pd.api.types.infer_dtype(values, skipna=False) != "string":
+                continue
+            if values.str.match(ISO_DATE_PATTERN).all():
+                plan[column] = "datetime"
+            elif values.nunique() <= max_category_ratio * len(values):
+                plan[column] = "category"
+    return plan
+
+
+def _convert(series: pd.Series, target: str) -> Optional[pd.Series]:
+    """Convert one column, or return None if the full column does not fit the target"""
+    if target == "float32":
+        converted = series.astype(np.float32)
+        if not np.array_equal(converted.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+            return None
+        return converted
+    if target == "datetime":
+        converted = pd.to_datetime(series, format="ISO8601", errors="coerce")
+        # Any value that did not parse would silently become NaT
+        return converted if converted.isna().sum() == series.isna().sum() else None
+    if target == "category":
+        if pd.api.types.infer_dtype(series, skipna=True) != "string":
+            return None
+        # Categories come out sorted; ordering them keeps string semantics for
+        # sorts, comparisons and min/max
+        return series.astype("category").cat.as_ordered()
+    return series.astype(target)
+
+
+def optimize_frame(df: pd.DataFrame, sample_rows: int = SAMPLE_ROWS,
+                   max_category_ratio: float = MAX_CATEGORY_RATIO) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Downcast numerics, categorize low-cardinality strings and parse ISO dates
+
+    Returns the optimized frame and a report with the dtype and memory usage
+    of every converted column before and after. The previous size of string
+    columns is extrapolated from the sample, since measuring every Python
+    string would cost as much as the conversion itself.
+    """
+    sample = _sample(df, sample_rows)
+    plan = plan_dtypes(df, sample_rows, max_category_ratio)
+    converted = {}
+    columns = {}
+    for column, target in plan.items():
+        series = df[column]
+        result = _convert(series, target)
+        if result is None:
+            continue
+        if series.dtype == object:
+            before = int(sample[column].memory_usage(deep=True, index=False) * len(df) / max(len(sample), 1))
+        else:
+            before = int(series.memory_usage(index=False))
+        after = int(result.memory_usage(deep=True, index=False))
+        if after >= before:
+            continue
+        converted[column] = result
+        columns[str(column)] = {
+            "dtype_before": str(series.dtype),
+            "dtype_after": str(result.dtype),
+            "bytes_before": before,
+            "bytes_after": after,
+        }
+    if converted:
+        df = df.copy(deep=False)
+        for column, series in converted.items():
+            df[column] = series
+    report = {
+        "columns": columns,
+        "bytes_saved": sum(c["bytes_before"] - c["bytes_after"] for c in columns.values()),
+    }
+    return df, report
+
+
+class OptimizationReports:
+    """The most recent optimization report of each dataset, for operators"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._reports: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: str, report: Dict[str, Any]) -> None:
+        with self._lock:
+            self._reports[key] = report
+            self._reports.move_to_end(key)
+            while len(self._reports) > self.max_entries:
+                self._reports.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._reports.get(key)
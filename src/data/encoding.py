@@ -0,0 +1,130 @@
+"""
+Response encodings for tabular tool results
+"""
+import base64
+import datetime
+import decimal
+import json
+import math
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - the arrow format is unavailable without pyarrow
+    pa = None
+
+# records: [{column: value}, ...]  (one object per row, the historical layout)
+# columns: {column: [values]}      (one array per column)
+# split:   [[values], ...]         (one array per row, names only in "columns")
+# arrow:   base64 Arrow IPC stream (typed binary payload)
+RESULT_FORMATS = ("records", "columns", "split", "arrow")
+ARROW_ENCODING = "arrow-ipc-stream+base64"
+
+
+def _json_scalar(value: Any) -> Any:
+    """Convert a single value to something every JSON encoder accepts"""
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, (str, int, bool)):
+        return value
+    if isinstance(value, np.generic):
+        return _json_scalar(value.item())
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, pd.Timedelta):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    if isinstance(value, (list, tuple)):
+        return [_json_scalar(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _json_scalar(v) for k, v in value.items()}
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return str(value)
+
+
+def column_values(series: pd.Series) -> List[Any]:
+    """Return a column as a JSON-safe list: NaN/NA become null, dates ISO strings"""
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "iub":
+        return series.tolist()
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        values = series.to_numpy()
+        if not np.isfinite(values).all():
+            values = np.where(np.isfinite(values), values, None)
+        return values.tolist()
+    if pd.api.types.is_datetime64_any_dtype(series):
+        missing = series.isna().to_numpy()
+        values = series.to_numpy()
+        if values.dtype.kind == "M" and (values[~missing] == values[~missing].astype("datetime64[s]")).all():
+            # Whole-second naive timestamps format in bulk, matching Timestamp.isoformat()
+            values = np.datetime_as_string(values, unit="s").astype(object)
+        else:
+            values = series.map(lambda v: v.isoformat(), na_action='ignore').to_numpy(dtype=object)
+        values[missing] = None
+        return values.tolist()
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Convert each category once; code -1 (missing) picks the trailing None
+        categories = column_values(pd.Series(dtype.categories)) + [None]
+        return np.array(categories, dtype=object)[series.cat.codes.to_numpy()].tolist()
+    if pd.api.types.infer_dtype(series, skipna=True) == "string":
+        values = series.to_numpy(dtype=object, copy=True)
+        values[series.isna().to_numpy()] = None
+        return values.tolist()
+    return [_json_scalar(v) for v in series.tolist()]
+
+
+def encode_page(page: pd.DataFrame, fmt: str = "records") -> Dict[str, Any]:
+    """Encode a page of rows in one of ``RESULT_FORMATS``
+
+    Returns the ``data`` payload (plus ``encoding`` for binary formats); column
+    names are always reported separately by the caller.
+    """
+    if fmt not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {fmt}; expected one of {', '.join(RESULT_FORMATS)}")
+    if fmt == "arrow":
+        if pa is None:
+            raise ValueError("The arrow result format requires pyarrow")
+        table = pa.Table.from_pandas(page, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return {"data": base64.b64encode(sink.getvalue().to_pybytes()).decode(), "encoding": ARROW_ENCODING}
+    names = [str(column) for column in page.columns]
+    columns = [column_values(page.iloc[:, i]) for i in range(page.shape[1])]
+    if fmt == "columns":
+        return {"data": dict(zip(names, columns))}
+    rows = zip(*columns) if columns else ([] for _ in range(len(page)))
+    if fmt == "split":
+        return {"data": [list(row) for row in rows]}
+    return {"data": [dict(zip(names, row)) for row in rows]}
+
+
+def decode_arrow(payload: str) -> pd.DataFrame:
+    """Decode an ``arrow`` result payload back into a DataFrame"""
+    with pa.ipc.open_stream(base64.b64decode(payload)) as reader:
+        return reader.read_pandas()
+
+
+def json_dumps(payload: Any) -> bytes:
+    """Serialize a payload to JSON bytes with the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+                            default=_json_scalar)
+    return json.dumps(_json_scalar(payload), allow_nan=False).encode()
@@ -0,0 +1,149 @@
+"""
+Excel loading with engine selection and a worker process pool
+"""
+import importlib.util
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+
+# Python module that provides each pandas Excel engine
+ENGINE_MODULES = {
+    "calamine": "python_calamine",
+    "openpyxl": "openpyxl",
+    "pyxlsb": "pyxlsb",
+    "xlrd": "xlrd",
+}
+
+# Engines able to read each format, fastest first. calamine (Rust) reads every
+# format; openpyxl is only used as a fallback and pandas opens it read-only.
+ENGINE_PREFERENCE = {
+    ".xlsx": ("calamine", "openpyxl"),
+    ".xlsm": ("calamine", "openpyxl"),
+    ".xlsb": ("calamine", "pyxlsb"),
+    ".xls": ("calamine", "xlrd"),
+}
+
+# An uploaded workbook: a path, or the raw bytes of the file
+ExcelSource = Union[str, bytes]
+
+
+def engine_available(engine: str) -> bool:
+    """Check whether an Excel engine is installed and supported by pandas"""
+    if engine == "calamine" and tuple(int(p) for p in pd.__version__.split(".")[:2]) < (2, 2):
+        return False
+    return importlib.util.find_spec(ENGINE_MODULES[engine]) is not None
+
+
+def select_engine(file_name: str, engine: Optional[str] = None) -> str:
+    """Return the engine to read a workbook with, preferring the fastest installed one"""
+    extension = os.path.splitext(file_name)[1].lower()
+    candidates = ENGINE_PREFERENCE.get(extension)
+    if candidates is None:
+        raise ValueError("Unsupported file format. Please provide a CSV or Excel file.")
+    if engine:
+        if engine not in candidates:
+            raise ValueError(f"Excel engine {engine} cannot read {extension} files")
+        if not engine_available(engine):
+            raise ValueError(f"Excel engine {engine} is not installed")
+        return engine
+    for candidate in candidates:
+        if engine_available(candidate):
+            return candidate
+    raise ValueError(f"No Excel engine installed for {extension} files; install python-calamine")
+
+
+def _name(source: ExcelSource) -> str:
+    return source if isinstance(source, str) else ""
+
+
+def _open(source: ExcelSource) -> Any:
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def read_excel(source: ExcelSource, sheet: Optional[str] = None, file_name: Optional[str] = None,
+               engine: Optional[str] = None, **options: Any) -> pd.DataFrame:
+    """Parse one sheet of a workbook (the first one by default)
+
+    Only the requested sheet is parsed. ``file_name`` picks the engine when
+    ``source`` is raw bytes; other keyword arguments go to ``pd.read_excel``.
+    """
+    engine = select_engine(file_name or _name(source), engine)
+    return pd.read_excel(_open(source), sheet_name=0 if sheet is None else sheet, engine=engine, **options)
+
+
+def sheet_names(source: ExcelSource, file_name: Optional[str] = None, engine: Optional[str] = None) -> List[str]:
+    """List the sheets of a workbook without parsing their cells"""
+    engine = select_engine(file_name or _name(source), engine)
+    with pd.ExcelFile(_open(source), engine=engine) as book:
+        return [str(name) for name in book.sheet_names]
+
+
+class ExcelLoader:
+    """Parses workbooks in a pool of worker processes
+
+    Excel parsing is pure-Python for most engines and holds the GIL for its
+    whole duration, so it runs in separate processes; ``processes=0`` parses
+    in the calling thread instead.
+    """
+
+    def __init__(self, processes: Optional[int] = None, engine: Optional[str] = None):
+        self.processes = processes
+        self.engine = engine or None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._parses = 0
+
+    def read(self, source: ExcelSource, sheet: Optional[str] = None, file_name: Optional[str] = None,
+             **options: Any) -> pd.DataFrame:
+        """Parse one sheet of a workbook, in a worker process unless ``processes`` is 0"""
+        with self._lock:
+            self._parses += 1
+        if self.processes == 0:
+            return read_excel(source, sheet, file_name, self.engine, **options)
+        future = self._pool().submit(read_excel, source, sheet, file_name, self.engine, **options)
+        return future.result()
+
+    def sheets(self, source: ExcelSource, file_name: Optional[str] = None) -> List[str]:
+        """List the sheets of a workbook"""
+        return sheet_names(source, file_name, self.engine)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the engine in use per format and the number of parses"""
+        with self._lock:
+            parses = self._parses
+        engines = {}
+        for extension in ENGINE_PREFERENCE:
+            try:
+                engines[extension] = select_engine(f"workbook{extension}", self.engine)
+            except ValueError:
+                engines[extension] = None
+        return {"processes": self.processes, "engines": engines, "parses": parses}
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, if any were started"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Servers using this are multi-threaded, so start workers fresh rather than forking
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+
+# Shared by the MCP server and the Flask routes; MCP_EXCEL_PROCESSES=0 parses in-thread
+EXCEL_LOADER = ExcelLoader(
+    processes=int(os.getenv("MCP_EXCEL_PROCESSES", str(os.cpu_count() or 1))),
+    engine=os.getenv("MCP_EXCEL_ENGINE"),
+)
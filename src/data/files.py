@@ -0,0 +1,205 @@
+"""
+Bounded byte and line range reads of raw files, for the file:// resource
+"""
+import hashlib
+import mimetypes
+import mmap
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import FileSignature, cache_key, dataset_version, file_signature
+
+DEFAULT_RANGE_BYTES = 1024 * 1024
+# Bytes inspected to decide whether a file is text
+SNIFF_BYTES = 8192
+# A line index remembers the byte offset of every LINE_CHECKPOINT-th line
+LINE_CHECKPOINT = 1024
+# Bytes scanned at a time when counting lines
+_SCAN_BLOCK = 1024 * 1024
+
+
+def is_binary(head: bytes) -> bool:
+    """Guess from the first bytes of a file whether it is binary rather than UTF-8 text"""
+    if b"\0" in head:
+        return True
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multibyte character cut off by the end of the sample is still text
+        return e.start < len(head) - 3
+    return False
+
+
+def _char_start(data: mmap.mmap, position: int, forward: bool = True) -> int:
+    """Move a byte position to the start of a UTF-8 character (at most 3 bytes away)"""
+    for _ in range(3):
+        if not 0 < position < len(data) or data[position] & 0xC0 != 0x80:
+            break
+        position += 1 if forward else -1
+    return position
+
+
+class LineIndex:
+    """Byte offsets of every LINE_CHECKPOINT-th line of one file version
+
+    Filled in as reads scan the file, so locating a line rescans at most
+    LINE_CHECKPOINT lines once the region has been visited.
+    """
+
+    def __init__(self):
+        self.checkpoints: List[int] = [0]
+        self._lock = threading.Lock()
+
+    def offset_of(self, data: mmap.mmap, line: int) -> int:
+        """Return the byte offset where ``line`` (0-based) starts, or the file size past the end"""
+        with self._lock:
+            checkpoint = min(line // LINE_CHECKPOINT, len(self.checkpoints) - 1)
+            position = self.checkpoints[checkpoint]
+            current = checkpoint * LINE_CHECKPOINT
+        while current < line:
+            block = data[position:position + _SCAN_BLOCK]
+            if not block:
+                return position
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+            # Line numbers starting right after each newline
+            starts = current + 1 + np.arange(len(newlines))
+            self._record(starts, position + newlines + 1)
+            if len(newlines) >= line - current:
+                return position + int(newlines[line - current - 1]) + 1
+            current += len(newlines)
+            position += len(block)
+        return position
+
+    @property
+    def nbytes(self) -> int:
+        return 8 * len(self.checkpoints)
+
+    def _record(self, lines: np.ndarray, offsets: np.ndarray) -> None:
+        wanted = lines % LINE_CHECKPOINT == 0
+        with self._lock:
+            # Blocks are scanned in order from a checkpoint, so new checkpoints arrive in order
+            for number, offset in zip(lines[wanted], offsets[wanted]):
+                if number // LINE_CHECKPOINT == len(self.checkpoints):
+                    self.checkpoints.append(int(offset))
+
+
+@dataclass
+class FileRange:
+    """Part of a file as returned to a client, with what it needs to ask for the rest"""
+    data: bytes
+    binary: bool
+    mime_type: str
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+class FileReader:
+    """Serves byte or line ranges of files through a read-only memory map
+
+    Only the requested range is copied out of the page cache, so the memory a
+    read needs is bounded by ``max_bytes`` whatever the size of the file.
+    Every response carries the file's ETag; passing it back as
+    ``if_none_match`` skips re-sending an unchanged file.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_RANGE_BYTES, max_indexes: int = 64):
+        self.max_bytes = max_bytes
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[Tuple[str, FileSignature], LineIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def etag(self, file_path: str) -> str:
+        """Return the ETag of the current version of a file"""
+        key = cache_key(file_path)
+        return dataset_version(key, file_signature(key))
+
+    def read(self, file_path: str, offset: int = 0, length: Optional[int] = None,
+             line: Optional[int] = None, lines: Optional[int] = None,
+             if_none_match: Optional[str] = None) -> FileRange:
+        """Read ``length`` bytes from ``offset``, or ``lines`` lines from line ``line``
+
+        Ranges are capped at ``max_bytes``; line ranges end at a line break
+        and text ranges at a character boundary. The metadata includes
+        ``next_offset`` (and ``next_line`` for line reads), which are None once
+        the end of the file is reached.
+        """
+        if offset < 0 or (line is not None and line < 0):
+            raise ValueError("Ranges must be non-negative")
+        if (length is not None and length < 1) or (lines is not None and lines < 1):
+            # An empty range would hand back a cursor that never advances
+            raise ValueError("length and lines must be at least 1")
+        key = cache_key(file_path)
+        signature = file_signature(key)
+        etag = dataset_version(key, signature)
+        mime_type = mimetypes.guess_type(key)[0] or "text/plain"
+        size = signature[1]
+        meta: Dict[str, Any] = {"etag": etag, "size": size}
+        if if_none_match == etag:
+            meta["not_modified"] = True
+            return FileRange(b"", False, mime_type, meta)
+        if size == 0:
+            meta.update(offset=0, length=0, next_offset=None, sha256=hashlib.sha256().hexdigest())
+            return FileRange(b"", False, mime_type, meta)
+        with open(key, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            binary = is_binary(data[:SNIFF_BYTES])
+            if binary:
+                mime_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+            if line is not None or lines is not None:
+                if binary:
+                    raise ValueError("Line ranges are only supported for text files")
+                chunk, meta_range = self._read_lines(key, signature, data, line or 0, lines)
+            else:
+                chunk, meta_range = self._read_bytes(data, offset, length, binary)
+        meta.update(meta_range)
+        meta["binary"] = binary
+        meta["sha256"] = hashlib.sha256(chunk).hexdigest()
+        return FileRange(chunk, binary, mime_type, meta)
+
+    def _read_bytes(self, data: mmap.mmap, offset: int, length: Optional[int],
+                    binary: bool) -> Tuple[bytes, Dict[str, Any]]:
+        size = len(data)
+        start = min(offset, size)
+        end = min(start + min(self.max_bytes if length is None else length, self.max_bytes), size)
+        if not binary:
+            start = _char_start(data, start)
+            end = max(_char_start(data, end, forward=False), start)
+        chunk = data[start:end]
+        return chunk, {"offset": start, "length": len(chunk), "next_offset": end if end < size else None}
+
+    def _read_lines(self, key: str, signature: FileSignature, data: mmap.mmap, line: int,
+                    lines: Optional[int]) -> Tuple[bytes, Dict[str, Any]]:
+        index = self._line_index(key, signature)
+        size = len(data)
+        start = index.offset_of(data, line)
+        end = size if lines is None else index.offset_of(data, line + lines)
+        truncated = end - start > self.max_bytes
+        if truncated:
+            # Keep whole lines within the cap; a single longer line is cut at a character boundary
+            cut = data.rfind(b"\n", start, start + self.max_bytes)
+            end = cut + 1 if cut >= 0 else max(_char_start(data, start + self.max_bytes, forward=False), start)
+        chunk = data[start:end]
+        returned = chunk.count(b"\n") + (1 if end == size and chunk and not chunk.endswith(b"\n") else 0)
+        done = end >= size
+        return chunk, {
+            "offset": start,
+            "length": len(chunk),
+            "next_offset": None if done else end,
+            "line": line,
+            "lines": returned,
+            # A line longer than the cap continues at next_offset rather than at a next line
+            "next_line": None if done or returned == 0 and truncated else line + returned,
+            "truncated": truncated,
+        }
+
+    def _line_index(self, key: str, signature: FileSignature) -> LineIndex:
+        with self._lock:
+            index = self._indexes.get((key, signature))
+            if index is None:
+                index = self._indexes[(key, signature)] = LineIndex()
+                while len(self._indexes) > self.max_indexes:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end((key, signature))
+            return index
@@ -0,0 +1,109 @@
+"""
+Dataset handles that data tools accept in place of file paths
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+HANDLE_PREFIX = "ds-"
+# Exactly the ids HandleRegistry issues, so files named ds-*.csv stay file paths
+_HANDLE_ID = re.compile(re.escape(HANDLE_PREFIX) + r"[0-9a-f]{16}")
+# Seconds a handle stays valid after its last use
+DEFAULT_HANDLE_TTL = 900.0
+
+
+def is_handle(value: str) -> bool:
+    """Check whether a data tool argument is a dataset handle rather than a file path"""
+    return _HANDLE_ID.fullmatch(value) is not None
+
+
+@dataclass
+class DatasetHandle:
+    """A loaded dataset, or a view of the rows of another handle
+
+    A view stores only the step that produces it (``("filter", column, value)``,
+    ``("sort", columns, ascending)`` or ``("query", where)``) plus an optional
+    column projection; its rows are computed when it is first used.
+    """
+    id: str
+    # cache_key() of the file without the sheet, which is kept separately
+    key: str
+    sheet: Optional[str]
+    version: str
+    parent: Optional["DatasetHandle"] = None
+    view: Optional[Tuple[Any, ...]] = None
+    columns: Optional[List[str]] = None
+    expires: float = 0.0
+
+
+class HandleRegistry:
+    """Dataset handles issued by the server, expiring ``ttl`` seconds after their last use
+
+    Handle ids are derived from what they refer to (the cache key of a file,
+    or a parent handle and a step), so the same dataset or view always gets
+    the same id, whatever spelling of its path the client used.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_HANDLE_TTL, max_entries: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._handles: "OrderedDict[str, DatasetHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._issued = 0
+        self._expired = 0
+
+    def register(self, key: str, sheet: Optional[str], version: str) -> DatasetHandle:
+        """Issue (or refresh) the handle of a dataset"""
+        return self._add(DatasetHandle(self._id(key, sheet), key, sheet, version))
+
+    def derive(self, parent: DatasetHandle, version: str, view: Tuple[Any, ...],
+               columns: Optional[List[str]] = None) -> DatasetHandle:
+        """Issue (or refresh) the handle of a view of ``parent`` at one file version"""
+        # Views are only meaningful for the file version they were computed on
+        handle_id = self._id(parent.id, version, view, columns)
+        return self._add(DatasetHandle(handle_id, parent.key, parent.sheet, version, parent, view, columns))
+
+    def _id(self, *identity: Any) -> str:
+        raw = json.dumps(identity, sort_keys=True, default=str)
+        return HANDLE_PREFIX + hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+    def _add(self, handle: DatasetHandle) -> DatasetHandle:
+        handle_id = handle.id
+        handle.expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._handles[handle_id] = handle
+            self._handles.move_to_end(handle_id)
+            self._issued += 1
+            while len(self._handles) > self.max_entries:
+                self._handles.popitem(last=False)
+        return handle
+
+    def get(self, handle_id: str) -> Optional[DatasetHandle]:
+        """Return a live handle and extend its lifetime, or None if it is unknown or expired"""
+        now = time.monotonic()
+        with self._lock:
+            handle = self._handles.get(handle_id)
+            if handle is None:
+                return None
+            if handle.expires < now:
+                del self._handles[handle_id]
+                self._expired += 1
+                return None
+            handle.expires = now + self.ttl
+            self._handles.move_to_end(handle_id)
+            return handle
+
+    def stats(self) -> Dict[str, Any]:
+        """Return handle counters for operators"""
+        with self._lock:
+            return {
+                "handles": len(self._handles),
+                "ttl_seconds": self.ttl,
+                "issued": self._issued,
+                "expired": self._expired,
+            }
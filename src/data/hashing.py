@@ -0,0 +1,104 @@
+"""
+Content hashing of dataset files
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from .cache import FileSignature, cache_key, file_signature
+
+_HASH_BLOCK = 1024 * 1024
+
+
+def content_hash(file_path: str) -> str:
+    """Return the SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _hash_range(file_path: str, digest: Any, start: int, end: int) -> None:
+    """Feed bytes [start, end) of a file into a running hash"""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(_HASH_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+
+
+def namespaced(digest: str, namespace: str = "") -> str:
+    """Derive a key for a specific interpretation (parser, storage mode) of some content"""
+    if not namespace:
+        return digest
+    return hashlib.sha256(f"{digest}:{namespace}".encode()).hexdigest()
+
+
+class ContentHasher:
+    """Memoizes content hashes per file version so each version is hashed once
+
+    The running hash of the latest version of each file is kept too, so the
+    hash of a file that was only appended to covers just the appended bytes.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._digests: "OrderedDict[Tuple[str, FileSignature], str]" = OrderedDict()
+        self._states: "OrderedDict[str, Tuple[FileSignature, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, file_path: str, namespace: str = "") -> str:
+        """Return the content hash of a file, optionally namespaced"""
+        key = cache_key(file_path)
+        memo_key = (key, file_signature(key))
+        with self._lock:
+            digest = self._digests.get(memo_key)
+            if digest is not None:
+                self._digests.move_to_end(memo_key)
+        if digest is None:
+            state = hashlib.sha256()
+            # Hash exactly the version the signature describes
+            _hash_range(key, state, 0, memo_key[1][1])
+            digest = self._remember(key, memo_key[1], state)
+        return namespaced(digest, namespace)
+
+    def cached(self, file_path: str, signature: FileSignature, namespace: str = "") -> Optional[str]:
+        """Return the memoized content hash of one version of a file, if it was ever computed"""
+        with self._lock:
+            digest = self._digests.get((cache_key(file_path), signature))
+        return None if digest is None else namespaced(digest, namespace)
+
+    def extend(self, file_path: str, previous: FileSignature, signature: FileSignature,
+               namespace: str = "") -> Optional[str]:
+        """Return the content hash of a file that grew by appending to version ``previous``
+
+        Only the appended bytes are read. Returns None when the running hash of
+        ``previous`` is not known; callers must have checked that the file was
+        only appended to.
+        """
+        key = cache_key(file_path)
+        with self._lock:
+            saved = self._states.get(key)
+        if saved is None or saved[0] != previous:
+            return None
+        state = saved[1].copy()
+        _hash_range(key, state, previous[1], signature[1])
+        return namespaced(self._remember(key, signature, state), namespace)
+
+    def _remember(self, key: str, signature: FileSignature, state: Any) -> str:
+        digest = state.hexdigest()
+        with self._lock:
+            self._digests[(key, signature)] = digest
+            while len(self._digests) > self.max_entries:
+                self._digests.popitem(last=False)
+            self._states[key] = (signature, state)
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+        return digest
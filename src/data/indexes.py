@@ -0,0 +1,81 @@
+"""
+Per-column hash indexes for equality lookups
+"""
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnIndex:
+    """Maps each distinct value of a column to the positions of the rows holding it
+
+    Positions are grouped by value in one array, so a lookup is a hash probe
+    followed by a slice: O(matches) instead of a full column scan. Missing
+    values are not indexed, matching ``column == value`` which never selects them.
+    """
+
+    def __init__(self, series: pd.Series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        self.uniques = pd.Index(uniques)
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.uniques))
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        # A stable sort keeps positions ascending within each value
+        order = np.argsort(codes, kind='stable')
+        self.positions = order[len(codes) - int(self.offsets[-1]):].astype(np.int64)
+
+    def extend(self, tail: pd.Series, start: int) -> "ColumnIndex":
+        """Return the index of the column with ``tail`` appended as rows ``start`` onwards
+
+        The appended rows are indexed on their own and merged in, so only they
+        are hashed; the existing groups are moved with array arithmetic.
+        """
+        added = ColumnIndex(tail)
+        codes = self.uniques.get_indexer(added.uniques)
+        new = codes < 0
+        codes[new] = len(self.uniques) + np.arange(int(new.sum()))
+        old_counts = np.zeros(len(self.uniques) + int(new.sum()), dtype=np.int64)
+        old_counts[:len(self.uniques)] = np.diff(self.offsets)
+        added_counts = np.diff(added.offsets)
+        counts = old_counts.copy()
+        counts[codes] += added_counts
+        merged = object.__new__(ColumnIndex)
+        merged.uniques = self.uniques.append(added.uniques[new])
+        merged.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        merged.positions = np.empty(int(merged.offsets[-1]), dtype=np.int64)
+        # Existing rows keep the front of their group, appended rows follow them
+        groups = np.repeat(np.arange(len(self.uniques)), old_counts[:len(self.uniques)])
+        ranks = np.arange(len(self.positions)) - self.offsets[groups]
+        merged.positions[merged.offsets[groups] + ranks] = self.positions
+        groups = np.repeat(codes, added_counts)
+        ranks = np.arange(len(added.positions)) - np.repeat(added.offsets[:-1], added_counts)
+        merged.positions[merged.offsets[groups] + old_counts[groups] + ranks] = added.positions + start
+        return merged
+
+    def lookup(self, value: Any) -> Optional[np.ndarray]:
+        """Return the positions of rows equal to ``value``
+
+        Returns None when the index cannot answer for this value (e.g. an
+        unhashable or incomparable value) and the caller should scan instead.
+        """
+        try:
+            code = self.uniques.get_loc(value)
+        except KeyError:
+            return self.positions[:0]
+        except Exception:
+            return None
+        if not isinstance(code, (int, np.integer)):
+            return None
+        return self.positions[self.offsets[code]:self.offsets[code + 1]]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index, including the hash table"""
+        # The lazily built hash engine is roughly the size of the uniques again
+        uniques = int(self.uniques.memory_usage(deep=True)) * 2
+        return uniques + int(self.positions.nbytes) + int(self.offsets.nbytes)
+
+
+def equality_positions(df: pd.DataFrame, column: str, value: Any) -> np.ndarray:
+    """Return the positions of rows where ``column == value`` by scanning the column"""
+    return np.flatnonzero((df[column] == value).to_numpy(dtype=bool, na_value=False))
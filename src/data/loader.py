@@ -0,0 +1,44 @@
+"""
+Dataset loader for the MCP Server
+"""
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from .excel import ENGINE_PREFERENCE, read_excel
+
+CSV_EXTENSIONS = ('.csv',)
+EXCEL_EXTENSIONS = tuple(ENGINE_PREFERENCE)
+
+# "numpy" keeps pandas' default dtypes; "arrow" holds every column as an
+# Arrow-backed extension array, which stores strings compactly and slices zero-copy
+STORAGE_MODES = ("numpy", "arrow")
+
+
+def is_supported(file_path: str) -> bool:
+    """Check whether a file has an extension the loader can parse"""
+    return file_path.endswith(CSV_EXTENSIONS + EXCEL_EXTENSIONS)
+
+
+def storage_options(storage: str) -> Dict[str, Any]:
+    """Return the pandas reader arguments for a storage mode"""
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode: {storage}")
+    if storage == "arrow":
+        return {"dtype_backend": "pyarrow"}
+    return {}
+
+
+def read_frame(file_path: str, storage: str = "numpy", sheet: Optional[str] = None) -> pd.DataFrame:
+    """Parse a CSV or Excel file (one sheet, the first by default) into a DataFrame"""
+    options = storage_options(storage)
+    if sheet is not None and not file_path.endswith(EXCEL_EXTENSIONS):
+        raise ValueError("A sheet can only be selected in Excel files")
+    if file_path.endswith(CSV_EXTENSIONS):
+        if storage == "arrow":
+            # The multithreaded Arrow CSV reader builds Arrow arrays directly
+            return pd.read_csv(file_path, engine="pyarrow", **options)
+        return pd.read_csv(file_path, **options)
+    if file_path.endswith(EXCEL_EXTENSIONS):
+        return read_excel(file_path, sheet, **options)
+    raise ValueError("Unsupported file format. Please provide a CSV or Excel file.")
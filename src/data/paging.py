@@ -0,0 +1,91 @@
+"""
+Result pagination for the MCP Server data tools
+"""
+import base64
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .encoding import encode_page
+
+DEFAULT_PAGE_SIZE = int(os.getenv("MCP_PAGE_SIZE", "1000"))
+MAX_PAGE_SIZE = int(os.getenv("MCP_MAX_PAGE_SIZE", "10000"))
+
+
+class CursorError(ValueError):
+    """Raised when a cursor is malformed or no longer matches the dataset"""
+
+
+def query_fingerprint(*parts: Any) -> str:
+    """Return a short identifier for the query a cursor belongs to"""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def encode_cursor(version: str, query: str, offset: int) -> str:
+    """Encode an opaque cursor pointing at ``offset`` of a query result"""
+    raw = json.dumps({"v": version, "q": query, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, version: str, query: str) -> int:
+    """Decode a cursor and return its offset, checking it belongs to this query"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(payload["o"])
+    except (ValueError, KeyError, TypeError):
+        raise CursorError("Invalid cursor")
+    if payload.get("q") != query:
+        raise CursorError("Cursor does not belong to this query")
+    if payload.get("v") != version:
+        raise CursorError("Cursor is stale: the dataset changed since it was issued")
+    return offset
+
+
+def resolve_page(offset: int, limit: Optional[int], cursor: Optional[str],
+                 version: str, query: str) -> Tuple[int, int]:
+    """Turn offset/limit/cursor arguments into a validated (offset, limit) pair"""
+    if cursor:
+        offset = decode_cursor(cursor, version, query)
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    if offset < 0:
+        raise CursorError("offset must be non-negative")
+    if limit < 1:
+        # An empty page would hand back a cursor at the same offset
+        raise CursorError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return offset, min(limit, MAX_PAGE_SIZE)
+
+
+def page_frame(df: pd.DataFrame, positions: Optional[np.ndarray], offset: int, limit: int,
+               version: str, query: str, total: Optional[int] = None,
+               columns: Optional[List[str]] = None, fmt: str = "records") -> Dict[str, Any]:
+    """Build a paged response from a frame and the row positions of the result
+
+    ``positions`` pins the order of the result; ``None`` means the frame's own order.
+    When ``positions`` is only a prefix of the result (e.g. a top-k selection),
+    ``total`` gives the full result size. ``columns`` projects the page and
+    ``fmt`` picks the payload encoding (see ``encoding.RESULT_FORMATS``).
+    """
+    if total is None:
+        total = len(df) if positions is None else len(positions)
+    end = min(offset + limit, total)
+    rows = slice(offset, end) if positions is None else positions[offset:end]
+    if columns is None:
+        page = df.iloc[rows]
+    else:
+        # Project before gathering so only the requested columns are copied
+        page = df.iloc[rows, [df.columns.get_loc(column) for column in columns]]
+    return {
+        **encode_page(page, fmt),
+        "format": fmt,
+        "columns": page.columns.tolist(),
+        "rows": total,
+        "offset": offset,
+        "limit": limit,
+        "next_cursor": encode_cursor(version, query, end) if end < total else None,
+    }
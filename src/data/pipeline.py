@@ -0,0 +1,114 @@
+"""
+Logical plans for multi-step queries (filter, sort, select, limit) over cached datasets
+"""
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set
+
+import pandas as pd
+
+from .query import LOGICAL_OPS, QueryError, compile_predicate
+from .sorting import normalize_sort_keys
+
+PIPELINE_OPS = ("filter", "sort", "select", "limit")
+
+
+def _predicate_columns(node: Mapping[str, Any], columns: Set[Any]) -> Set[Any]:
+    """Collect the columns a (compiled) predicate reads"""
+    for op in LOGICAL_OPS:
+        if op in node:
+            children = node[op] if op != "not" else [node[op]]
+            for child in children:
+                _predicate_columns(child, columns)
+            return columns
+    columns.add(node["column"])
+    return columns
+
+
+def _new_stage() -> Dict[str, Any]:
+    return {"where": [], "sort": None, "limit": None}
+
+
+def compile_pipeline(steps: Sequence[Mapping[str, Any]], df: pd.DataFrame) -> Dict[str, Any]:
+    """Validate pipeline steps against a frame and rewrite them as an equivalent plan
+
+    Each step is a single-key object: ``{"filter": <query_data predicate>}``,
+    ``{"sort": {"by": ..., "ascending": ...}}``, ``{"select": [columns]}`` or
+    ``{"limit": n}``. The plan is a list of stages, each a conjunction of
+    filters, then one sort, then a limit; steps are only reordered where that
+    cannot change the result:
+
+    - filters move ahead of sorts (a stable sort keeps the relative order of
+      the rows a filter keeps) and adjacent filters merge into one ``and``
+    - consecutive sorts fuse into one multi-key sort, later keys first
+    - a limit ends a stage and consecutive limits keep the smallest
+    - selects only narrow the output columns, applied to the final page
+
+    Returns ``{"stages": [...], "columns": [...] or None}``, which is plain JSON
+    so it can serve as a cache key.
+    """
+    if not steps:
+        raise QueryError("A pipeline needs at least one step")
+    stages = [_new_stage()]
+    visible: Optional[List[Any]] = None
+
+    def check_visible(path: str, columns: Set[Any]) -> None:
+        hidden = [column for column in columns if visible is not None and column not in visible]
+        if hidden:
+            raise QueryError(f"{path}: columns removed by an earlier select: {', '.join(map(str, hidden))}")
+
+    for i, step in enumerate(steps):
+        path = f"steps[{i}]"
+        if not isinstance(step, Mapping) or len(step) != 1:
+            raise QueryError(f"{path}: expected an object with one of {', '.join(PIPELINE_OPS)}")
+        op, arg = next(iter(step.items()))
+        stage = stages[-1]
+        if op == "filter":
+            predicate = compile_predicate(arg, df, f"{path}.filter")
+            check_visible(path, _predicate_columns(predicate, set()))
+            if stage["limit"] is not None:
+                stage = _new_stage()
+                stages.append(stage)
+            # Flatten conjunctions so indexed leaves are found at the top level
+            stage["where"].extend(arg["and"] if list(arg) == ["and"] else [arg])
+        elif op == "sort":
+            if not isinstance(arg, Mapping) or "by" not in arg:
+                raise QueryError(f"{path}: sort needs {{\"by\": column or [columns]}}")
+            try:
+                keys, ascending = normalize_sort_keys(arg["by"], arg.get("ascending", True))
+            except ValueError as e:
+                raise QueryError(f"{path}: {str(e)}")
+            missing = [key for key in keys if key not in df.columns]
+            if missing:
+                raise QueryError(f"{path}: unknown sort columns: {', '.join(map(str, missing))}")
+            check_visible(path, set(keys))
+            if stage["limit"] is not None:
+                stage = _new_stage()
+                stages.append(stage)
+            if stage["sort"] is not None:
+                # Sorting stably by B after A orders by (B, A)
+                earlier = [pair for pair in stage["sort"] if pair[0] not in keys]
+                stage["sort"] = [[key, direction] for key, direction in zip(keys, ascending)] + earlier
+            else:
+                stage["sort"] = [[key, direction] for key, direction in zip(keys, ascending)]
+        elif op == "select":
+            if isinstance(arg, str) or not isinstance(arg, Sequence) or not arg:
+                raise QueryError(f"{path}: select needs a non-empty list of columns")
+            missing = [column for column in arg if column not in df.columns]
+            if missing:
+                raise QueryError(f"{path}: unknown columns: {', '.join(map(str, missing))}")
+            check_visible(path, set(arg))
+            visible = list(arg)
+        elif op == "limit":
+            if isinstance(arg, bool) or not isinstance(arg, int) or arg < 0:
+                raise QueryError(f"{path}: limit needs a non-negative integer")
+            stage["limit"] = arg if stage["limit"] is None else min(stage["limit"], arg)
+        else:
+            raise QueryError(f"{path}: unknown step {op!r}; expected one of {', '.join(PIPELINE_OPS)}")
+    plan_stages = []
+    for stage in stages:
+        where = stage["where"]
+        plan_stages.append({
+            "where": None if not where else where[0] if len(where) == 1 else {"and": where},
+            "sort": stage["sort"],
+            "limit": stage["limit"],
+        })
+    return {"stages": plan_stages, "columns": visible}
@@ -0,0 +1,226 @@
+"""
+Structured predicate queries over cached datasets
+"""
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .indexes import ColumnIndex
+
+COMPARISON_OPS = ("==", "!=", "<", "<=", ">", ">=")
+LEAF_OPS = COMPARISON_OPS + ("in", "between", "contains", "is_null")
+LOGICAL_OPS = ("and", "or", "not")
+
+
+class QueryError(ValueError):
+    """Raised when a predicate does not fit the dataset's schema"""
+
+
+def _column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return _column_kind(pd.Series(series.cat.categories))
+    if pd.api.types.is_string_dtype(series) or pd.api.types.is_object_dtype(series):
+        return "string"
+    return "other"
+
+
+def _coerce_value(value: Any, kind: str, op: str, path: str) -> Any:
+    """Check a literal against the column type, converting dates to timestamps"""
+    if value is None:
+        raise QueryError(f"{path}: value must not be null; use is_null instead")
+    if kind == "numeric":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise QueryError(f"{path}: expected a number for a numeric column, got {value!r}")
+    elif kind == "datetime":
+        try:
+            return pd.Timestamp(value)
+        except (TypeError, ValueError):
+            raise QueryError(f"{path}: expected a date for a datetime column, got {value!r}")
+    elif kind == "string" and op not in ("==", "!=", "in") and not isinstance(value, str):
+        raise QueryError(f"{path}: expected a string for a text column, got {value!r}")
+    elif kind == "bool" and op in ("==", "!=", "in") and not isinstance(value, bool):
+        raise QueryError(f"{path}: expected true or false for a boolean column, got {value!r}")
+    return value
+
+
+def compile_predicate(node: Mapping[str, Any], df: pd.DataFrame, path: str = "where") -> Dict[str, Any]:
+    """Validate a predicate tree against a frame's columns and normalize its literals
+
+    Leaves look like ``{"column": "age", "op": ">=", "value": 30}``; ``in`` takes a
+    list, ``between`` a ``[low, high]`` pair (inclusive) and ``is_null`` no value.
+    Leaves combine with ``{"and": [...]}``, ``{"or": [...]}`` and ``{"not": {...}}``.
+    """
+    if not isinstance(node, Mapping):
+        raise QueryError(f"{path}: expected an object")
+    logical = [op for op in LOGICAL_OPS if op in node]
+    if logical:
+        if len(node) != 1:
+            raise QueryError(f"{path}: a logical node must have exactly one key")
+        op = logical[0]
+        if op == "not":
+            return {"not": compile_predicate(node["not"], df, f"{path}.not")}
+        children = node[op]
+        if not isinstance(children, list) or not children:
+            raise QueryError(f"{path}.{op}: expected a non-empty list")
+        return {op: [compile_predicate(child, df, f"{path}.{op}[{i}]") for i, child in enumerate(children)]}
+
+    column, op = node.get("column"), node.get("op")
+    if column not in df.columns:
+        raise QueryError(f"{path}: unknown column {column!r}")
+    if op not in LEAF_OPS:
+        raise QueryError(f"{path}: unknown operator {op!r}; expected one of {', '.join(LEAF_OPS)}")
+    kind = _column_kind(df[column])
+    value = node.get("value")
+    if op == "is_null":
+        value = None
+    elif op == "in":
+        if not isinstance(value, list):
+            raise QueryError(f"{path}: 'in' expects a list of values")
+        value = [_coerce_value(v, kind, op, path) for v in value]
+    elif op == "between":
+        if not isinstance(value, list) or len(value) != 2:
+            raise QueryError(f"{path}: 'between' expects [low, high]")
+        value = [_coerce_value(v, kind, op, path) for v in value]
+    elif op == "contains":
+        if kind != "string" or not isinstance(value, str):
+            raise QueryError(f"{path}: 'contains' needs a text column and a string value")
+    else:
+        if kind in ("bool", "other") and op not in ("==", "!="):
+            raise QueryError(f"{path}: column {column!r} does not support ordering comparisons")
+        value = _coerce_value(value, kind, op, path)
+    return {"column": column, "op": op, "value": value}
+
+
+def _as_mask(result: Any) -> np.ndarray:
+    if isinstance(result, np.ndarray):
+        return result.astype(bool, copy=False)
+    return result.to_numpy(dtype=bool, na_value=False)
+
+
+def _leaf_mask(series: pd.Series, op: str, value: Any) -> np.ndarray:
+    """Evaluate one comparison over a column; nulls never match except for is_null"""
+    if op == "is_null":
+        return _as_mask(series.isna())
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Evaluate once per category and broadcast through the codes; this also
+        # allows comparisons with values that are not among the categories
+        matched = _leaf_mask(pd.Series(series.cat.categories), op, value)
+        codes = series.cat.codes.to_numpy()
+        return np.where(codes >= 0, matched[codes], False)
+    if op == "==":
+        return _as_mask(series == value)
+    if op == "!=":
+        return _as_mask(series != value) & _as_mask(series.notna())
+    if op == "<":
+        return _as_mask(series < value)
+    if op == "<=":
+        return _as_mask(series <= value)
+    if op == ">":
+        return _as_mask(series > value)
+    if op == ">=":
+        return _as_mask(series >= value)
+    if op == "in":
+        return _as_mask(series.isin(value))
+    if op == "between":
+        return _as_mask(series.between(value[0], value[1], inclusive="both"))
+    if op == "contains":
+        return _as_mask(series.str.contains(value, regex=False, na=False))
+    raise QueryError(f"Unknown operator {op!r}")
+
+
+def _index_positions(node: Dict[str, Any], indexes: Mapping[str, ColumnIndex]) -> Optional[np.ndarray]:
+    """Answer an equality or membership leaf from an existing column index"""
+    if "column" not in node or node["op"] not in ("==", "in"):
+        return None
+    index = indexes.get(node["column"])
+    if index is None:
+        return None
+    values = [node["value"]] if node["op"] == "==" else node["value"]
+    found = [index.lookup(v) for v in values]
+    if any(positions is None for positions in found):
+        return None
+    if not found:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(found))
+
+
+def _mask(node: Dict[str, Any], df: pd.DataFrame, indexes: Mapping[str, ColumnIndex]) -> np.ndarray:
+    if "and" in node:
+        mask = _mask(node["and"][0], df, indexes)
+        for child in node["and"][1:]:
+            mask &= _mask(child, df, indexes)
+        return mask
+    if "or" in node:
+        mask = _mask(node["or"][0], df, indexes)
+        for child in node["or"][1:]:
+            mask |= _mask(child, df, indexes)
+        return mask
+    if "not" in node:
+        return ~_mask(node["not"], df, indexes)
+    positions = _index_positions(node, indexes)
+    if positions is not None:
+        mask = np.zeros(len(df), dtype=bool)
+        mask[positions] = True
+        return mask
+    return _leaf_mask(df[node["column"]], node["op"], node["value"])
+
+
+def select_positions(node: Optional[Dict[str, Any]], df: pd.DataFrame,
+                     indexes: Optional[Mapping[str, ColumnIndex]] = None) -> np.ndarray:
+    """Return the positions of rows matching a compiled predicate, in frame order
+
+    Column indexes answer ``==``/``in`` leaves without a scan. When a top-level
+    conjunction has indexed leaves, the remaining conjuncts are only evaluated
+    on the rows those leaves select.
+    """
+    indexes = indexes or {}
+    if node is None:
+        return np.arange(len(df))
+    conjuncts: List[Dict[str, Any]] = node["and"] if "and" in node else [node]
+    candidates = None
+    rest = []
+    for child in conjuncts:
+        positions = _index_positions(child, indexes)
+        if positions is None:
+            rest.append(child)
+        elif candidates is None:
+            candidates = positions
+        else:
+            candidates = np.intersect1d(candidates, positions, assume_unique=True)
+    if candidates is None:
+        return np.flatnonzero(_mask(node, df, indexes))
+    if not rest or len(candidates) == 0:
+        return candidates
+    # Evaluate the remaining conjuncts on the candidate rows only
+    needed = sorted({leaf for child in rest for leaf in _columns(child)})
+    subset = df[needed].take(candidates).reset_index(drop=True)
+    mask = _mask({"and": rest}, subset, {})
+    return candidates[mask]
+
+
+def _columns(node: Dict[str, Any]) -> List[str]:
+    if "column" in node:
+        return [node["column"]]
+    if "not" in node:
+        return _columns(node["not"])
+    op = "and" if "and" in node else "or"
+    return [column for child in node[op] for column in _columns(child)]
+
+
+def validate_projection(columns: Optional[List[str]], df: pd.DataFrame) -> Optional[List[str]]:
+    """Check that every projected column exists"""
+    if columns is None:
+        return None
+    if not columns:
+        raise QueryError("columns must not be empty")
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise QueryError(f"Unknown columns in projection: {', '.join(map(str, missing))}")
+    return list(columns)
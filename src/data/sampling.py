@@ -0,0 +1,122 @@
+"""
+Single-pass row sampling with a fixed memory footprint
+"""
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class Reservoir:
+    """A uniform sample of ``size`` rows from a stream of frames (Algorithm R, vectorized per chunk)
+
+    Only the sampled rows and their positions in the stream are kept, so
+    memory stays bounded by ``size`` however many rows pass through.
+    """
+
+    def __init__(self, size: int, rng: np.random.Generator):
+        if size < 0:
+            raise ValueError("The sample size must be non-negative")
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self._rows: Optional[pd.DataFrame] = None
+        self._positions = np.empty(0, dtype=np.int64)
+
+    def add(self, chunk: pd.DataFrame, positions: Optional[np.ndarray] = None) -> None:
+        """Offer the rows of a chunk; ``positions`` are their row numbers in the source"""
+        if positions is None:
+            positions = np.arange(self.seen, self.seen + len(chunk))
+        taken, order = self._offer(positions)
+        if self._rows is None:
+            self._rows = chunk.iloc[:0]
+        combined = pd.concat([self._rows, chunk.iloc[taken]], ignore_index=True)
+        self._rows = combined.take(order).reset_index(drop=True)
+
+    def add_positions(self, positions: np.ndarray) -> None:
+        """Offer rows by their row numbers alone; the caller keeps the rows of ``positions``"""
+        self._offer(positions)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """Row numbers of the sampled rows, in reservoir slot order"""
+        return self._positions
+
+    def _offer(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Update the sampled positions; returns the chunk rows taken and the new slot order"""
+        n = len(positions)
+        stream = self.seen + np.arange(n)
+        self.seen += n
+        # Rows that arrive while the reservoir is filling are always kept
+        filling = int(min(max(self.size - (self.seen - n), 0), n))
+        # Row i of the stream replaces slot j ~ U[0, i] when j < size; draw for all rows
+        # at once and let the last replacement of a slot win, as in the sequential loop
+        later = stream[filling:]
+        slots = self.rng.integers(0, later + 1) if len(later) else np.empty(0, dtype=np.int64)
+        hits = np.flatnonzero(slots < self.size) + filling
+        targets = slots[hits - filling]
+        unique, last = np.unique(targets[::-1], return_index=True)
+        winners = hits[len(hits) - 1 - last]
+        taken = np.concatenate([np.arange(filling), winners])
+        kept = np.arange(len(self._positions))
+        combined_positions = np.concatenate([self._positions, positions[taken]])
+        # New rows append while filling; replacements overwrite their slot
+        order = np.concatenate([kept, len(kept) + np.arange(filling)])
+        order[unique] = len(kept) + filling + np.arange(len(winners))
+        self._positions = combined_positions[order]
+        return taken, order
+
+    def frame(self) -> pd.DataFrame:
+        """Return the sampled rows in source order"""
+        if self._rows is None:
+            return pd.DataFrame()
+        order = np.argsort(self._positions, kind="stable")
+        return self._rows.take(order).set_axis(self._positions[order])
+
+
+def sample_frames(chunks: Iterable[pd.DataFrame], size: int, seed: int = 0,
+                  stratify_by: Optional[Any] = None) -> pd.DataFrame:
+    """Sample ``size`` rows from a stream of frames in one pass, reproducibly for a seed
+
+    With ``stratify_by`` every distinct value of that column (missing values
+    included) gets its own sample of up to ``size`` rows, so rare values are
+    represented. The result is in source order and indexed by source row number.
+    """
+    rng = np.random.default_rng(seed)
+    if stratify_by is None:
+        reservoir = Reservoir(size, rng)
+        for chunk in chunks:
+            reservoir.add(chunk)
+        return reservoir.frame()
+    reservoirs: Dict[Any, Reservoir] = {}
+    # Rows held by any reservoir, indexed by source row number; reservoirs only track positions
+    kept: Optional[pd.DataFrame] = None
+    seen = 0
+    for chunk in chunks:
+        if stratify_by not in chunk.columns:
+            raise KeyError(stratify_by)
+        positions = seen + np.arange(len(chunk))
+        seen += len(chunk)
+        codes, values = pd.factorize(chunk[stratify_by], use_na_sentinel=False)
+        # Group row positions by stratum once: a stable sort keeps each group in source order
+        order = np.argsort(codes, kind="stable")
+        bounds = np.cumsum(np.bincount(codes, minlength=len(values)))[:-1]
+        for value, members in zip(values, np.split(order, bounds)):
+            key = None if pd.isna(value) else value
+            reservoirs.setdefault(key, Reservoir(size, rng)).add_positions(positions[members])
+        # Gather the rows still sampled once per chunk rather than once per stratum
+        sampled = np.concatenate([reservoir.positions for reservoir in reservoirs.values()])
+        candidates = chunk.set_axis(positions)
+        if kept is not None:
+            candidates = pd.concat([kept, candidates])
+        kept = candidates[candidates.index.isin(sampled)]
+    if not reservoirs:
+        return pd.DataFrame()
+    # Earlier chunks come first, so the rows are already in source order
+    return kept
+
+
+def frame_chunks(df: pd.DataFrame, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Slice a loaded frame into chunks, so it samples exactly like the file it came from"""
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
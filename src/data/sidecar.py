@@ -0,0 +1,273 @@
+"""
+Columnar on-disk sidecar cache for parsed datasets
+"""
+import contextlib
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+
+from .hashing import ContentHasher
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - sidecars are disabled without pyarrow
+    pa = None
+    feather = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no cross-process locking outside POSIX
+    fcntl = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIDECAR_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mcp-server", "sidecars")
+SIDECAR_SUFFIX = ".arrow"
+# Bump when the parsing of source files changes so old sidecars are not reused
+SIDECAR_FORMAT = "v2"
+# Held while a server process parses a file, so others wait for its sidecar
+LOCK_SUFFIX = ".lock"
+
+
+class SidecarStore:
+    """Arrow IPC (Feather v2) copies of parsed datasets, keyed by source content hash
+
+    Sidecars are written uncompressed so they can be memory-mapped on load, and
+    the directory is trimmed to ``max_bytes`` by evicting least recently used files.
+
+    The directory can be shared by every server process on a node: a file is
+    parsed by one process while the others wait on a lock, and Arrow-backed
+    frames hold a shared lock on their sidecar for as long as they are alive,
+    so eviction skips sidecars mapped by any process.
+    """
+
+    def __init__(self, directory: Optional[str], max_bytes: int, hasher: Optional[ContentHasher] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hasher = hasher or ContentHasher()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+        self._errors = 0
+        self._shared_loads = 0
+        self._pinned = 0
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        """Sidecars need pyarrow and a configured directory"""
+        return pa is not None and bool(self.directory)
+
+    def digest(self, file_path: str, namespace: str = "") -> str:
+        """Return the sidecar key for a file, hashing its contents once per version"""
+        return self.hasher.digest(file_path, namespace)
+
+    def path_for(self, digest: str) -> str:
+        """Return the sidecar file path for a digest"""
+        return os.path.join(self.directory, f"{SIDECAR_FORMAT}-{digest}{SIDECAR_SUFFIX}")
+
+    def has_sidecar(self, file_path: str, namespace: str = "") -> bool:
+        """Check whether a sidecar exists for the current contents of a file"""
+        return self.enabled and os.path.exists(self.path_for(self.digest(file_path, namespace)))
+
+    def load(self, digest: str, arrow_backed: bool = False) -> Optional[pd.DataFrame]:
+        """Load a sidecar through a memory map, or return None if there is none
+
+        With ``arrow_backed`` the columns stay Arrow arrays over the mapped file,
+        so the frame costs no private memory and its pages are shared with every
+        other reader of the same sidecar.
+        """
+        if not self.enabled:
+            return None
+        path = self.path_for(digest)
+        try:
+            frame = self._map(path, arrow_backed)
+        except FileNotFoundError:
+            with self._lock:
+                self._misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable sidecar {path}: {str(e)}")
+            self._discard(path)
+            return None
+        # Refresh the modification time used for LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._hits += 1
+        return frame
+
+    def save(self, digest: str, frame: pd.DataFrame) -> bool:
+        """Write a frame as a sidecar, returning False if it cannot be stored"""
+        if not self.enabled:
+            return False
+        path = self.path_for(digest)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            feather.write_feather(frame, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # Mixed-type object columns and similar cannot be represented in Arrow
+            logger.warning(f"Could not write sidecar for {digest}: {str(e)}")
+            with self._lock:
+                self._errors += 1
+            self._discard(tmp_path)
+            return False
+        with self._lock:
+            self._writes += 1
+        # The new sidecar is the newest file but not yet pinned; evict others first
+        self.evict(exclude=digest)
+        return True
+
+    def read_through(self, file_path: str, reader: Callable[[str], pd.DataFrame],
+                     namespace: str = "", arrow_backed: bool = False) -> pd.DataFrame:
+        """Load a file from its sidecar, parsing it with ``reader`` and saving one on a miss"""
+        if not self.enabled:
+            return reader(file_path)
+        digest = self.digest(file_path, namespace)
+        frame = self.load(digest, arrow_backed)
+        if frame is not None:
+            return frame
+        with self._parse_lock(digest):
+            if os.path.exists(self.path_for(digest)):
+                # Another process parsed the file while we waited for the lock
+                frame = self.load(digest, arrow_backed)
+                if frame is not None:
+                    with self._lock:
+                        self._shared_loads += 1
+                    return frame
+            frame = reader(file_path)
+            if self.save(digest, frame) and arrow_backed:
+                # Swap the freshly parsed frame for one over the mapped sidecar
+                try:
+                    frame = self._map(self.path_for(digest), arrow_backed)
+                except FileNotFoundError:
+                    # Evicted by another process before we could pin it
+                    pass
+        return frame
+
+    def write_through(self, file_path: str, frame: pd.DataFrame, namespace: str = "") -> bool:
+        """Save a frame parsed elsewhere as the sidecar for a file"""
+        if not self.enabled:
+            return False
+        return self.save(self.digest(file_path, namespace), frame)
+
+    def evict(self, exclude: Optional[str] = None) -> None:
+        """Remove least recently used sidecars until the directory fits ``max_bytes``
+
+        The sidecar of digest ``exclude`` is counted but never removed.
+        """
+        kept = self.path_for(exclude) if exclude is not None else None
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SIDECAR_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == kept or not self._remove_unpinned(path):
+                # Still mapped by a live frame in some process
+                continue
+            logger.info(f"Evicted sidecar: {path}")
+            total -= size
+            with self._lock:
+                self._evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return sidecar counters for operators"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "directory": self.directory,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "writes": self._writes,
+                "evictions": self._evictions,
+                "errors": self._errors,
+                "shared_loads": self._shared_loads,
+                "pinned": self._pinned,
+            }
+
+    def _map(self, path: str, arrow_backed: bool) -> pd.DataFrame:
+        if not arrow_backed:
+            # Columns are copied out of the map, so the sidecar is free to go
+            with pa.memory_map(path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+            return table.to_pandas(split_blocks=True)
+        handle = open(path, 'rb')
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_SH)
+            with pa.memory_map(path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+            frame = table.to_pandas(types_mapper=pd.ArrowDtype)
+        except BaseException:
+            handle.close()
+            raise
+        # The shared lock pins the sidecar until the frame over its pages is collected
+        with self._lock:
+            self._pinned += 1
+        weakref.finalize(frame, self._unpin, handle)
+        return frame
+
+    def _unpin(self, handle) -> None:
+        handle.close()
+        with self._lock:
+            self._pinned -= 1
+
+    @contextlib.contextmanager
+    def _parse_lock(self, digest: str):
+        """Hold a digest's lock file exclusively, across every process sharing the directory"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path_for(digest) + LOCK_SUFFIX, 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _remove_unpinned(self, path: str) -> bool:
+        """Remove a sidecar unless some process holds it pinned"""
+        if fcntl is None:
+            self._discard(path)
+            return True
+        try:
+            handle = open(path, 'rb')
+        except FileNotFoundError:
+            return True
+        with handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            self._discard(path)
+            self._discard(path + LOCK_SUFFIX)
+        return True
+
+    def _discard(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
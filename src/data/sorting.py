@@ -0,0 +1,80 @@
+"""
+Sort helpers for the MCP Server data tools
+"""
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Partial selection is only worth it when the requested prefix is a small
+# fraction of the frame; beyond this a full (cached) sort is cheaper overall
+TOP_K_MAX_FRACTION = 0.1
+
+
+def normalize_sort_keys(column: Union[str, Sequence[str]],
+                        ascending: Union[bool, Sequence[bool]] = True) -> Tuple[List[str], List[bool]]:
+    """Return sort columns and per-column directions as parallel lists"""
+    columns = [column] if isinstance(column, str) else list(column)
+    if not columns:
+        raise ValueError("At least one sort column is required")
+    if isinstance(ascending, bool):
+        directions = [ascending] * len(columns)
+    else:
+        directions = [bool(a) for a in ascending]
+    if len(directions) != len(columns):
+        raise ValueError("ascending must have one entry per sort column")
+    return columns, directions
+
+
+def sort_permutation(df: pd.DataFrame, columns: Union[str, Sequence[str]],
+                     ascending: Union[bool, Sequence[bool]] = True) -> np.ndarray:
+    """Return the row positions of ``df`` in sorted order
+
+    The sort is stable with missing values last, so the same dataset always
+    yields the same permutation and paginated reads stay consistent.
+    """
+    columns, ascending = normalize_sort_keys(columns, ascending)
+    keys = df[columns].reset_index(drop=True)
+    return keys.sort_values(by=columns, ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+
+def _numeric_key(series: pd.Series, ascending: bool) -> Optional[np.ndarray]:
+    """Return a float64 key ordering like ``series`` (NaN for missing), or None"""
+    try:
+        if pd.api.types.is_datetime64_any_dtype(series):
+            missing = series.isna().to_numpy()
+            values = series.to_numpy(dtype='datetime64[ns]').view('int64').astype('float64')
+            values[missing] = np.nan
+        elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            values = series.to_numpy(dtype='float64', na_value=np.nan)
+        else:
+            return None
+    except (TypeError, ValueError):
+        return None
+    return values if ascending else -values
+
+
+def top_k_permutation(df: pd.DataFrame, columns: Union[str, Sequence[str]],
+                      ascending: Union[bool, Sequence[bool]], k: int) -> Optional[np.ndarray]:
+    """Return the first ``k`` positions of ``sort_permutation`` without a full sort
+
+    Rows whose first sort key is within the k smallest (ties included) are found
+    with a linear-time partial selection and only those candidates are sorted, so
+    the result is identical to the head of the full stable sort. Returns None when
+    the first sort column is not numeric or a full sort would be as cheap.
+    """
+    columns, ascending = normalize_sort_keys(columns, ascending)
+    n = len(df)
+    if k <= 0 or k > n * TOP_K_MAX_FRACTION:
+        return None
+    key = _numeric_key(df[columns[0]], ascending[0])
+    if key is None:
+        return None
+    # numpy orders NaN last, like na_position='last'
+    kth = np.partition(key, k - 1)[k - 1]
+    if np.isnan(kth):
+        return None
+    # Inclusive threshold keeps every tie (and any float64 rounding collisions)
+    candidates = np.flatnonzero(key <= kth)
+    order = sort_permutation(df.iloc[candidates], columns, ascending)
+    return candidates[order[:k]]
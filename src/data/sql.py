@@ -0,0 +1,221 @@
+"""
+Read-only SQL over cached datasets, with DuckDB when installed and SQLite otherwise
+"""
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+from .encoding import column_values
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover - SQLite is used without duckdb
+    duckdb = None
+
+SQL_ENGINES = ("duckdb", "sqlite")
+TABLE_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# SQLite statements a read-only query may consist of
+_SQLITE_ALLOWED = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+# What the server's own CREATE INDEX of an automatic index needs on top (it writes sqlite_master)
+_SQLITE_INDEXING = _SQLITE_ALLOWED | {sqlite3.SQLITE_CREATE_INDEX, sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE,
+                                     sqlite3.SQLITE_REINDEX}
+# Virtual machine instructions between timeout checks
+_PROGRESS_STEPS = 10_000
+# Indexes SQLite had to build for a single statement, as reported by EXPLAIN QUERY PLAN
+_AUTOMATIC_INDEX = re.compile(r"^SEARCH (\S+) USING AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX \((.*)\)$")
+_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+\"?(\w+)\"?(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+
+
+def select_sql_engine(engine: Optional[str] = None) -> str:
+    """Return the SQL engine to use: DuckDB when installed, SQLite otherwise"""
+    if not engine or engine == "auto":
+        return "duckdb" if duckdb is not None else "sqlite"
+    if engine not in SQL_ENGINES:
+        raise ValueError(f"Unknown SQL engine: {engine}; expected one of auto, {', '.join(SQL_ENGINES)}")
+    if engine == "duckdb" and duckdb is None:
+        raise ValueError("The duckdb SQL engine is not installed")
+    return engine
+
+
+def check_table_names(names: Sequence[str]) -> None:
+    """Check that every table name is a plain SQL identifier"""
+    if not names:
+        raise ValueError("At least one table is required")
+    invalid = [name for name in names if not TABLE_NAME_PATTERN.match(name)]
+    if invalid:
+        raise ValueError(f"Invalid table names: {', '.join(invalid)}")
+
+
+def _quote(name: Any) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sqlite_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+def _result_frame(rows: List[Tuple[Any, ...]], names: List[str]) -> pd.DataFrame:
+    # Joins easily produce duplicate names, which records cannot represent
+    seen: Dict[str, int] = {}
+    unique = []
+    for name in names:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        unique.append(name if count == 0 else f"{name}_{count + 1}")
+    return pd.DataFrame.from_records(rows, columns=unique)
+
+
+class SqliteSnapshot:
+    """A dataset copied once into a serialized SQLite database
+
+    Every query deserializes its tables into a private connection, so queries
+    never share (or lock) a connection. Indexes SQLite had to build on the fly
+    for a query are added to the snapshot, so later queries find them ready;
+    ``on_grow`` is told how many bytes each one added.
+    """
+
+    def __init__(self, frame: pd.DataFrame, on_grow: Optional[Callable[[int], None]] = None):
+        self.columns = [str(column) for column in frame.columns]
+        connection = sqlite3.connect(":memory:")
+        try:
+            definitions = ", ".join(f"{_quote(name)} {_sqlite_type(frame.iloc[:, i])}"
+                                    for i, name in enumerate(self.columns))
+            connection.execute(f"CREATE TABLE data ({definitions})")
+            placeholders = ", ".join("?" * len(self.columns))
+            values = [column_values(frame.iloc[:, i]) for i in range(frame.shape[1])]
+            connection.executemany(f"INSERT INTO data VALUES ({placeholders})", zip(*values))
+            connection.commit()
+            self.image = connection.serialize()
+        finally:
+            connection.close()
+        self.indexes: Set[Tuple[str, ...]] = set()
+        self.on_grow = on_grow
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the serialized database, counted against the dataset cache budget"""
+        return len(self.image)
+
+    def add_index(self, columns: Tuple[str, ...], deadline: Optional[float] = None) -> None:
+        """Persist an index on ``columns`` in the snapshot, giving up (interrupted) past ``deadline``"""
+        with self._lock:
+            if columns in self.indexes or not set(columns) <= set(self.columns):
+                return
+            before = self.nbytes
+            connection = sqlite3.connect(":memory:")
+            try:
+                if deadline is not None:
+                    connection.set_progress_handler(lambda: time.monotonic() > deadline, _PROGRESS_STEPS)
+                connection.deserialize(self.image)
+                name = _quote("auto_" + "_".join(columns))
+                connection.execute(f"CREATE INDEX {name} ON data ({', '.join(map(_quote, columns))})")
+                connection.commit()
+                self.image = connection.serialize()
+            finally:
+                connection.close()
+            self.indexes.add(columns)
+            grown = self.nbytes - before
+        if self.on_grow is not None:
+            self.on_grow(grown)
+
+
+def _automatic_indexes(connection: sqlite3.Connection, sql: str,
+                       tables: Mapping[str, Any]) -> List[Tuple[str, Tuple[str, ...]]]:
+    """Return the (table, columns) indexes SQLite would build just for this statement"""
+    aliases = {name.lower(): name for name in tables}
+    for table, alias in _TABLE_ALIAS.findall(sql):
+        # Words such as JOIN or WHERE after a table name are not aliases, but no table is called that
+        if alias and table.lower() in aliases and alias.lower() not in aliases:
+            aliases[alias.lower()] = aliases[table.lower()]
+    wanted = []
+    for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        match = _AUTOMATIC_INDEX.match(row[-1])
+        if match is None or match.group(1).lower() not in aliases:
+            continue
+        columns = tuple(re.split(r"[=<>]", term.strip())[0] for term in match.group(2).split(" AND "))
+        wanted.append((aliases[match.group(1).lower()], columns))
+    return wanted
+
+
+def run_sqlite(sql: str, snapshots: Mapping[str, SqliteSnapshot], max_rows: int,
+               timeout: float) -> Tuple[pd.DataFrame, bool]:
+    """Run a read-only query against SQLite snapshots registered under table names
+
+    Returns at most ``max_rows`` rows and whether more were available; the
+    query is interrupted after ``timeout`` seconds.
+    """
+    connection = sqlite3.connect(":memory:")
+    try:
+        for i, (name, snapshot) in enumerate(snapshots.items()):
+            schema = f"t{i}"
+            connection.execute(f"ATTACH ':memory:' AS {schema}")
+            connection.deserialize(snapshot.image, name=schema)
+            # Unqualified names resolve through the attached databases
+            connection.execute(f"ALTER TABLE {schema}.data RENAME TO {_quote(name)}")
+        deadline = time.monotonic() + timeout
+        # Every statement from here on, including planning the query, is read-only and timed
+        allowed = [_SQLITE_ALLOWED]
+        connection.set_authorizer(lambda action, *args: sqlite3.SQLITE_OK if action in allowed[0]
+                                  else sqlite3.SQLITE_DENY)
+        connection.set_progress_handler(lambda: time.monotonic() > deadline, _PROGRESS_STEPS)
+        try:
+            for name, columns in _automatic_indexes(connection, sql, snapshots):
+                allowed[0] = _SQLITE_INDEXING
+                try:
+                    connection.execute(f"CREATE INDEX IF NOT EXISTS t{list(snapshots).index(name)}."
+                                       f"{_quote('auto_' + '_'.join(columns))} ON {_quote(name)} "
+                                       f"({', '.join(map(_quote, columns))})")
+                finally:
+                    allowed[0] = _SQLITE_ALLOWED
+                snapshots[name].add_index(columns, deadline)
+            cursor = connection.execute(sql)
+            rows = cursor.fetchmany(max_rows + 1)
+        except sqlite3.Error as e:
+            if str(e) == "interrupted":
+                raise TimeoutError(f"SQL query exceeded the {timeout:g}s time limit")
+            raise ValueError(f"SQL error: {str(e)}")
+        if cursor.description is None:
+            raise ValueError("Only SELECT queries are supported")
+        names = [column[0] for column in cursor.description]
+    finally:
+        connection.close()
+    return _result_frame(rows[:max_rows], names), len(rows) > max_rows
+
+
+def run_duckdb(sql: str, frames: Mapping[str, pd.DataFrame], max_rows: int,
+               timeout: float) -> Tuple[pd.DataFrame, bool]:
+    """Run a read-only query with DuckDB, scanning the registered frames in place"""
+    statements = duckdb.extract_statements(sql)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError("Only a single SELECT query is supported")
+    connection = duckdb.connect(":memory:")
+    timer = threading.Timer(timeout, connection.interrupt)
+    try:
+        for name, frame in frames.items():
+            # Registered frames are scanned directly, without a copy
+            connection.register(name, frame)
+        # No reading or writing files (read_csv, COPY, ATTACH, ...) from queries
+        connection.execute("SET enable_external_access = false")
+        timer.start()
+        started = time.monotonic()
+        try:
+            connection.execute(sql)
+            rows = connection.fetchmany(max_rows + 1)
+        except duckdb.Error as e:
+            if time.monotonic() - started >= timeout:
+                raise TimeoutError(f"SQL query exceeded the {timeout:g}s time limit")
+            raise ValueError(f"SQL error: {str(e)}")
+        names = [column[0] for column in connection.description]
+    finally:
+        timer.cancel()
+        connection.close()
+    return _result_frame(rows[:max_rows], names), len(rows) > max_rows
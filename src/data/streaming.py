@@ -0,0 +1,127 @@
+"""
+Chunked streaming ingestion for the MCP Server
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from .cache import FileSignature, cache_key, dataset_version, file_signature
+from .loader import storage_options
+from .summary import chunk_moments, merge_moments
+
+DEFAULT_CHUNK_ROWS = int(os.getenv("MCP_STREAM_CHUNK_ROWS", "100000"))
+
+
+class StreamingLoad:
+    """A CSV file being parsed chunk by chunk
+
+    Rows parsed so far are visible through ``frame()`` while the load is still
+    running, so readers can page through the head of a file before it finishes.
+    """
+
+    def __init__(self, key: str, signature: FileSignature, chunksize: int = DEFAULT_CHUNK_ROWS,
+                 storage: str = "numpy"):
+        self.key = key
+        self.signature = signature
+        self.chunksize = chunksize
+        self.storage = storage
+        self.total_bytes = signature[1]
+        self.bytes_read = 0
+        self.rows_parsed = 0
+        self.done = False
+        # Mergeable statistics gathered per chunk, so the summary needs no extra pass
+        self.moments = None
+        self.started = time.monotonic()
+        self._chunks: List[pd.DataFrame] = []
+        self._frame: Optional[pd.DataFrame] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        """Version of the file being parsed; matches the version of the cached result"""
+        return dataset_version(self.key, self.signature)
+
+    def chunks(self) -> Iterator[int]:
+        """Parse the file, yielding the number of rows parsed after each chunk"""
+        with open(self.key, 'rb') as f:
+            for i, chunk in enumerate(pd.read_csv(f, chunksize=self.chunksize, **storage_options(self.storage))):
+                moments = chunk_moments(chunk)
+                with self._lock:
+                    self.moments = moments if i == 0 else merge_moments(self.moments, moments)
+                    self._chunks.append(chunk)
+                    self._frame = None
+                    self.rows_parsed += len(chunk)
+                    # The parser reads ahead in blocks, so this slightly overestimates
+                    self.bytes_read = min(f.tell(), self.total_bytes)
+                yield self.rows_parsed
+        with self._lock:
+            self.bytes_read = self.total_bytes
+            self.done = True
+
+    def frame(self) -> pd.DataFrame:
+        """Return every row parsed so far as a single frame"""
+        with self._lock:
+            if self._frame is None:
+                if not self._chunks:
+                    self._frame = pd.DataFrame()
+                elif len(self._chunks) == 1:
+                    self._frame = self._chunks[0]
+                else:
+                    # Collapse into one chunk so later calls only concatenate new rows
+                    self._frame = pd.concat(self._chunks, ignore_index=True)
+                    self._chunks = [self._frame]
+            return self._frame
+
+    def progress(self) -> Dict[str, Any]:
+        """Return rows parsed, bytes read and an estimate of the remaining time"""
+        elapsed = time.monotonic() - self.started
+        eta = None
+        if self.done:
+            eta = 0.0
+        elif self.bytes_read:
+            eta = elapsed * (self.total_bytes - self.bytes_read) / self.bytes_read
+        return {
+            "rows_parsed": self.rows_parsed,
+            "bytes_read": self.bytes_read,
+            "total_bytes": self.total_bytes,
+            "elapsed_seconds": elapsed,
+            "eta_seconds": eta,
+            "complete": self.done,
+        }
+
+
+class StreamingRegistry:
+    """Tracks streaming loads in progress so concurrent readers can share them"""
+
+    def __init__(self):
+        self._loads: Dict[str, StreamingLoad] = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_path: str) -> Optional[StreamingLoad]:
+        """Return the load in progress for a file, if any"""
+        with self._lock:
+            return self._loads.get(cache_key(file_path))
+
+    def start(self, file_path: str, chunksize: int = DEFAULT_CHUNK_ROWS,
+              storage: str = "numpy") -> Tuple[StreamingLoad, bool]:
+        """Return the load for a file, creating it if none is running
+
+        The boolean is True when the caller created the load and must drive it.
+        """
+        key = cache_key(file_path)
+        with self._lock:
+            load = self._loads.get(key)
+            if load is not None:
+                return load, False
+            load = StreamingLoad(key, file_signature(key), chunksize, storage)
+            self._loads[key] = load
+            return load, True
+
+    def finish(self, load: StreamingLoad) -> None:
+        """Forget a load once its result is in the dataset cache (or it failed)"""
+        with self._lock:
+            if self._loads.get(load.key) is load:
+                del self._loads[load.key]
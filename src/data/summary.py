@@ -0,0 +1,254 @@
+"""
+Memoized, mergeable statistical summaries of datasets
+"""
+import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUMMARY_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mcp-server", "summaries")
+DESCRIBE_PERCENTILES = (0.25, 0.5, 0.75)
+# Bump when the summary layout changes so stale files are ignored
+SUMMARY_FORMAT = "v1"
+
+
+@dataclass
+class ColumnMoments:
+    """Count, mean, sum of squared deviations, min and max of one numeric column
+
+    Moments of two chunks merge exactly (Chan et al.), so a summary can be
+    extended with appended rows without revisiting the rows already seen.
+    """
+    count: int = 0
+    mean: float = math.nan
+    m2: float = 0.0
+    min: float = math.nan
+    max: float = math.nan
+
+    @classmethod
+    def from_series(cls, series: pd.Series) -> "ColumnMoments":
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return cls()
+        mean = float(values.mean())
+        return cls(
+            count=len(values),
+            mean=mean,
+            m2=float(((values - mean) ** 2).sum()),
+            min=float(values.min()),
+            max=float(values.max()),
+        )
+
+    def merge(self, other: "ColumnMoments") -> "ColumnMoments":
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        return ColumnMoments(
+            count=count,
+            mean=self.mean + delta * other.count / count,
+            m2=self.m2 + other.m2 + delta * delta * self.count * other.count / count,
+            min=min(self.min, other.min),
+            max=max(self.max, other.max),
+        )
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+
+def _describable_columns(df: pd.DataFrame) -> List[Any]:
+    """Columns whose describe() output can be rebuilt from moments and quantiles"""
+    return [column for column in df.columns
+            if pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column])]
+
+
+def _numeric_describe(df: pd.DataFrame, columns: List[Any]) -> bool:
+    """Check that describe() summarizes exactly the given numeric columns"""
+    return bool(columns) and len(df.select_dtypes(include=['number', 'datetime']).columns) == len(columns)
+
+
+def chunk_moments(df: pd.DataFrame) -> Optional[Dict[Any, ColumnMoments]]:
+    """Return per-column moments of a chunk, or None if describe() would not be numeric"""
+    columns = _describable_columns(df)
+    if not _numeric_describe(df, columns):
+        return None
+    return {column: ColumnMoments.from_series(df[column]) for column in columns}
+
+
+def merge_moments(left: Optional[Dict[Any, ColumnMoments]],
+                  right: Optional[Dict[Any, ColumnMoments]]) -> Optional[Dict[Any, ColumnMoments]]:
+    """Merge the moments of two chunks of the same dataset"""
+    if left is None or right is None or list(left) != list(right):
+        return None
+    return {column: left[column].merge(right[column]) for column in left}
+
+
+def describe_from_moments(moments: Dict[Any, ColumnMoments], df: pd.DataFrame) -> Dict[Any, Dict[str, float]]:
+    """Build ``df.describe().to_dict()`` from merged moments
+
+    Only the quartiles need the column data; they are computed with a linear-time
+    selection rather than the sort describe() would do.
+    """
+    summary = {}
+    for column, m in moments.items():
+        values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+        values = values[~np.isnan(values)]
+        if len(values):
+            quartiles = np.quantile(values, DESCRIBE_PERCENTILES)
+        else:
+            quartiles = [math.nan] * len(DESCRIBE_PERCENTILES)
+        stats = {"count": float(m.count), "mean": m.mean, "std": m.std, "min": m.min}
+        for q, value in zip(DESCRIBE_PERCENTILES, quartiles):
+            stats[f"{q * 100:g}%"] = float(value)
+        stats["max"] = m.max
+        summary[column] = stats
+    return summary
+
+
+def summarize(df: pd.DataFrame, moments: Optional[Dict[Any, ColumnMoments]] = None) -> Dict[str, Any]:
+    """Return the statistical summary of a frame together with its mergeable moments"""
+    columns = _describable_columns(df)
+    if moments is None or list(moments) != columns or not _numeric_describe(df, columns):
+        moments = chunk_moments(df)
+    if moments is not None:
+        summary = describe_from_moments(moments, df)
+    else:
+        summary = df.describe().to_dict()
+    return {
+        "summary": summary,
+        "columns": df.columns.tolist(),
+        "rows": len(df),
+        "moments": moments,
+    }
+
+
+class SummaryStore:
+    """Summaries memoized by dataset content hash, in memory and as small JSON files
+
+    Identical files (e.g. the same upload from different users) share a single
+    computation, and the files let summaries survive process restarts.
+    """
+
+    def __init__(self, directory: Optional[str], max_entries: int = 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Return the memoized summary for a content hash"""
+        with self._lock:
+            result = self._memory.get(digest)
+            if result is not None:
+                self._memory.move_to_end(digest)
+                self._hits += 1
+                return result
+        result = self._read(digest)
+        with self._lock:
+            if result is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._remember(digest, result)
+        return result
+
+    def put(self, digest: str, result: Dict[str, Any]) -> None:
+        """Memoize a summary under a content hash"""
+        with self._lock:
+            self._remember(digest, result)
+        self._write(digest, result)
+
+    def get_or_compute(self, digest: str, df_factory: Callable[[], pd.DataFrame]) -> Dict[str, Any]:
+        """Return the summary for a content hash, computing it from ``df_factory()`` on a miss"""
+        result = self.get(digest)
+        if result is None:
+            result = summarize(df_factory())
+            self.put(digest, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return summary memo counters for operators"""
+        with self._lock:
+            return {"entries": len(self._memory), "hits": self._hits, "misses": self._misses}
+
+    def _remember(self, digest: str, result: Dict[str, Any]) -> None:
+        self._memory[digest] = result
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{SUMMARY_FORMAT}-{digest}.json")
+
+    def _read(self, digest: str) -> Optional[Dict[str, Any]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(digest)) as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable summary {digest}: {str(e)}")
+            return None
+        # Column names are stored as pairs so non-string names survive JSON
+        moments = raw["moments"]
+        return {
+            "summary": {column: stats for column, stats in raw["summary"]},
+            "columns": raw["columns"],
+            "rows": raw["rows"],
+            "moments": None if moments is None else {column: ColumnMoments(**m) for column, m in moments},
+        }
+
+    def _write(self, digest: str, result: Dict[str, Any]) -> None:
+        if not self.directory:
+            return
+        moments = result["moments"]
+        raw = {
+            "summary": list(result["summary"].items()),
+            "columns": result["columns"],
+            "rows": result["rows"],
+            "moments": None if moments is None else [(column, m.__dict__) for column, m in moments.items()],
+        }
+        path = self._path(digest)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(raw, f, default=str)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not persist summary {digest}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._trim()
+
+    def _trim(self) -> None:
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.startswith(f"{SUMMARY_FORMAT}-") and name.endswith(".json")]
+        if len(files) <= self.max_entries:
+            return
+        for path in sorted(files, key=lambda p: os.stat(p).st_mtime)[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,173 @@
+"""
+Incremental loading of rows appended to CSV files
+"""
+import io
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import (CategoricalDtype, infer_dtype, is_bool_dtype, is_datetime64_any_dtype,
+                              is_numeric_dtype, is_string_dtype)
+
+from .cache import DatasetCache
+from .loader import storage_options
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _parsed_as_text(dtype: Any) -> bool:
+    """Columns whose appended values must be read as strings to be converted like the rest"""
+    return (isinstance(dtype, CategoricalDtype) or is_datetime64_any_dtype(dtype)
+            or (is_string_dtype(dtype) and not is_bool_dtype(dtype)))
+
+
+def _is_number(dtype: Any) -> bool:
+    return is_numeric_dtype(dtype) and not is_bool_dtype(dtype)
+
+
+def read_appended(file_path: str, start: int, end: int, frame: pd.DataFrame,
+                  storage: str = "numpy") -> Optional[pd.DataFrame]:
+    """Parse the rows in bytes [start, end) of a CSV file whose first ``start`` bytes became ``frame``
+
+    Text-like columns of ``frame`` are read as strings so append_rows() can
+    convert them the way the first load did. Returns None when the byte range
+    does not consist of whole lines, or does not parse into the same columns,
+    and the file has to be read again from the start.
+    """
+    if frame.empty or start <= 0:
+        # Without rows the types of the first load were never inferred from data
+        return None
+    with open(file_path, 'rb') as f:
+        f.seek(start - 1)
+        data = f.read(end - start + 1)
+    # The old contents must have ended a line, and the new ones must end one too
+    if len(data) != end - start + 1 or data[:1] != b"\n" or data[-1:] != b"\n":
+        return None
+    options = storage_options(storage)
+    if storage == "arrow":
+        options["engine"] = "pyarrow"
+    text = {column: str for column in frame.columns if _parsed_as_text(frame[column].dtype)}
+    try:
+        tail = pd.read_csv(io.BytesIO(data[1:]), header=None, names=list(frame.columns), dtype=text, **options)
+    except pd.errors.EmptyDataError:
+        return frame.iloc[:0]
+    except (pd.errors.ParserError, ValueError):
+        return None
+    # Rows with extra fields would have been turned into an index
+    if not isinstance(tail.index, pd.RangeIndex) or list(tail.columns) != list(frame.columns):
+        return None
+    return tail
+
+
+def _aligned(column: pd.Series, tail: pd.Series) -> Optional[pd.Series]:
+    """Convert appended values to the dtype of the column they extend, or None if they do not fit"""
+    dtype = column.dtype
+    if isinstance(dtype, CategoricalDtype):
+        if infer_dtype(tail, skipna=True) not in ("string", "empty"):
+            return None
+        return tail
+    if is_datetime64_any_dtype(dtype):
+        converted = pd.to_datetime(tail, format="ISO8601", errors="coerce")
+        # Any value that did not parse would silently become NaT
+        if converted.isna().sum() != tail.isna().sum():
+            return None
+        return converted.astype(dtype)
+    if _parsed_as_text(dtype):
+        return tail.astype(dtype)
+    if _is_number(dtype) and _is_number(tail.dtype) and dtype != tail.dtype:
+        # Keep narrowed columns narrow when the new values fit, otherwise widen like a full parse
+        try:
+            converted = tail.astype(dtype)
+        except (TypeError, ValueError):
+            return tail
+        same = np.array_equal(converted.to_numpy(dtype='float64', na_value=np.nan),
+                              tail.to_numpy(dtype='float64', na_value=np.nan), equal_nan=True)
+        return converted if same else tail
+    return tail
+
+
+def append_rows(frame: pd.DataFrame, tail: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Return ``frame`` with the rows of ``tail`` (from read_appended) appended
+
+    Column dtypes stay as they were, or widen exactly as a full parse of the
+    longer file would (integers to floats); categorical columns gain the new
+    categories in sorted order. Returns None when a column would change kind.
+    """
+    if tail.empty:
+        return frame
+    columns: Dict[Any, pd.Series] = {}
+    for i, name in enumerate(frame.columns):
+        column = frame.iloc[:, i]
+        added = _aligned(column, tail.iloc[:, i])
+        if added is None:
+            return None
+        if isinstance(column.dtype, CategoricalDtype):
+            categories = column.cat.categories.union(pd.Index(added.dropna().unique()))
+            dtype = CategoricalDtype(categories, ordered=column.cat.ordered)
+            column = column.cat.set_categories(categories)
+            added = added.astype(dtype)
+        merged = pd.concat([column, added], ignore_index=True)
+        if merged.dtype != column.dtype and not (_is_number(merged.dtype) and _is_number(column.dtype)):
+            return None
+        columns[i] = merged
+    result = pd.concat(columns, axis=1)
+    result.columns = frame.columns
+    return result
+
+
+class DatasetWatcher:
+    """Polls cached datasets in a background thread so they stay fresh without a client call
+
+    Files that grew get their new rows appended (see DatasetCache); files that
+    were rewritten are dropped and parsed again with ``reload``.
+    """
+
+    def __init__(self, cache: DatasetCache, interval: float, reload: Callable[[str], Any],
+                 select: Callable[[str], bool] = lambda key: True):
+        self.cache = cache
+        self.interval = interval
+        self.reload = reload
+        self.select = select
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._polls = 0
+        self._reloads = 0
+
+    def start(self) -> None:
+        """Start polling every ``interval`` seconds"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="dataset-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop polling and wait for the current round to finish"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self) -> None:
+        """Bring every selected cached dataset up to date with its file once"""
+        for key in self.cache.keys():
+            if not self.select(key):
+                continue
+            try:
+                if self.cache.refresh(key) is None and os.path.exists(key):
+                    self.reload(key)
+                    self._reloads += 1
+            except Exception as e:
+                logger.warning(f"Could not refresh cached dataset {key}: {str(e)}")
+        self._polls += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return watcher counters for operators"""
+        return {"interval_seconds": self.interval, "polls": self._polls, "reloads": self._reloads}
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.poll()
@@ -0,0 +1,120 @@
+"""
+Bounded worker pool that keeps blocking data work off the event loop
+"""
+import functools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import anyio
+
+WORKER_MODES = ("thread", "process")
+
+
+class WorkerPool:
+    """Runs blocking calls in worker threads, at most ``max_in_flight`` at a time
+
+    Calls beyond the limit wait in a queue without holding a thread. In
+    ``process`` mode file parsing (see ``parse``) additionally moves to a pool
+    of worker processes so it does not contend for the GIL with other requests.
+    """
+
+    def __init__(self, max_in_flight: int, mode: str = "thread", processes: Optional[int] = None):
+        if mode not in WORKER_MODES:
+            raise ValueError(f"Unknown worker mode: {mode}")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.mode = mode
+        self.processes = processes
+        self._limiter = anyio.CapacityLimiter(max_in_flight)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+        self._failed = 0
+        self._peak_queued = 0
+        self._wait_seconds = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(*args, **kwargs)`` in a worker thread and return its result"""
+        submitted = time.perf_counter()
+        with self._lock:
+            self._submitted += 1
+            self._peak_queued = max(self._peak_queued, self._submitted - self._started)
+        started = False
+
+        def call() -> Any:
+            nonlocal started
+            with self._lock:
+                started = True
+                self._started += 1
+                self._wait_seconds += time.perf_counter() - submitted
+            return fn(*args, **kwargs)
+
+        try:
+            result = await anyio.to_thread.run_sync(call, limiter=self._limiter)
+        except BaseException:
+            with self._lock:
+                if started:
+                    self._failed += 1
+                else:
+                    # Cancelled while still queued
+                    self._submitted -= 1
+            raise
+        with self._lock:
+            self._completed += 1
+        return result
+
+    def parse(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a picklable parse function, in a worker process when in ``process`` mode"""
+        if self.mode != "process":
+            return fn(*args)
+        return self._process_pool().submit(fn, *args).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and throughput counters for operators"""
+        with self._lock:
+            queued = self._submitted - self._started
+            return {
+                "mode": self.mode,
+                "max_in_flight": self.max_in_flight,
+                "running": self._started - self._completed - self._failed,
+                "queued": queued,
+                "peak_queued": self._peak_queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_ms": 1000 * self._wait_seconds / self._started if self._started else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, if any were started"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # The server is multi-threaded, so start workers fresh rather than forking it
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+
+def pooled(pool: WorkerPool, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a blocking function as a coroutine function that runs it on ``pool``
+
+    The wrapper keeps the signature and docstring of ``fn``, so it can be
+    registered as an MCP tool in its place.
+    """
+    @functools.wraps(fn)
+    async def run(**kwargs: Any) -> Any:
+        return await pool.run(fn, **kwargs)
+    return run
@@ -2,19 +2,138 @@
 """
 MCP Server Implementation for CSV/Excel Processing and OPA Policy Evaluation
 """
+import anyio
+import base64
+import numpy as np
 import pandas as pd
 import json
 import os
-from typing import Dict, Any, List, Optional
-from mcp.server.fastmcp import FastMCP
-from mcp.types import TextResourceContents
+import urllib.parse
+from typing import Dict, Any, List, Optional, Tuple, Union
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.types import BlobResourceContents, TextResourceContents
+from data.cache import CachedDataset, DatasetCache, FileSignature, cache_key
+from data.dtypes import OptimizationReports, optimize_frame
+from data.handles import DEFAULT_HANDLE_TTL, DatasetHandle, HandleRegistry, is_handle
+from data.indexes import ColumnIndex, equality_positions
+from data.excel import EXCEL_LOADER
+from data.files import DEFAULT_RANGE_BYTES, FileReader
+from data.loader import CSV_EXTENSIONS, EXCEL_EXTENSIONS, STORAGE_MODES, is_supported, read_frame, storage_options
+from data.hashing import ContentHasher
+from data.sidecar import DEFAULT_SIDECAR_DIR, SidecarStore
+from data.summary import DEFAULT_SUMMARY_DIR, SummaryStore, chunk_moments, merge_moments, summarize
+from data.aggregate import aggregate_frame, compile_aggregations
+from data.encoding import encode_page
+from data.query import QueryError, compile_predicate, select_positions, validate_projection
+from data.pipeline import compile_pipeline
+from data.paging import MAX_PAGE_SIZE, page_frame, query_fingerprint, resolve_page
+from data.sampling import frame_chunks, sample_frames
+from data.sql import SqliteSnapshot, check_table_names, run_duckdb, run_sqlite, select_sql_engine
+from data.sorting import normalize_sort_keys, sort_permutation, top_k_permutation
+from data.streaming import DEFAULT_CHUNK_ROWS, StreamingRegistry
+from data.tail import DatasetWatcher, append_rows, read_appended
+from data.workers import WorkerPool, pooled
+from policy.batch import DEFAULT_BATCH_MAX_INPUTS, allow_bitmap, batch_inputs
+from policy.cache import DEFAULT_DECISION_ENTRIES, DEFAULT_DECISION_TTL, DecisionCache
+from policy.rego import PolicyEngine
+from policy.rows import row_mask, subject_key
 
 # Create an MCP server, binding to all interfaces
 mcp = FastMCP("MCP Data Processing Server", host="0.0.0.0", port=8000)
 
-# In-memory storage for demonstration purposes
-# In a production environment, this would be replaced with a proper database or file system
-DATA_STORAGE: Dict[str, pd.DataFrame] = {}
+# Parsed datasets shared by all data tools, bounded by deep memory usage and
+# invalidated when the underlying file changes. A CSV file that only grew has
+# just its new rows parsed and appended (MCP_TAIL_APPEND=false turns that off)
+DATASET_CACHE = DatasetCache(
+    max_bytes=int(os.getenv("MCP_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    policy=os.getenv("MCP_CACHE_POLICY", "lru"),
+    appender=(lambda entry, signature: append_dataset(entry, signature))
+    if os.getenv("MCP_TAIL_APPEND", "true").lower() in ("1", "true", "yes") else None,
+)
+
+# How parsed frames are held in memory: "numpy" (pandas defaults) or "arrow"
+# (Arrow-backed columns, memory-mapped from the sidecar when one exists)
+STORAGE_MODE = os.getenv("MCP_STORAGE_MODE", "numpy")
+if STORAGE_MODE not in STORAGE_MODES:
+    raise ValueError(f"MCP_STORAGE_MODE must be one of {STORAGE_MODES}")
+# Shrink numpy-mode frames at load time: downcast numerics, categorize
+# low-cardinality strings and parse ISO dates (Arrow mode is already compact)
+OPTIMIZE_DTYPES = (STORAGE_MODE == "numpy"
+                   and os.getenv("MCP_OPTIMIZE_DTYPES", "false").lower() in ("1", "true", "yes"))
+# Arrow-mode parses infer different types, so they get their own sidecars (as do optimized frames)
+SIDECAR_NAMESPACE = ("" if STORAGE_MODE == "numpy" else STORAGE_MODE) + (":optimized" if OPTIMIZE_DTYPES else "")
+
+# Per-column memory before/after dtype optimization of recently parsed datasets
+DTYPE_REPORTS = OptimizationReports()
+
+# Content hashes of dataset files, computed once per file version
+CONTENT_HASHES = ContentHasher()
+
+# Columnar copies of parsed files that survive restarts; set MCP_SIDECAR_DIR
+# to an empty string to disable them
+SIDECARS = SidecarStore(
+    directory=os.getenv("MCP_SIDECAR_DIR", DEFAULT_SIDECAR_DIR),
+    max_bytes=int(os.getenv("MCP_SIDECAR_MAX_BYTES", str(4 * 1024 * 1024 * 1024))),
+    hasher=CONTENT_HASHES,
+)
+
+# Statistical summaries keyed by content hash, shared with the Flask analyzer
+SUMMARIES = SummaryStore(os.getenv("MCP_SUMMARY_DIR", DEFAULT_SUMMARY_DIR))
+
+# CSV files currently being parsed in streaming mode
+STREAMING_LOADS = StreamingRegistry()
+
+# Handles for loaded datasets and for filtered/sorted/queried views of them;
+# data tools accept a handle id wherever they take a file path
+HANDLES = HandleRegistry(ttl=float(os.getenv("MCP_HANDLE_TTL", str(DEFAULT_HANDLE_TTL))))
+
+# Blocking data tools run here instead of on the event loop, so a slow parse
+# does not stall other sessions; MCP_WORKER_MODE=process also moves parsing
+# into worker processes
+WORKERS = WorkerPool(
+    max_in_flight=int(os.getenv("MCP_MAX_IN_FLIGHT", "8")),
+    mode=os.getenv("MCP_WORKER_MODE", "thread"),
+    processes=int(os.getenv("MCP_WORKER_PROCESSES", "0")) or None,
+)
+
+# In-process SQL over cached datasets: DuckDB when installed, SQLite otherwise.
+# Results are capped at MCP_SQL_MAX_ROWS rows and queries stopped after MCP_SQL_TIMEOUT seconds
+SQL_ENGINE = select_sql_engine(os.getenv("MCP_SQL_ENGINE", "auto"))
+SQL_MAX_ROWS = int(os.getenv("MCP_SQL_MAX_ROWS", "100000"))
+SQL_TIMEOUT = float(os.getenv("MCP_SQL_TIMEOUT", "30"))
+
+# With MCP_WATCH_INTERVAL seconds > 0, cached CSV datasets are polled in the
+# background: appended rows land in the cache and rewritten files are re-parsed
+WATCH_INTERVAL = float(os.getenv("MCP_WATCH_INTERVAL", "0"))
+WATCHER = DatasetWatcher(
+    DATASET_CACHE, WATCH_INTERVAL,
+    reload=lambda key: load_dataset(key),
+    select=lambda key: key.endswith(CSV_EXTENSIONS),
+)
+if WATCH_INTERVAL > 0:
+    WATCHER.start()
+
+# Byte/line ranges of raw files for the file:// resource; a read returns at most
+# MCP_RESOURCE_MAX_BYTES bytes
+FILE_READER = FileReader(max_bytes=int(os.getenv("MCP_RESOURCE_MAX_BYTES", str(DEFAULT_RANGE_BYTES))))
+
+# The Rego policies behind evaluate_opa_policy, compiled once at startup
+POLICY_DIR = os.getenv("MCP_POLICY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "policies"))
+POLICIES = PolicyEngine.from_directory(POLICY_DIR)
+# Changed policy files are recompiled; the directory is checked at most every
+# MCP_POLICY_RELOAD_INTERVAL seconds (0 checks on every evaluation)
+POLICY_RELOAD_INTERVAL = float(os.getenv("MCP_POLICY_RELOAD_INTERVAL", "5"))
+# Data tools called with a subject only return the rows this policy's allow rule
+# lets it see; each row is evaluated as input.document
+ROW_POLICY = os.getenv("MCP_ROW_POLICY", "attribute_based")
+# Most inputs one evaluate_opa_policy_batch call may carry
+POLICY_BATCH_MAX_INPUTS = int(os.getenv("MCP_POLICY_BATCH_MAX_INPUTS", str(DEFAULT_BATCH_MAX_INPUTS)))
+# Decisions keyed by the input attributes the policy reads, kept for
+# MCP_DECISION_CACHE_TTL seconds and flushed when the policy revision changes
+DECISIONS = DecisionCache(
+    ttl=float(os.getenv("MCP_DECISION_CACHE_TTL", str(DEFAULT_DECISION_TTL))),
+    max_entries=int(os.getenv("MCP_DECISION_CACHE_SIZE", str(DEFAULT_DECISION_ENTRIES))),
+)
 
 # User authentication information (simplified for demonstration)
 # In a production environment, this would be replaced with a proper authentication system
@@ -23,6 +142,305 @@ USERS = {
     "user": {"password": "user123", "role": "user"}
 }
 
+def blocking_tool():
+    """Register a synchronous tool that runs on the worker pool, like ``mcp.tool()``
+
+    The function itself is returned unchanged so it can still be called directly.
+    """
+    def decorator(fn):
+        mcp.add_tool(pooled(WORKERS, fn))
+        return fn
+    return decorator
+
+def dataset_namespace(sheet: Optional[str] = None) -> str:
+    """Content-hash namespace of a dataset: the storage mode plus the Excel sheet, if any"""
+    return SIDECAR_NAMESPACE if sheet is None else f"{SIDECAR_NAMESPACE}:sheet={sheet}"
+
+def optimized(file_path: str, sheet: Optional[str], frame: pd.DataFrame) -> pd.DataFrame:
+    """Apply the dtype optimization pass to a freshly parsed frame, if enabled"""
+    if not OPTIMIZE_DTYPES:
+        return frame
+    frame, report = optimize_frame(frame)
+    DTYPE_REPORTS.put(cache_key(file_path, sheet), report)
+    return frame
+
+def read_source(file_path: str, sheet: Optional[str] = None) -> pd.DataFrame:
+    """Parse a file from scratch; workbooks go to the Excel process pool"""
+    if file_path.endswith(EXCEL_EXTENSIONS):
+        frame = EXCEL_LOADER.read(file_path, sheet, **storage_options(STORAGE_MODE))
+    else:
+        frame = WORKERS.parse(read_frame, file_path, STORAGE_MODE, sheet)
+    return optimized(file_path, sheet, frame)
+
+def parse_dataset(file_path: str, sheet: Optional[str] = None) -> pd.DataFrame:
+    """Parse a file, loading its columnar sidecar instead when one exists"""
+    return SIDECARS.read_through(
+        file_path,
+        lambda path: read_source(path, sheet),
+        namespace=dataset_namespace(sheet),
+        arrow_backed=STORAGE_MODE == "arrow",
+    )
+
+def load_dataset(file_path: str, sheet: Optional[str] = None) -> CachedDataset:
+    """Return the parsed dataset for a file (or one sheet of it), going through the dataset cache"""
+    return DATASET_CACHE.get_or_load(file_path, lambda path: parse_dataset(path, sheet), sheet)
+
+def append_dataset(entry: CachedDataset, signature: FileSignature
+                   ) -> Optional[Tuple[pd.DataFrame, Dict[Any, Any]]]:
+    """Extend a cached CSV dataset with the rows appended to its file since it was parsed
+
+    Column indexes are extended with the new rows and the summary of the new
+    contents is derived by merging moments; other derived results are dropped.
+    Returns None when the file has to be parsed again.
+    """
+    if not entry.key.endswith(CSV_EXTENSIONS):
+        return None
+    tail = read_appended(entry.key, entry.signature[1], signature[1], entry.frame, STORAGE_MODE)
+    frame = None if tail is None else append_rows(entry.frame, tail)
+    if frame is None:
+        return None
+    start = len(entry.frame)
+    added = frame.iloc[start:]
+    derived = {}
+    for column, index in DATASET_CACHE.derived_of(entry, "index").items():
+        if frame[column].dtype == entry.frame[column].dtype:
+            derived[("index", column)] = index.extend(added[column], start)
+    # Only the appended bytes are hashed, and the summary is merged rather than recomputed
+    previous = CONTENT_HASHES.cached(entry.key, entry.signature, SIDECAR_NAMESPACE)
+    digest = CONTENT_HASHES.extend(entry.key, entry.signature, signature, SIDECAR_NAMESPACE)
+    summary = SUMMARIES.get(previous) if previous is not None and digest is not None else None
+    if summary is not None and summary["moments"] is not None:
+        moments = merge_moments(summary["moments"], chunk_moments(added))
+        if moments is not None:
+            SUMMARIES.put(digest, summarize(frame, moments))
+    return frame, derived
+
+def open_dataset(target: str, sheet: Optional[str] = None
+                 ) -> Tuple[DatasetHandle, CachedDataset, Optional[np.ndarray], Optional[List[str]]]:
+    """Resolve a data tool's file_path argument, which may also be a dataset handle
+
+    Returns the handle, its dataset, the row positions of a view in view order
+    (None for a whole dataset) and the columns a view is projected to.
+    """
+    if not is_handle(target):
+        dataset = load_dataset(target, sheet)
+        # The handle keeps the bare file path; the sheet is stored next to it
+        return HANDLES.register(cache_key(target), sheet, dataset.version), dataset, None, None
+    handle = HANDLES.get(target)
+    if handle is None:
+        raise ValueError(f"Unknown or expired dataset handle: {target}")
+    return (handle, *resolve_handle(handle))
+
+def resolve_handle(handle: DatasetHandle) -> Tuple[CachedDataset, Optional[np.ndarray], Optional[List[str]]]:
+    """Return the dataset behind a handle, with the rows and columns of a view"""
+    if handle.parent is None:
+        return load_dataset(handle.key, handle.sheet), None, None
+    dataset, positions, columns = resolve_handle(handle.parent)
+    if dataset.version != handle.version:
+        raise ValueError(f"The file behind dataset handle {handle.id} has changed; repeat the query for a new handle")
+    return dataset, view_rows(dataset, positions, handle), handle.columns or columns
+
+def view_rows(dataset: CachedDataset, positions: Optional[np.ndarray], handle: DatasetHandle) -> np.ndarray:
+    """Return the row positions of a view handle, in view order
+
+    Steps on a whole dataset reuse the column indexes, sort permutations and
+    query results cached with it; steps on another view are computed once
+    and cached under the view's handle.
+    """
+    kind, *args = handle.view
+    if kind == "pipeline":
+        return DATASET_CACHE.derive(dataset, ("view", handle.id), lambda frame: execute_plan(dataset, positions, args[0]))
+    if positions is None:
+        if kind == "filter":
+            return indexed_equality(dataset, *args)
+        if kind == "sort":
+            return sorted_positions(dataset, *args, len(dataset.frame))
+        if kind == "policy":
+            return policy_positions(dataset, *args)
+        return predicate_positions(dataset, args[0])
+    if kind == "policy":
+        # Resolved on every use, so a view cached under an old policy revision is never served
+        allowed = policy_positions(dataset, *args)
+        return DATASET_CACHE.derive(dataset, ("view", handle.id),
+                                    lambda frame: positions[np.isin(positions, allowed)])
+    
+    def compute(frame: pd.DataFrame) -> np.ndarray:
+        if kind == "sort":
+            return positions[sort_permutation(frame[args[0]].take(positions), *args)]
+        if kind == "filter":
+            matched = indexed_equality(dataset, *args)
+        else:
+            matched = predicate_positions(dataset, args[0])
+        # Keep the view's order
+        return positions[np.isin(positions, matched)]
+    
+    return DATASET_CACHE.derive(dataset, ("view", handle.id), compute)
+
+def view_frame(dataset: CachedDataset, positions: Optional[np.ndarray],
+               columns: Optional[List[str]]) -> pd.DataFrame:
+    """Materialize the rows and columns of a view (the frame itself for a whole dataset)"""
+    frame = dataset.frame if columns is None else dataset.frame[columns]
+    return frame if positions is None else frame.take(positions)
+
+def sqlite_snapshot(handle: DatasetHandle, dataset: CachedDataset, positions: Optional[np.ndarray],
+                    columns: Optional[List[str]]) -> SqliteSnapshot:
+    """Return the SQLite copy of a dataset or view, built once per dataset version"""
+    # Indexes persisted into the snapshot count against the cache budget too
+    return DATASET_CACHE.derive(dataset, ("sqlite", handle.id),
+                                lambda frame: SqliteSnapshot(view_frame(dataset, positions, columns),
+                                                             lambda nbytes: DATASET_CACHE.resize(dataset, nbytes)))
+
+def view_query(handle: DatasetHandle, *parts: Any) -> str:
+    """Cursor fingerprint of a query; the same query on different views gets different cursors"""
+    return query_fingerprint(*parts) if handle.parent is None else query_fingerprint(*parts, handle.id)
+
+def describe_handle(handle: DatasetHandle, frame: pd.DataFrame, columns: Optional[List[str]]) -> Dict[str, Any]:
+    """Return the handle of a dataset or view as reported to clients"""
+    dtypes = frame.dtypes if columns is None else frame.dtypes[columns]
+    return {
+        "id": handle.id,
+        "version": handle.version,
+        "schema": {str(column): str(dtype) for column, dtype in dtypes.items()},
+    }
+
+def indexed_equality(dataset: CachedDataset, column: str, value: Any) -> np.ndarray:
+    """Return the positions of rows where column == value, using a lazy hash index"""
+    if column not in dataset.frame.columns:
+        raise KeyError(column)
+    # The index is built on the first lookup and dropped with the dataset
+    index = DATASET_CACHE.derive(dataset, ("index", column), lambda df: ColumnIndex(df[column]))
+    positions = index.lookup(value)
+    if positions is None:
+        # Pin the scanned positions so later pages see the same result
+        positions = DATASET_CACHE.derive(
+            dataset, ("scan", query_fingerprint(column, value)),
+            lambda df: equality_positions(df, column, value)
+        )
+    return positions
+
+def sorted_positions(dataset: CachedDataset, columns: List[str], ascending: List[bool],
+                     needed: int) -> np.ndarray:
+    """Return at least the first ``needed`` positions of a dataset in sorted order
+
+    Full permutations are cached per (dataset version, columns, directions) so
+    repeated and paginated reads are index gathers. Small prefixes of a frame
+    without a cached permutation come from a top-k selection, also cached.
+    """
+    sort_key = ("sort", tuple(columns), tuple(ascending))
+    permutation = dataset.derived.get(sort_key)
+    if permutation is not None:
+        return permutation
+    top_key = ("top", tuple(columns), tuple(ascending))
+    prefix = dataset.derived.get(top_key)
+    if prefix is not None and len(prefix) >= needed:
+        return prefix
+    prefix = top_k_permutation(dataset.frame, columns, ascending, needed)
+    if prefix is not None:
+        DATASET_CACHE.store(dataset, top_key, prefix)
+        return prefix
+    permutation = DATASET_CACHE.derive(dataset, sort_key, lambda df: sort_permutation(df, columns, ascending))
+    # The full permutation supersedes any top-k prefix
+    DATASET_CACHE.discard(dataset, top_key)
+    return permutation
+
+def predicate_positions(dataset: CachedDataset, where: Optional[Dict[str, Any]]) -> np.ndarray:
+    """Return the positions of rows matching a query_data predicate, cached per predicate"""
+    predicate = compile_predicate(where, dataset.frame) if where is not None else None
+    # Reuse whatever equality indexes earlier filters have built
+    indexes = DATASET_CACHE.derived_of(dataset, "index")
+    return DATASET_CACHE.derive(
+        dataset, query_fingerprint("query", predicate), lambda frame: select_positions(predicate, frame, indexes)
+    )
+
+def policy_positions(dataset: CachedDataset, package: str, revision: str, subject: Dict[str, Any]) -> np.ndarray:
+    """Return the positions of the rows a subject may see, cached per dataset version, policy and subject
+
+    The policy's allow rule is compiled into one vectorized mask over the
+    dataset's columns; subjects that agree on every attribute the policy reads
+    share the cached positions.
+    """
+    if revision != POLICIES.revision:
+        raise ValueError("The policies have changed since this dataset handle was issued; repeat the query")
+    policy = POLICIES.policies.get(package)
+    if policy is None:
+        raise ValueError(f"Unknown policy: {package}")
+    return DATASET_CACHE.derive(
+        dataset, ("policy", package, revision, subject_key(policy, subject)),
+        lambda frame: np.flatnonzero(row_mask(policy, frame, subject))
+    )
+
+def restrict_rows(handle: DatasetHandle, dataset: CachedDataset, positions: Optional[np.ndarray],
+                  subject: Dict[str, Any]) -> Tuple[DatasetHandle, np.ndarray]:
+    """Narrow a dataset or view to the rows MCP_ROW_POLICY lets a subject see
+
+    Returns a view handle, so further tools called with it stay restricted.
+    """
+    POLICIES.reload(POLICY_RELOAD_INTERVAL)
+    view = HANDLES.derive(handle, dataset.version, ("policy", ROW_POLICY, POLICIES.revision, subject))
+    return view, view_rows(dataset, positions, view)
+
+def execute_plan(dataset: CachedDataset, positions: Optional[np.ndarray], plan: Dict[str, Any]) -> np.ndarray:
+    """Run a compiled pipeline plan over a dataset (or a view's rows), returning row positions
+
+    Only row positions move between stages: filters reuse cached predicate
+    results, a sort followed by a limit is a top-k selection and sorts of a
+    subset gather just their key columns. Nothing is projected until the page
+    is encoded.
+    """
+    frame = dataset.frame
+    for stage in plan["stages"]:
+        limit = stage["limit"]
+        if stage["where"] is not None:
+            matched = predicate_positions(dataset, stage["where"])
+            positions = matched if positions is None else positions[np.isin(positions, matched)]
+        if stage["sort"] is not None:
+            keys = [key for key, _ in stage["sort"]]
+            ascending = [direction for _, direction in stage["sort"]]
+            if positions is None:
+                positions = sorted_positions(dataset, keys, ascending, len(frame) if limit is None else limit)
+            else:
+                subset = frame[keys].take(positions)
+                permutation = top_k_permutation(subset, keys, ascending, limit) if limit is not None else None
+                if permutation is None:
+                    permutation = sort_permutation(subset, keys, ascending)
+                positions = positions[permutation]
+        if limit is not None:
+            positions = np.arange(min(limit, len(frame))) if positions is None else positions[:limit]
+    return np.arange(len(frame)) if positions is None else positions
+
+def finish_stream(load) -> CachedDataset:
+    """Cache a completed streaming load and persist its sidecar and summary"""
+    frame = optimized(load.key, None, load.frame())
+    SIDECARS.write_through(load.key, frame, namespace=SIDECAR_NAMESPACE)
+    if load.moments is not None:
+        # Moments were merged chunk by chunk; only the quartiles need the full frame
+        SUMMARIES.put(CONTENT_HASHES.digest(load.key, SIDECAR_NAMESPACE), summarize(frame, load.moments))
+    return DATASET_CACHE.put(load.key, frame, load.signature)
+
+async def stream_dataset(file_path: str, chunksize: int, ctx: Optional[Context]) -> CachedDataset:
+    """Parse a CSV file in chunks off the event loop, reporting MCP progress per chunk"""
+    load, created = STREAMING_LOADS.start(file_path, chunksize, STORAGE_MODE)
+    if not created:
+        # Another request is already driving this load; wait for it to land in the cache
+        while STREAMING_LOADS.get(file_path) is load:
+            await anyio.sleep(0.05)
+        return await WORKERS.run(load_dataset, file_path)
+    try:
+        chunks = load.chunks()
+        while await WORKERS.run(next, chunks, None) is not None:
+            if ctx is not None:
+                progress = load.progress()
+                eta = progress["eta_seconds"]
+                await ctx.report_progress(
+                    progress["bytes_read"],
+                    progress["total_bytes"],
+                    message=f"{progress['rows_parsed']} rows parsed"
+                            + (f", ETA {eta:.1f}s" if eta is not None else ""),
+                )
+        return await WORKERS.run(finish_stream, load)
+    finally:
+        STREAMING_LOADS.finish(load)
+
 @mcp.tool()
 def authenticate_user(username: str, password: str) -> Dict[str, Any]:
     """Authenticate a user and return their role"""
@@ -39,151 +457,439 @@ def list_tools() -> List[str]:
         "CSV/Excel Analyzer",
         "Data Filter",
         "Data Sort",
-        "OPA Policy Evaluator"
+        "Data Query",
+        "Group Aggregation",
+        "Query Pipeline",
+        "Data Sampler",
+        "SQL Query",
+        "Excel Sheet Lister",
+        "Memory Report",
+        "OPA Policy Evaluator",
+        "OPA Batch Policy Evaluator",
+        "Cache Statistics"
     ]
 
 @mcp.tool()
-def read_csv_excel(file_path: str) -> Dict[str, Any]:
-    """Read a CSV or Excel file and return its contents as JSON"""
+def get_cache_stats() -> Dict[str, Any]:
+    """Return dataset and policy decision cache counters, memory usage and worker queue depth"""
+    stats = DATASET_CACHE.stats()
+    stats["sidecar"] = SIDECARS.stats()
+    stats["summaries"] = SUMMARIES.stats()
+    stats["workers"] = WORKERS.stats()
+    stats["excel"] = EXCEL_LOADER.stats()
+    stats["handles"] = HANDLES.stats()
+    if WATCH_INTERVAL > 0:
+        stats["watcher"] = WATCHER.stats()
+    stats["policy_decisions"] = DECISIONS.stats()
+    return stats
+
+@mcp.tool()
+async def read_csv_excel(file_path: str, offset: int = 0, limit: Optional[int] = None,
+                         cursor: Optional[str] = None, format: str = "records", stream: bool = False,
+                         chunksize: int = DEFAULT_CHUNK_ROWS, sheet: Optional[str] = None,
+                         subject: Optional[Dict[str, Any]] = None,
+                         ctx: Optional[Context] = None) -> Dict[str, Any]:
+    """Read a CSV or Excel file and return one page of its contents as JSON
+    
+    Pass the returned next_cursor (or offset/limit) to fetch the following page.
+    format picks the page layout: records (one object per row), columns (one
+    array per column), split (one array per row) or arrow (base64 Arrow IPC).
+    With stream=True a CSV file is parsed in chunks with progress notifications,
+    and other calls can page through the rows parsed so far while it runs.
+    sheet selects an Excel sheet (the first one by default); see list_sheets.
+    The response includes a dataset handle whose id every data tool accepts in
+    place of file_path. With subject (the policy input without its document,
+    e.g. {"user": {"role": "user", "clearance_level": 2, "groups": ["eng"]}})
+    only the rows MCP_ROW_POLICY allows that subject to see are returned.
+    """
     try:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        elif file_path.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file_path)
-        else:
+        if not is_handle(file_path) and not is_supported(file_path):
             return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
         
-        # Store in memory for later use
-        DATA_STORAGE[file_path] = df
+        if is_handle(file_path):
+            handle, dataset, positions, columns = await WORKERS.run(open_dataset, file_path)
+            if subject is not None:
+                handle, positions = await WORKERS.run(restrict_rows, handle, dataset, positions, subject)
+            query = view_query(handle, "read")
+            offset, limit = resolve_page(offset, limit, cursor, dataset.version, query)
+            result = await WORKERS.run(page_frame, dataset.frame, positions, offset, limit,
+                                       dataset.version, query, columns=columns, fmt=format)
+            result["dataset"] = describe_handle(handle, dataset.frame, columns)
+            return result
         
-        return {
-            "data": df.to_dict(orient='records'),
-            "columns": df.columns.tolist(),
-            "rows": len(df)
-        }
+        query = query_fingerprint("read")
+        # A hit on a grown CSV file parses and appends its new rows, so look up off the event loop
+        dataset = await WORKERS.run(DATASET_CACHE.get, file_path, sheet)
+        if dataset is None:
+            # Rows parsed so far cannot be restricted until the whole dataset is loaded
+            load = STREAMING_LOADS.get(file_path) if sheet is None and subject is None else None
+            if load is not None:
+                # Serve the rows parsed so far; the result is marked incomplete
+                offset, limit = resolve_page(offset, limit, cursor, load.version, query)
+                result = await WORKERS.run(
+                    lambda: page_frame(load.frame(), None, offset, limit, load.version, query, fmt=format)
+                )
+                result["progress"] = load.progress()
+                return result
+            if (stream and sheet is None and file_path.endswith(CSV_EXTENSIONS)
+                    and not await WORKERS.run(SIDECARS.has_sidecar, file_path, SIDECAR_NAMESPACE)):
+                dataset = await stream_dataset(file_path, chunksize, ctx)
+            else:
+                dataset = await WORKERS.run(DATASET_CACHE.load, file_path,
+                                            lambda path: parse_dataset(path, sheet), sheet)
+        
+        handle = HANDLES.register(cache_key(file_path), sheet, dataset.version)
+        positions = None
+        if subject is not None:
+            handle, positions = await WORKERS.run(restrict_rows, handle, dataset, None, subject)
+            query = view_query(handle, "read")
+        offset, limit = resolve_page(offset, limit, cursor, dataset.version, query)
+        result = await WORKERS.run(page_frame, dataset.frame, positions, offset, limit,
+                                   dataset.version, query, fmt=format)
+        result["dataset"] = describe_handle(handle, dataset.frame, None)
+        return result
     except Exception as e:
         return {"error": f"Error reading file: {str(e)}"}
 
-@mcp.tool()
-def analyze_csv_excel(file_path: str) -> Dict[str, Any]:
+@blocking_tool()
+def analyze_csv_excel(file_path: str, sheet: Optional[str] = None) -> Dict[str, Any]:
     """Analyze a CSV or Excel file and return statistical summary"""
     try:
-        # Check if file is already loaded
-        if file_path in DATA_STORAGE:
-            df = DATA_STORAGE[file_path]
-        else:
-            # Load file if not already in memory
-            if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path)
-            elif file_path.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(file_path)
-            else:
-                return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
-            
-            # Store in memory for later use
-            DATA_STORAGE[file_path] = df
+        if not is_handle(file_path) and not is_supported(file_path):
+            return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
+        
+        if is_handle(file_path):
+            handle, dataset, positions, columns = open_dataset(file_path)
+            if positions is not None:
+                # Summaries of views are kept with their dataset, not on disk
+                result = DATASET_CACHE.derive(
+                    dataset, ("summary", handle.id), lambda frame: summarize(view_frame(dataset, positions, columns))
+                )
+                return {"summary": result["summary"], "columns": result["columns"], "rows": result["rows"]}
+            file_path, sheet = handle.key, handle.sheet
         
-        # Generate statistical summary
-        summary = df.describe().to_dict()
+        # Summaries are memoized by content hash, so identical files share one computation
+        digest = CONTENT_HASHES.digest(file_path, dataset_namespace(sheet))
+        result = SUMMARIES.get_or_compute(digest, lambda: load_dataset(file_path, sheet).frame)
         
         return {
-            "summary": summary,
-            "columns": df.columns.tolist(),
-            "rows": len(df)
+            "summary": result["summary"],
+            "columns": result["columns"],
+            "rows": result["rows"]
         }
     except Exception as e:
         return {"error": f"Error analyzing file: {str(e)}"}
 
-@mcp.tool()
-def filter_data(file_path: str, column: str, value: Any) -> Dict[str, Any]:
-    """Filter data by column value"""
+@blocking_tool()
+def list_sheets(file_path: str) -> Dict[str, Any]:
+    """List the sheets of an Excel workbook without parsing their contents"""
     try:
-        # Check if file is already loaded
-        if file_path in DATA_STORAGE:
-            df = DATA_STORAGE[file_path]
-        else:
-            return {"error": "File not loaded. Please read the file first."}
+        if not file_path.endswith(EXCEL_EXTENSIONS):
+            return {"error": "Unsupported file format. Please provide an Excel file."}
         
-        # Filter data
-        filtered_df = df[df[column] == value]
+        return {"sheets": EXCEL_LOADER.sheets(file_path)}
+    except Exception as e:
+        return {"error": f"Error listing sheets: {str(e)}"}
+
+@blocking_tool()
+def get_memory_report(file_path: str, sheet: Optional[str] = None) -> Dict[str, Any]:
+    """Return the dtype and memory usage of each column of a loaded dataset
+    
+    When MCP_OPTIMIZE_DTYPES is on, also reports each optimized column's
+    dtype and memory before and after the last parse of the file.
+    """
+    try:
+        if not is_handle(file_path) and not is_supported(file_path):
+            return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
         
+        _, dataset, _, _ = open_dataset(file_path, sheet)
+        usage = dataset.frame.memory_usage(deep=True, index=False)
         return {
-            "data": filtered_df.to_dict(orient='records'),
-            "columns": filtered_df.columns.tolist(),
-            "rows": len(filtered_df)
+            "columns": {
+                str(column): {"dtype": str(dtype), "bytes": int(usage[column])}
+                for column, dtype in dataset.frame.dtypes.items()
+            },
+            "bytes": int(usage.sum()),
+            "optimization": DTYPE_REPORTS.get(dataset.key),
         }
+    except Exception as e:
+        return {"error": f"Error reporting memory: {str(e)}"}
+
+@blocking_tool()
+def filter_data(file_path: str, column: str, value: Any, offset: int = 0,
+                limit: Optional[int] = None, cursor: Optional[str] = None,
+                format: str = "records", sheet: Optional[str] = None,
+                subject: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Filter data by column value, returning one page of matching rows
+    
+    The response includes a handle for the filtered rows, which other data
+    tools accept in place of file_path. With subject, only rows MCP_ROW_POLICY
+    allows that subject to see are matched (see read_csv_excel).
+    """
+    try:
+        if not is_handle(file_path) and not is_supported(file_path):
+            return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
+        
+        handle, dataset, rows, columns = open_dataset(file_path, sheet)
+        if subject is not None:
+            handle, rows = restrict_rows(handle, dataset, rows, subject)
+        query = view_query(handle, "filter", column, value)
+        offset, limit = resolve_page(offset, limit, cursor, dataset.version, query)
+        
+        view = HANDLES.derive(handle, dataset.version, ("filter", column, value))
+        positions = view_rows(dataset, rows, view)
+        
+        result = page_frame(dataset.frame, positions, offset, limit, dataset.version, query,
+                            columns=columns, fmt=format)
+        result["dataset"] = describe_handle(view, dataset.frame, columns)
+        return result
     except Exception as e:
         return {"error": f"Error filtering data: {str(e)}"}
 
-@mcp.tool()
-def sort_data(file_path: str, column: str, ascending: bool = True) -> Dict[str, Any]:
-    """Sort data by column"""
+@blocking_tool()
+def sort_data(file_path: str, column: Union[str, List[str]], ascending: Union[bool, List[bool]] = True,
+              offset: int = 0, limit: Optional[int] = None,
+              cursor: Optional[str] = None, format: str = "records",
+              sheet: Optional[str] = None) -> Dict[str, Any]:
+    """Sort data by one or more columns, returning one page of the sorted rows
+    
+    A small limit on a large file is answered with a top-k selection instead of
+    a full sort. The response includes a handle for the sorted rows.
+    """
     try:
-        # Check if file is already loaded
-        if file_path in DATA_STORAGE:
-            df = DATA_STORAGE[file_path]
+        if not is_handle(file_path) and not is_supported(file_path):
+            return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
+        
+        keys, ascending = normalize_sort_keys(column, ascending)
+        handle, dataset, rows, columns = open_dataset(file_path, sheet)
+        query = view_query(handle, "sort", keys, ascending)
+        offset, limit = resolve_page(offset, limit, cursor, dataset.version, query)
+        
+        view = HANDLES.derive(handle, dataset.version, ("sort", keys, ascending))
+        if rows is None:
+            positions = sorted_positions(dataset, keys, ascending, offset + limit)
+            total = len(dataset.frame)
         else:
-            return {"error": "File not loaded. Please read the file first."}
+            positions = view_rows(dataset, rows, view)
+            total = len(positions)
+        
+        result = page_frame(dataset.frame, positions, offset, limit, dataset.version, query,
+                            total=total, columns=columns, fmt=format)
+        result["dataset"] = describe_handle(view, dataset.frame, columns)
+        return result
+    except Exception as e:
+        return {"error": f"Error sorting data: {str(e)}"}
+
+@blocking_tool()
+def query_data(file_path: str, where: Optional[Dict[str, Any]] = None,
+               columns: Optional[List[str]] = None, offset: int = 0,
+               limit: Optional[int] = None, cursor: Optional[str] = None,
+               format: str = "records", sheet: Optional[str] = None) -> Dict[str, Any]:
+    """Filter data with a predicate tree and return one page of the projected columns
+    
+    Leaves are {"column", "op", "value"} with op one of ==, !=, <, <=, >, >=, in,
+    between, contains, is_null; combine them with {"and": [...]}, {"or": [...]}
+    and {"not": {...}}. Nulls only match is_null. The response includes a handle
+    for the matching rows and projected columns.
+    """
+    try:
+        if not is_handle(file_path) and not is_supported(file_path):
+            return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
+        
+        handle, dataset, rows, visible = open_dataset(file_path, sheet)
+        df = dataset.frame
+        predicate = compile_predicate(where, df) if where is not None else None
+        projection = validate_projection(columns, df)
+        if projection is not None and visible is not None:
+            hidden = [column for column in projection if column not in visible]
+            if hidden:
+                raise QueryError(f"Unknown columns in projection: {', '.join(map(str, hidden))}")
+        query = view_query(handle, "query", predicate)
+        offset, limit = resolve_page(offset, limit, cursor, dataset.version, query)
+        
+        view = HANDLES.derive(handle, dataset.version, ("query", where), projection)
+        positions = view_rows(dataset, rows, view)
+        projection = projection or visible
+        
+        result = page_frame(df, positions, offset, limit, dataset.version, query,
+                            columns=projection, fmt=format)
+        result["dataset"] = describe_handle(view, df, projection)
+        return result
+    except Exception as e:
+        return {"error": f"Error querying data: {str(e)}"}
+
+@blocking_tool()
+def group_aggregate(file_path: str, by: Union[str, List[str]], aggregations: List[Dict[str, Any]],
+                    where: Optional[Dict[str, Any]] = None, offset: int = 0,
+                    limit: Optional[int] = None, cursor: Optional[str] = None,
+                    format: str = "records", sheet: Optional[str] = None) -> Dict[str, Any]:
+    """Group rows by one or more columns and return only the aggregated result
+    
+    Each aggregation is {"func", "column", "alias"} with func one of count, size,
+    sum, mean, min, max, nunique or quantile (which also takes "q"). An optional
+    where predicate (same format as query_data) filters rows first.
+    """
+    try:
+        if not is_handle(file_path) and not is_supported(file_path):
+            return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
+        
+        handle, dataset, rows, _ = open_dataset(file_path, sheet)
+        df = dataset.frame
+        keys, specs = compile_aggregations(by, aggregations, df)
+        predicate = compile_predicate(where, df) if where is not None else None
+        query = view_query(handle, "group", keys, specs, predicate)
+        offset, limit = resolve_page(offset, limit, cursor, dataset.version, query)
+        
+        def compute(frame: pd.DataFrame) -> pd.DataFrame:
+            positions = rows
+            if predicate is not None:
+                matched = select_positions(predicate, frame, DATASET_CACHE.derived_of(dataset, "index"))
+                positions = matched if rows is None else rows[np.isin(rows, matched)]
+            return aggregate_frame(frame, keys, specs, positions)
         
-        # Sort data
-        sorted_df = df.sort_values(by=column, ascending=ascending)
+        # Keep the (small) grouped result so every page comes from the same computation
+        result = DATASET_CACHE.derive(dataset, query, compute)
+        
+        return page_frame(result, None, offset, limit, dataset.version, query, fmt=format)
+    except Exception as e:
+        return {"error": f"Error aggregating data: {str(e)}"}
+
+@blocking_tool()
+def run_pipeline(file_path: str, steps: List[Dict[str, Any]], offset: int = 0,
+                 limit: Optional[int] = None, cursor: Optional[str] = None,
+                 format: str = "records", sheet: Optional[str] = None) -> Dict[str, Any]:
+    """Run several query steps in one call and return one page of the final result
+    
+    steps is an ordered list of {"filter": predicate} (same format as
+    query_data), {"sort": {"by": column(s), "ascending": bool(s)}},
+    {"select": [columns]} and {"limit": n}. The steps are planned together:
+    filters run before sorts, sorts and limits fuse into top-k selections and
+    only the final page is materialized. The response includes the plan and a
+    handle for the full result.
+    """
+    try:
+        if not is_handle(file_path) and not is_supported(file_path):
+            return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
+        
+        handle, dataset, rows, visible = open_dataset(file_path, sheet)
+        plan = compile_pipeline(steps, dataset.frame)
+        if plan["columns"] is not None and visible is not None:
+            hidden = [column for column in plan["columns"] if column not in visible]
+            if hidden:
+                raise QueryError(f"Unknown columns in projection: {', '.join(map(str, hidden))}")
+        query = view_query(handle, "pipeline", plan)
+        offset, limit = resolve_page(offset, limit, cursor, dataset.version, query)
+        
+        # Results are cached per (dataset version, normalized plan) through the view's handle
+        view = HANDLES.derive(handle, dataset.version, ("pipeline", plan), plan["columns"])
+        positions = view_rows(dataset, rows, view)
+        columns = plan["columns"] or visible
+        
+        result = page_frame(dataset.frame, positions, offset, limit, dataset.version, query,
+                            columns=columns, fmt=format)
+        result["plan"] = plan
+        result["dataset"] = describe_handle(view, dataset.frame, columns)
+        return result
+    except Exception as e:
+        return {"error": f"Error running pipeline: {str(e)}"}
+
+@blocking_tool()
+def sample_dataset(file_path: str, n: int = 100, stratify_by: Optional[str] = None, seed: int = 0,
+                   format: str = "records", sheet: Optional[str] = None) -> Dict[str, Any]:
+    """Return a reproducible random sample of n rows without loading the whole file
+    
+    CSV files are streamed in chunks through a reservoir, so memory stays fixed
+    whatever the file size. A dataset already in the cache, a dataset handle or
+    an Excel sheet is sampled in memory, with the same result for the same seed.
+    stratify_by samples up to n rows for every distinct value of a column.
+    Rows come back in file order.
+    """
+    try:
+        if not is_handle(file_path) and not is_supported(file_path):
+            return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
+        if not 0 <= n <= MAX_PAGE_SIZE:
+            return {"error": f"n must be between 0 and {MAX_PAGE_SIZE}"}
+        
+        dataset = None if is_handle(file_path) else DATASET_CACHE.get(file_path, sheet)
+        if is_handle(file_path) or dataset is not None or file_path.endswith(EXCEL_EXTENSIONS):
+            positions = columns = None
+            if is_handle(file_path):
+                _, dataset, positions, columns = open_dataset(file_path)
+            elif dataset is None:
+                # Workbooks cannot be parsed incrementally
+                dataset = load_dataset(file_path, sheet)
+            sample = sample_frames(frame_chunks(view_frame(dataset, positions, columns), DEFAULT_CHUNK_ROWS),
+                                   n, seed, stratify_by)
+            source = "cache"
+        else:
+            if sheet is not None:
+                raise ValueError("A sheet can only be selected in Excel files")
+            with pd.read_csv(file_path, chunksize=DEFAULT_CHUNK_ROWS, **storage_options(STORAGE_MODE)) as chunks:
+                sample = sample_frames(chunks, n, seed, stratify_by)
+            source = "stream"
         
         return {
-            "data": sorted_df.to_dict(orient='records'),
-            "columns": sorted_df.columns.tolist(),
-            "rows": len(sorted_df)
+            **encode_page(sample, format),
+            "format": format,
+            "columns": sample.columns.tolist(),
+            "rows": len(sample),
+            "source": source,
         }
     except Exception as e:
-        return {"error": f"Error sorting data: {str(e)}"}
+        return {"error": f"Error sampling data: {str(e)}"}
+
+@blocking_tool()
+def sql_query(query: str, tables: Dict[str, str], offset: int = 0, limit: Optional[int] = None,
+              cursor: Optional[str] = None, format: str = "records") -> Dict[str, Any]:
+    """Run a read-only SQL SELECT over one or more datasets and return one page of the result
+    
+    tables maps each table name used in the query to a file path or a dataset
+    handle id (use a handle to query an Excel sheet or a filtered view). At
+    most MCP_SQL_MAX_ROWS result rows are kept ("truncated" tells whether rows
+    were cut) and queries are stopped after MCP_SQL_TIMEOUT seconds.
+    """
+    try:
+        check_table_names(list(tables))
+        if any(not is_handle(target) and not is_supported(target) for target in tables.values()):
+            return {"error": "Unsupported file format. Please provide a CSV or Excel file."}
+        
+        opened = {name: open_dataset(target) for name, target in tables.items()}
+        # Cursors and the cached result follow the version of every table
+        dataset = next(iter(opened.values()))[1]
+        versions = sorted((name, handle.id, source.version) for name, (handle, source, _, _) in opened.items())
+        query_id = query_fingerprint("sql", SQL_ENGINE, query, versions)
+        offset, limit = resolve_page(offset, limit, cursor, dataset.version, query_id)
+        
+        def compute(_: pd.DataFrame) -> pd.DataFrame:
+            if SQL_ENGINE == "duckdb":
+                frames = {name: view_frame(*view) for name, (_, *view) in opened.items()}
+                result, truncated = run_duckdb(query, frames, SQL_MAX_ROWS, SQL_TIMEOUT)
+            else:
+                snapshots = {name: sqlite_snapshot(*view) for name, view in opened.items()}
+                result, truncated = run_sqlite(query, snapshots, SQL_MAX_ROWS, SQL_TIMEOUT)
+            result.attrs["truncated"] = truncated
+            return result
+        
+        # Keep the result so every page comes from the same execution
+        result = DATASET_CACHE.derive(dataset, ("sql", query_id), compute)
+        
+        page = page_frame(result, None, offset, limit, dataset.version, query_id, fmt=format)
+        page["truncated"] = result.attrs["truncated"]
+        page["engine"] = SQL_ENGINE
+        return page
+    except Exception as e:
+        return {"error": f"Error running SQL query: {str(e)}"}
 
 @mcp.tool()
 def evaluate_opa_policy(policy_name: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
     """Evaluate an OPA policy with input data"""
-    # This is a simplified implementation
-    # In a real implementation, this would call the OPA service
-    
-    # Simple policy evaluation logic
-    if policy_name == "simple":
-        # Allow admins to do anything, users to read only
-        user_role = input_data.get("user", {}).get("role", "")
-        action = input_data.get("action", "")
-        
-        if user_role == "admin":
-            allowed = True
-        elif user_role == "user" and action == "read":
-            allowed = True
-        else:
-            allowed = False
-            
-    elif policy_name == "advanced":
-        # Users can access documents in their department
-        user_role = input_data.get("user", {}).get("role", "")
-        user_department = input_data.get("user", {}).get("department", "")
-        doc_department = input_data.get("document", {}).get("department", "")
-        action = input_data.get("action", "")
-        
-        if user_role == "admin":
-            allowed = True
-        elif user_role == "user" and action == "read":
-            allowed = True
-        elif user_role == "user" and action == "write" and user_department == doc_department:
-            allowed = True
-        else:
-            allowed = False
-            
-    elif policy_name == "attribute_based":
-        # Users can access documents based on clearance level
-        user_role = input_data.get("user", {}).get("role", "")
-        user_clearance = input_data.get("user", {}).get("clearance_level", 0)
-        doc_classification = input_data.get("document", {}).get("classification_level", 0)
-        
-        if user_role == "admin":
-            allowed = True
-        elif user_role == "user" and user_clearance >= doc_classification:
-            allowed = True
-        else:
-            allowed = False
-    else:
+    # The policies/*.rego files are compiled at startup and evaluated in-process
+    POLICIES.reload(POLICY_RELOAD_INTERVAL)
+    try:
+        revision = POLICIES.revision
+        allowed = DECISIONS.decide(POLICIES.decision_key(policy_name, input_data), revision,
+                                   lambda: POLICIES.evaluate(policy_name, input_data) is True)
+    except KeyError:
         allowed = False
     
     return {
@@ -192,15 +898,56 @@ def evaluate_opa_policy(policy_name: str, input_data: Dict[str, Any]) -> Dict[st
         "input": input_data
     }
 
+@blocking_tool()
+def evaluate_opa_policy_batch(policy_name: str, subject: Optional[Dict[str, Any]] = None,
+                              resources: Optional[List[Any]] = None, resource_key: str = "document",
+                              inputs: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Evaluate an OPA policy for many inputs in one call and return an allow bitmap
+    
+    Pass one subject plus many resources (each input is the subject with
+    the resource at resource_key, e.g. {"user": ..., "action": "read"} and a
+    list of documents), or a list of full inputs. The inputs are not echoed:
+    bitmap is base64 where bit i % 8 (least significant first) of byte i // 8
+    is the decision for input i. An unknown policy denies every input.
+    """
+    try:
+        batch = batch_inputs(inputs, subject, resources, resource_key, POLICY_BATCH_MAX_INPUTS)
+        POLICIES.reload(POLICY_RELOAD_INTERVAL)
+        try:
+            decisions = POLICIES.evaluate_many(policy_name, batch, vary=None if inputs is not None else resource_key)
+        except KeyError:
+            decisions = [False] * len(batch)
+        return {"policy": policy_name, **allow_bitmap(decisions)}
+    except Exception as e:
+        return {"error": f"Error evaluating policy batch: {str(e)}"}
+
 @mcp.resource("file://{file_path}")
-def get_file_content(file_path: str) -> TextResourceContents:
-    """Get the content of a file"""
+def get_file_content(file_path: str) -> Union[TextResourceContents, BlobResourceContents]:
+    """Get the content of a file, one range at a time
+    
+    Append a query to pick the range: ?offset=&length= for bytes, or
+    ?line=&lines= for lines (0-based). Without one the first
+    MCP_RESOURCE_MAX_BYTES bytes are returned. _meta carries the file's etag,
+    size and the next_offset (or next_line) to continue from; pass the etag
+    back as ?if_none_match= to get an empty not_modified response when the
+    file has not changed. Binary files are returned base64-encoded as a blob.
+    """
+    uri = f"file://{file_path}"
     try:
-        with open(file_path, 'r') as f:
-            content = f.read()
-        return TextResourceContents(text=content, uri=f"file://{file_path}")
+        path, _, query = file_path.partition("?")
+        params = dict(urllib.parse.parse_qsl(query))
+        unknown = set(params) - {"offset", "length", "line", "lines", "if_none_match"}
+        if unknown:
+            raise ValueError(f"Unknown range parameters: {', '.join(sorted(unknown))}")
+        numbers = {name: int(params[name]) for name in ("offset", "length", "line", "lines") if name in params}
+        part = FILE_READER.read(path, if_none_match=params.get("if_none_match"), **numbers)
+        if part.binary:
+            return BlobResourceContents(blob=base64.b64encode(part.data).decode(), uri=uri,
+                                        mimeType=part.mime_type, _meta=part.meta)
+        return TextResourceContents(text=part.data.decode("utf-8", errors="replace"), uri=uri,
+                                    mimeType=part.mime_type, _meta=part.meta)
     except Exception as e:
-        return TextResourceContents(text=f"Error reading file: {str(e)}", uri=f"file://{file_path}")
+        return TextResourceContents(text=f"Error reading file: {str(e)}", uri=uri)
 
 @mcp.prompt()
 def csv_analysis_prompt(file_path: str) -> str:
@@ -211,6 +958,8 @@ def csv_analysis_prompt(file_path: str) -> str:
     2. Information about categorical columns
     3. Any interesting patterns or outliers you notice
     4. Suggestions for data visualization
+    
+    Use sample_dataset to look at representative rows instead of reading the whole file.
     """
 
 @mcp.prompt()
@@ -0,0 +1,81 @@
+"""
+Evaluating one policy for many inputs in a single call, answered as an allow bitmap
+"""
+import base64
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Inputs a single batch call may carry
+DEFAULT_BATCH_MAX_INPUTS = 100000
+_PACKAGE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+
+def batch_inputs(inputs: Optional[List[Dict[str, Any]]] = None, subject: Optional[Dict[str, Any]] = None,
+                 resources: Optional[List[Any]] = None, resource_key: str = "document",
+                 max_inputs: int = DEFAULT_BATCH_MAX_INPUTS) -> List[Dict[str, Any]]:
+    """Return the inputs of a batch: ``inputs`` as given, or ``subject`` with each resource at ``resource_key``
+
+    ``subject`` holds the attributes shared by every input (for example
+    ``{"user": {...}, "action": "read"}``); each resource only adds its own.
+    """
+    if (inputs is None) == (resources is None):
+        raise ValueError("Pass either inputs, or subject and resources")
+    if inputs is not None:
+        if not all(isinstance(item, dict) for item in inputs):
+            raise ValueError("Every input must be an object")
+        batch = inputs
+    else:
+        subject = subject or {}
+        if not isinstance(subject, dict):
+            raise ValueError("subject must be an object")
+        batch = [{**subject, resource_key: resource} for resource in resources]
+    if len(batch) > max_inputs:
+        raise ValueError(f"A batch holds at most {max_inputs} inputs, got {len(batch)}")
+    return batch
+
+
+def allow_bitmap(decisions: Sequence[bool]) -> Dict[str, Any]:
+    """Pack decisions into a base64 bitmap: bit i % 8 (least significant first) of byte i // 8 is input i"""
+    bits = np.fromiter((decision is True for decision in decisions), dtype=bool, count=len(decisions))
+    return {
+        "count": len(bits),
+        "allowed_count": int(bits.sum()),
+        "bitmap": base64.b64encode(np.packbits(bits, bitorder="little").tobytes()).decode(),
+    }
+
+
+def unpack_bitmap(bitmap: str, count: int) -> List[bool]:
+    """Decode an allow_bitmap() back into one boolean per input"""
+    bits = np.unpackbits(np.frombuffer(base64.b64decode(bitmap), dtype=np.uint8), count=count, bitorder="little")
+    return bits.astype(bool).tolist()
+
+
+def opa_batch_query(package: str, rule: str = "allow", shared: bool = False) -> str:
+    """Return a Rego query for OPA's /v1/query API that evaluates ``rule`` for every input of a batch
+
+    The query input is ``{"inputs": [...]}``, or ``{"subject": ..., "resources":
+    [...], "key": ...}`` when ``shared``. The result binds ``decisions`` to an
+    object from input index to decision; undefined decisions are left out.
+    """
+    package = package.replace("/", ".")
+    if not _PACKAGE.fullmatch(package) or not _PACKAGE.fullmatch(rule):
+        raise ValueError(f"Invalid policy or rule name: {package}/{rule}")
+    if shared:
+        # Only the resources are repeated; each input is built inside OPA
+        item = "resource := input.resources[i]; doc := object.union(input.subject, {input.key: resource})"
+    else:
+        item = "doc := input.inputs[i]"
+    return f"decisions := {{i: allowed | some i; {item}; allowed := data.{package}.{rule} with input as doc}}"
+
+
+def opa_batch_decisions(result: Dict[str, Any], count: int) -> List[bool]:
+    """Turn the response of an opa_batch_query() into one decision per input"""
+    rows = result.get("result") or [{}]
+    decided = rows[0].get("decisions") or {}
+    decisions = [False] * count
+    for index, allowed in decided.items():
+        # OPA writes the numeric keys of the object as strings
+        decisions[int(index)] = allowed is True
+    return decisions
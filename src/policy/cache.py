@@ -0,0 +1,129 @@
+"""
+Recent policy decisions, reused while the policies they came from are unchanged
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Seconds a cached decision is trusted
+DEFAULT_DECISION_TTL = 60.0
+DEFAULT_DECISION_ENTRIES = 10000
+MISSING = object()
+
+
+def canonical(value: Any) -> Optional[str]:
+    """Serialize a JSON value so equal documents give equal strings, or None if it is not JSON"""
+    try:
+        return json.dumps(value, sort_keys=True, separators=(",", ":"), allow_nan=False)
+    except (TypeError, ValueError):
+        return None
+
+
+class DecisionCache:
+    """Policy decisions keyed by what they were computed from, for ``ttl`` seconds
+
+    Every entry belongs to one policy revision; the first lookup or store
+    under a different revision flushes the cache. The least recently used
+    decision is dropped once ``max_entries`` are held. Hits are credited with
+    the mean time of an evaluation, so stats() shows the latency the cache saved.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_DECISION_TTL, max_entries: int = DEFAULT_DECISION_ENTRIES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.revision: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        self._evictions = 0
+        self._flushes = 0
+        self._evaluation_seconds = 0.0
+        self._saved_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def lookup(self, key: Optional[Hashable], revision: Optional[str] = None) -> Any:
+        """Return the cached decision for a key, or MISSING
+
+        A ``revision`` other than the one the cache holds flushes it first;
+        None leaves the revision to be learned from the next store().
+        """
+        if key is None or not self.enabled:
+            return MISSING
+        with self._lock:
+            if revision is not None:
+                self._adopt(revision)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                return MISSING
+            self._entries.move_to_end(key)
+            self._hits += 1
+            if self._misses:
+                self._saved_seconds += self._evaluation_seconds / self._misses
+            return entry[1]
+
+    def store(self, key: Optional[Hashable], decision: Any, revision: str, elapsed: float) -> None:
+        """Remember a decision that took ``elapsed`` seconds to evaluate under ``revision``"""
+        with self._lock:
+            self._misses += 1
+            self._evaluation_seconds += elapsed
+            if key is None or not self.enabled:
+                return
+            self._adopt(revision)
+            self._entries[key] = (self.clock() + self.ttl, decision)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def decide(self, key: Optional[Hashable], revision: str, evaluate: Callable[[], Any]) -> Any:
+        """Return the cached decision for a key, or evaluate and cache it"""
+        decision = self.lookup(key, revision)
+        if decision is MISSING:
+            start = time.perf_counter()
+            decision = evaluate()
+            self.store(key, decision, revision, time.perf_counter() - start)
+        return decision
+
+    def clear(self) -> None:
+        """Drop every cached decision"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit ratio, flush/expiry counters and the latency saved by hits"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "revision": self.revision,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "expirations": self._expirations,
+                "evictions": self._evictions,
+                "flushes": self._flushes,
+                "mean_evaluation_ms": self._evaluation_seconds / self._misses * 1000 if self._misses else 0.0,
+                "saved_seconds": self._saved_seconds,
+            }
+
+    def _adopt(self, revision: str) -> None:
+        if revision != self.revision:
+            if self._entries:
+                self._entries.clear()
+                self._flushes += 1
+            self.revision = revision
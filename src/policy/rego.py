@@ -0,0 +1,641 @@
+"""
+In-process evaluation of the Rego policies in policies/, compiled once into closures
+"""
+import hashlib
+import json
+import logging
+import operator
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Supported Rego: `package`, `default <rule> = <value>`, rules `<name> [= <value>] [if] { ... }`
+# whose bodies are expressions (`not` allowed) comparing `input` references, rule names
+# and literals, and iteration over arrays and objects with `[_]`.
+
+_TOKEN = re.compile(r"""
+    (?P<space>[ \t\r]+)
+  | (?P<comment>\#[^\n]*)
+  | (?P<newline>\n)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<op>==|!=|<=|>=|:=|<|>|=)
+  | (?P<punct>[{}\[\].;])
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+""", re.VERBOSE)
+_COMPARISONS = {
+    "==": operator.eq, "=": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+_LITERALS = {"true": True, "false": False, "null": None}
+# Marks `[_]` in a reference path
+_ITERATE = object()
+UNDEFINED = object()
+# Types of attribute values that can be part of a decision key as they are
+_SCALARS = frozenset((str, int, float, bool, type(None), type(UNDEFINED)))
+
+Token = Tuple[str, str, int]
+Evaluator = Callable[[Any], Any]
+
+
+class RegoError(ValueError):
+    """Raised when a policy cannot be parsed or uses Rego outside the supported subset"""
+
+
+def _kind(value: Any) -> int:
+    """Rank of a value's type in Rego's ordering of values of different types"""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, list):
+        return 4
+    return 5
+
+
+def _compare(op: Callable[[Any, Any], bool], left: Any, right: Any) -> bool:
+    """Compare two defined values the way Rego does: by type first, then by value"""
+    if type(left) is type(right):
+        try:
+            return bool(op(left, right))
+        except TypeError:
+            return False
+    left_kind, right_kind = _kind(left), _kind(right)
+    if left_kind != right_kind:
+        # 1 == true is false in Rego even though it holds in Python
+        return op(left_kind, right_kind)
+    try:
+        return bool(op(left, right))
+    except TypeError:
+        return False
+
+
+def _frozen(value: Any) -> Hashable:
+    """A hashable copy of a JSON value that keeps its types apart (1, 1.0 and true differ)"""
+    kind = type(value)
+    if kind in _SCALARS:
+        return kind, value
+    if kind is list:
+        return list, tuple(_frozen(member) for member in value)
+    if kind is dict:
+        if not all(type(key) is str for key in value):
+            raise TypeError("Only string keys can be part of a decision key")
+        return dict, tuple(sorted((key, _frozen(member)) for key, member in value.items()))
+    raise TypeError(f"{kind.__name__} values cannot be part of a decision key")
+
+
+def _tokenize(source: str, origin: str) -> List[Token]:
+    tokens = []
+    position, line = 0, 1
+    while position < len(source):
+        match = _TOKEN.match(source, position)
+        if match is None:
+            raise RegoError(f"{origin}:{line}: unexpected character {source[position]!r}")
+        kind = match.lastgroup
+        if kind == "newline":
+            tokens.append(("newline", "\n", line))
+            line += 1
+        elif kind not in ("space", "comment"):
+            tokens.append((kind, match.group(), line))
+        position = match.end()
+    tokens.append(("end", "", line))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing plain tuples for the compiler"""
+
+    def __init__(self, source: str, origin: str):
+        self.origin = origin
+        self.tokens = _tokenize(source, origin)
+        self.position = 0
+
+    def peek(self) -> Token:
+        return self.tokens[self.position]
+
+    def take(self, kind: Optional[str] = None, text: Optional[str] = None) -> Token:
+        token = self.tokens[self.position]
+        if (kind is not None and token[0] != kind) or (text is not None and token[1] != text):
+            expected = text or kind
+            raise RegoError(f"{self.origin}:{token[2]}: expected {expected}, found {token[1] or 'end of file'!r}")
+        self.position += 1
+        return token
+
+    def skip_newlines(self) -> None:
+        while self.peek()[0] == "newline":
+            self.position += 1
+
+    def module(self) -> Tuple[str, Dict[str, Any], Dict[str, List[Tuple[Any, List[Any]]]]]:
+        package = None
+        defaults: Dict[str, Any] = {}
+        rules: Dict[str, List[Tuple[Any, List[Any]]]] = {}
+        self.skip_newlines()
+        while self.peek()[0] != "end":
+            kind, text, line = self.take("name")
+            if text == "package":
+                package = ".".join(self.path())
+            elif text == "import":
+                # `import rego.v1` / `import future.keywords...` only enable syntax we accept anyway
+                imported = ".".join(self.path())
+                if not imported.startswith(("rego.v1", "future.keywords")):
+                    raise RegoError(f"{self.origin}:{line}: unsupported import {imported}")
+            elif text == "default":
+                name = self.take("name")[1]
+                if self.peek()[1] not in ("=", ":="):
+                    raise RegoError(f"{self.origin}:{line}: expected = after default {name}")
+                self.position += 1
+                defaults[name] = self.literal()
+            else:
+                value: Any = True
+                if self.peek()[1] in ("=", ":="):
+                    self.position += 1
+                    value = self.literal()
+                if self.peek()[1] == "if":
+                    self.position += 1
+                rules.setdefault(text, []).append((value, self.body()))
+            if self.peek()[0] not in ("newline", "end"):
+                token = self.peek()
+                raise RegoError(f"{self.origin}:{token[2]}: unexpected {token[1]!r}")
+            self.skip_newlines()
+        if package is None:
+            raise RegoError(f"{self.origin}: missing package declaration")
+        return package, defaults, rules
+
+    def path(self) -> List[str]:
+        parts = [self.take("name")[1]]
+        while self.peek()[1] == ".":
+            self.position += 1
+            parts.append(self.take("name")[1])
+        return parts
+
+    def literal(self) -> Any:
+        kind, text, line = self.take()
+        if kind in ("string", "number"):
+            return json.loads(text)
+        if kind == "name" and text in _LITERALS:
+            return _LITERALS[text]
+        raise RegoError(f"{self.origin}:{line}: expected a literal value, found {text!r}")
+
+    def body(self) -> List[Any]:
+        self.take("punct", "{")
+        expressions = []
+        while True:
+            while self.peek()[0] == "newline" or self.peek()[1] == ";":
+                self.position += 1
+            if self.peek()[1] == "}":
+                self.position += 1
+                break
+            expressions.append(self.expression())
+            if self.peek()[0] != "newline" and self.peek()[1] not in (";", "}"):
+                token = self.peek()
+                raise RegoError(f"{self.origin}:{token[2]}: unexpected {token[1]!r} in rule body")
+        if not expressions:
+            raise RegoError(f"{self.origin}: empty rule body")
+        return expressions
+
+    def expression(self) -> Any:
+        negated = False
+        if self.peek()[1] == "not":
+            self.position += 1
+            negated = True
+        left = self.term()
+        if self.peek()[0] == "op":
+            op = self.take("op")[1]
+            if op == ":=":
+                raise RegoError(f"{self.origin}:{self.peek()[2]}: local variables are not supported")
+            return ("compare", negated, op, left, self.term())
+        return ("truthy", negated, left)
+
+    def term(self) -> Any:
+        kind, text, line = self.peek()
+        if kind in ("string", "number") or (kind == "name" and text in _LITERALS):
+            return ("literal", self.literal())
+        root = self.take("name")[1]
+        path: List[Any] = []
+        while self.peek()[1] in (".", "["):
+            if self.take()[1] == ".":
+                path.append(self.take("name")[1])
+                continue
+            kind, text, line = self.take()
+            if text == "_":
+                path.append(_ITERATE)
+            elif kind in ("string", "number"):
+                path.append(json.loads(text))
+            else:
+                raise RegoError(f"{self.origin}:{line}: only literal keys and [_] are supported, found {text!r}")
+            self.take("punct", "]")
+        return ("ref", root, path, line)
+
+
+def _lookup(path: List[Any]) -> Evaluator:
+    """Compile a reference path without iteration into a getter"""
+    if all(isinstance(key, str) for key in path):
+        keys = tuple(path)
+        # UNDEFINED is not a dict, so a missing key falls through the isinstance checks
+        if len(keys) == 1:
+            first, = keys
+            return lambda document: document.get(first, UNDEFINED) if isinstance(document, dict) else UNDEFINED
+        if len(keys) == 2:
+            first, second = keys
+
+            def get_two(document: Any) -> Any:
+                if isinstance(document, dict):
+                    document = document.get(first, UNDEFINED)
+                    if isinstance(document, dict):
+                        return document.get(second, UNDEFINED)
+                return UNDEFINED
+            return get_two
+
+        def get(document: Any) -> Any:
+            for key in keys:
+                if not isinstance(document, dict):
+                    return UNDEFINED
+                document = document.get(key, UNDEFINED)
+            return document
+        return get
+
+    def get_any(document: Any) -> Any:
+        for key in path:
+            if isinstance(document, dict) and isinstance(key, str):
+                document = document.get(key, UNDEFINED)
+                if document is UNDEFINED:
+                    return UNDEFINED
+            elif (isinstance(document, list) and isinstance(key, int) and not isinstance(key, bool)
+                  and 0 <= key < len(document)):
+                document = document[key]
+            else:
+                return UNDEFINED
+        return document
+    return get_any
+
+
+def _iterate(path: List[Any]) -> Callable[[Any], Iterator[Any]]:
+    """Compile a reference path with ``[_]`` into a generator of every value it reaches"""
+    split = path.index(_ITERATE)
+    head = _lookup(path[:split])
+    rest = path[split + 1:]
+    tail = _iterate(rest) if _ITERATE in rest else None
+    get_rest = _lookup(rest)
+
+    def values(document: Any) -> Iterator[Any]:
+        collection = head(document)
+        if isinstance(collection, dict):
+            members = collection.values()
+        elif isinstance(collection, list):
+            members = collection
+        else:
+            return
+        if not rest:
+            yield from members
+            return
+        for member in members:
+            if tail is not None:
+                yield from tail(member)
+            else:
+                value = get_rest(member)
+                if value is not UNDEFINED:
+                    yield value
+    return values
+
+
+class Policy:
+    """The compiled rules of one Rego package"""
+
+    def __init__(self, package: str, defaults: Dict[str, Any],
+                 rules: Dict[str, List[Tuple[Any, List[Any]]]], origin: str = "<policy>"):
+        self.package = package
+        self.origin = origin
+        self.defaults = defaults
+        # The parsed rule bodies, for compilers other than the closures below (see policy.rows)
+        self.parsed_rules = rules
+        self._names = set(rules) | set(defaults)
+        self._rules: Dict[str, List[Tuple[Any, List[Evaluator]]]] = {}
+        self._check_cycles(rules)
+        # Getters of the parts of the input each rule depends on, for decision_key()
+        self._paths = self._input_paths(rules)
+        # Keyed by rule, and by (rule, within) for the subsets decision_key() picks
+        self._reads: Dict[Any, List[Evaluator]] = {
+            name: [_lookup(list(path)) for path in paths] for name, paths in self._paths.items()}
+        for name, bodies in rules.items():
+            self._rules[name] = [(value, [self._expression(e) for e in body]) for value, body in bodies]
+        for name in defaults:
+            self._rules.setdefault(name, [])
+            self._paths.setdefault(name, [])
+            self._reads.setdefault(name, [])
+
+    @classmethod
+    def parse(cls, source: str, origin: str = "<policy>") -> "Policy":
+        """Parse and compile the source of one Rego module"""
+        return cls(*_Parser(source, origin).module(), origin=origin)
+
+    @property
+    def rules(self) -> List[str]:
+        """Names of the rules the package defines"""
+        return sorted(self._names)
+
+    def evaluate(self, input_data: Any, rule: str = "allow") -> Any:
+        """Return the value of a rule for an input, or UNDEFINED if no body holds and it has no default"""
+        bodies = self._rules.get(rule)
+        if bodies is None:
+            raise KeyError(f"{self.package} has no rule {rule}")
+        for value, expressions in bodies:
+            for expression in expressions:
+                if not expression(input_data):
+                    break
+            else:
+                return value
+        return self.defaults.get(rule, UNDEFINED)
+
+    def decision_key(self, input_data: Any, rule: str = "allow", within: Optional[str] = None) -> Optional[Hashable]:
+        """Return a key equal for every input that gets the same value of ``rule``
+
+        Only the input attributes the rule (and the rules it refers to) reads
+        are included, so unrelated attributes do not split the key. With
+        ``within``, only attributes under ``input[within]`` are included: the
+        key then only tells apart inputs that agree on everything else. Returns
+        None when those attributes are not plain JSON.
+        """
+        readers = self._reads.get(rule if within is None else (rule, within))
+        if readers is None:
+            if rule not in self._reads:
+                raise KeyError(f"{self.package} has no rule {rule}")
+            # A read of the whole input also covers input[within]
+            readers = self._reads[(rule, within)] = [
+                read for read, path in zip(self._reads[rule], self._paths[rule]) if path[:1] in ((), (within,))]
+        key = []
+        for read in readers:
+            value = read(input_data)
+            kind = type(value)
+            if kind in _SCALARS:
+                key.append((kind, value))
+                continue
+            try:
+                key.append(_frozen(value))
+            except TypeError:
+                return None
+        return tuple(key)
+
+    @staticmethod
+    def _input_paths(rules: Dict[str, List[Tuple[Any, List[Any]]]]) -> Dict[str, List[Tuple[Any, ...]]]:
+        """The input references of every rule, up to the first [_] and including referenced rules"""
+        direct: Dict[str, set] = {}
+        calls: Dict[str, set] = {}
+        for name, bodies in rules.items():
+            direct[name], calls[name] = set(), set()
+            for _, body in bodies:
+                for expression in body:
+                    for term in expression[3:] if expression[0] == "compare" else expression[2:]:
+                        if term[0] != "ref":
+                            continue
+                        if term[1] == "input":
+                            path = term[2]
+                            direct[name].add(tuple(path[:path.index(_ITERATE)] if _ITERATE in path else path))
+                        else:
+                            calls[name].add(term[1])
+
+        def collect(name: str, seen: set) -> set:
+            paths = set(direct.get(name, ()))
+            for called in calls.get(name, ()):
+                if called not in seen:
+                    seen.add(called)
+                    paths |= collect(called, seen)
+            return paths
+
+        result = {}
+        for name in set(rules):
+            paths = collect(name, {name})
+            # input.user already covers input.user.role
+            result[name] = sorted((path for path in paths if not any(path[:len(other)] == other
+                                                                     for other in paths if other != path)),
+                                  key=repr)
+        return result
+
+    def _check_cycles(self, rules: Dict[str, List[Tuple[Any, List[Any]]]]) -> None:
+        def references(expression: Any) -> Iterator[str]:
+            for term in expression[3:] if expression[0] == "compare" else expression[2:]:
+                if term[0] == "ref" and term[1] != "input":
+                    yield term[1]
+
+        visiting: List[str] = []
+
+        def visit(name: str) -> None:
+            if name in visiting:
+                raise RegoError(f"{self.origin}: recursive rules are not supported: {' -> '.join(visiting + [name])}")
+            visiting.append(name)
+            for _, body in rules.get(name, []):
+                for expression in body:
+                    for reference in references(expression):
+                        visit(reference)
+            visiting.pop()
+
+        for name in rules:
+            visit(name)
+
+    def _term(self, term: Any) -> Tuple[Optional[Evaluator], Optional[Callable[[Any], Iterator[Any]]]]:
+        """Compile a term into a getter, or into a generator when it iterates"""
+        if term[0] == "literal":
+            constant = term[1]
+            return (lambda document: constant), None
+        _, root, path, line = term
+        if root == "input":
+            if _ITERATE in path:
+                return None, _iterate(path)
+            return _lookup(path), None
+        if path or root not in self._names:
+            raise RegoError(f"{self.origin}:{line}: unsupported reference {root}; only input and rules "
+                            f"of this package can be referenced")
+        # Rules are looked up when evaluated, so they may be defined further down
+        return (lambda document: self.evaluate(document, root)), None
+
+    def _expression(self, expression: Any) -> Evaluator:
+        if expression[0] == "truthy":
+            _, negated, term = expression
+            get, values = self._term(term)
+            if values is not None:
+                test = lambda document: any(value is not False for value in values(document))
+            else:
+                def test(document: Any) -> bool:
+                    value = get(document)
+                    return value is not UNDEFINED and value is not False
+        else:
+            _, negated, op, left, right = expression
+            test = self._comparison(_COMPARISONS[op], left, right)
+        if negated:
+            return lambda document: not test(document)
+        return test
+
+    def _comparison(self, op: Callable[[Any, Any], bool], left: Any, right: Any) -> Evaluator:
+        get_left, left_values = self._term(left)
+        get_right, right_values = self._term(right)
+        if left_values is None and right_values is None:
+            if op is operator.eq and right[0] == "literal" and isinstance(right[1], str):
+                # The common `input.x == "value"`: only a string can equal a string
+                constant = right[1]
+                return lambda document: get_left(document) == constant
+
+            def compare(document: Any) -> bool:
+                a = get_left(document)
+                if a is UNDEFINED:
+                    return False
+                b = get_right(document)
+                return b is not UNDEFINED and _compare(op, a, b)
+            return compare
+
+        if left_values is None or right_values is None:
+            # One side iterates: evaluate the other once, then look for any matching member
+            get_fixed = get_left if left_values is None else get_right
+            members = left_values or right_values
+            fixed_left = left_values is None
+
+            def any_member(document: Any) -> bool:
+                fixed = get_fixed(document)
+                if fixed is UNDEFINED:
+                    return False
+                for member in members(document):
+                    if _compare(op, fixed, member) if fixed_left else _compare(op, member, fixed):
+                        return True
+                return False
+            return any_member
+
+        def candidates(get: Optional[Evaluator], values: Optional[Callable[[Any], Iterator[Any]]],
+                       document: Any) -> Iterator[Any]:
+            if values is not None:
+                return values(document)
+            value = get(document)
+            return iter(()) if value is UNDEFINED else iter((value,))
+
+        def exists(document: Any) -> bool:
+            # `_` is anonymous, so the expression holds if any combination of members satisfies it
+            rights = list(candidates(get_right, right_values, document))
+            return any(_compare(op, a, b) for a in candidates(get_left, left_values, document) for b in rights)
+        return exists
+
+
+def _directory_signature(directory: str) -> Tuple[Tuple[str, int, int], ...]:
+    """Name, size and mtime of the files a policy directory is compiled from"""
+    if not os.path.isdir(directory):
+        return ()
+    signature = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".rego") or name == ".manifest":
+            stat = os.stat(os.path.join(directory, name))
+            signature.append((name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+class PolicyEngine:
+    """Rego policies loaded from a directory, compiled once and evaluated in-process
+
+    ``revision`` identifies the policies being evaluated: the revision of the
+    directory's OPA bundle ``.manifest`` when it has one, otherwise a hash of
+    the sources. reload() recompiles the directory when its files change.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, Policy]] = None, revision: str = "",
+                 directory: Optional[str] = None):
+        self.policies: Dict[str, Policy] = dict(policies or {})
+        self.revision = revision
+        self.directory = directory
+        self._signature = _directory_signature(directory) if directory else ()
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, directory: str) -> "PolicyEngine":
+        """Compile every ``*.rego`` file in a directory, keyed by package name"""
+        return cls(*cls._compile(directory), directory=directory)
+
+    @staticmethod
+    def _compile(directory: str) -> Tuple[Dict[str, Policy], str]:
+        policies = {}
+        digest = hashlib.sha256()
+        revision = None
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if name.endswith(".rego"):
+                    with open(path) as f:
+                        source = f.read()
+                    policy = Policy.parse(source, origin=path)
+                    policies[policy.package] = policy
+                    digest.update(f"{name}\0{source}\0".encode())
+                elif name == ".manifest":
+                    with open(path) as f:
+                        revision = json.load(f).get("revision")
+        return policies, str(revision) if revision else digest.hexdigest()[:16]
+
+    def reload(self, min_interval: float = 0.0) -> bool:
+        """Recompile the policies if their files changed, checking at most every ``min_interval`` seconds
+
+        Returns True when new policies were loaded. A directory that no longer
+        compiles is logged and the policies already loaded stay in use.
+        """
+        if self.directory is None or time.monotonic() - self._checked < min_interval:
+            return False
+        with self._lock:
+            self._checked = time.monotonic()
+            signature = _directory_signature(self.directory)
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            try:
+                policies, revision = self._compile(self.directory)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Keeping the loaded policies; could not compile {self.directory}: {str(e)}")
+                return False
+            # Publish the policies before their revision, so a decision is never tagged newer than it is
+            self.policies = policies
+            self.revision = revision
+            logger.info(f"Reloaded policies from {self.directory} (revision {revision})")
+            return True
+
+    def decision_key(self, package: str, input_data: Any, rule: str = "allow") -> Optional[Hashable]:
+        """Return Policy.decision_key() for a package, together with the package and rule"""
+        policy = self.policies.get(package)
+        if policy is None:
+            raise KeyError(f"Unknown policy: {package}")
+        key = policy.decision_key(input_data, rule)
+        return None if key is None else (package, rule, key)
+
+    def evaluate_many(self, package: str, inputs: List[Any], rule: str = "allow",
+                      vary: Optional[str] = None) -> List[Any]:
+        """Evaluate a rule for every input, once per distinct decision_key()
+
+        Inputs that only differ in attributes the rule never reads share one
+        evaluation. Pass ``vary`` when the inputs are one subject with
+        different resources at ``input[vary]``: the key then only looks at the
+        resource, which is cheaper than evaluating most policies.
+        """
+        policy = self.policies.get(package)
+        if policy is None:
+            raise KeyError(f"Unknown policy: {package}")
+        decided: Dict[Hashable, Any] = {}
+        results = []
+        for input_data in inputs:
+            key = policy.decision_key(input_data, rule, vary)
+            if key is not None and key in decided:
+                value = decided[key]
+            else:
+                value = policy.evaluate(input_data, rule)
+                if key is not None:
+                    decided[key] = value
+            results.append(None if value is UNDEFINED else value)
+        return results
+
+    def evaluate(self, package: str, input_data: Any, rule: str = "allow") -> Any:
+        """Return the value of a rule of a package, or None when it is undefined"""
+        policy = self.policies.get(package)
+        if policy is None:
+            raise KeyError(f"Unknown policy: {package}")
+        value = policy.evaluate(input_data, rule)
+        return None if value is UNDEFINED else value
@@ -0,0 +1,205 @@
+"""
+Row-level security: a policy rule compiled into a boolean mask over the rows of a dataset
+"""
+import operator
+from typing import Any, Callable, Dict, Hashable, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import CategoricalDtype, is_bool_dtype, is_numeric_dtype, is_object_dtype, is_string_dtype
+
+from .rego import _COMPARISONS, _ITERATE, UNDEFINED, Policy, RegoError, _compare, _iterate, _kind, _lookup
+
+# Each row is the policy's input.document; the subject supplies the rest of the input
+ROW_RESOURCE_KEY = "document"
+
+# A mask is a scalar when it does not depend on the row, otherwise one bool per row
+Mask = Union[bool, np.ndarray]
+# ("const", value), ("members", [values]) or ("column", series)
+Value = Tuple[str, Any]
+
+
+def _column_kind(series: pd.Series) -> int:
+    """Rego type rank (see rego._kind) of the values of a column"""
+    dtype = series.dtype
+    if isinstance(dtype, CategoricalDtype):
+        return _column_kind(pd.Series(dtype.categories, name=series.name))
+    if is_bool_dtype(dtype):
+        return 1
+    if is_numeric_dtype(dtype):
+        return 2
+    if is_string_dtype(dtype) or is_object_dtype(dtype):
+        return 3
+    raise RegoError(f"Column {series.name!r} has type {dtype}, which row filters cannot compare")
+
+
+def _as_bool(result: Any) -> np.ndarray:
+    if isinstance(result, np.ndarray):
+        return result.astype(bool, copy=False)
+    return result.to_numpy(dtype=bool, na_value=False)
+
+
+def _against_constant(op: Callable[[Any, Any], bool], series: pd.Series, constant: Any,
+                      column_left: bool) -> Mask:
+    """Compare every value of a column with one defined constant"""
+    if isinstance(series.dtype, CategoricalDtype):
+        # Compare each category once and gather the results by code (-1, missing, picks the final False)
+        categories = series.cat.categories.to_numpy(dtype=object)
+        hits = np.array([_compare(op, value, constant) if column_left else _compare(op, constant, value)
+                         for value in categories] + [False], dtype=bool)
+        return hits[series.cat.codes.to_numpy()]
+    defined = series.notna().to_numpy()
+    column_kind, constant_kind = _column_kind(series), _kind(constant)
+    if column_kind != constant_kind:
+        # Values of different types compare by type rank alone
+        holds = op(column_kind, constant_kind) if column_left else op(constant_kind, column_kind)
+        return defined if holds else False
+    if is_object_dtype(series.dtype):
+        series = series.where(defined, "")
+    result = op(series, constant) if column_left else op(constant, series)
+    return _as_bool(result) & defined
+
+
+def _between_columns(op: Callable[[Any, Any], bool], left: pd.Series, right: pd.Series) -> Mask:
+    defined = left.notna().to_numpy() & right.notna().to_numpy()
+    left_kind, right_kind = _column_kind(left), _column_kind(right)
+    if left_kind != right_kind:
+        return defined if op(left_kind, right_kind) else False
+    if left_kind == 3:
+        # Categoricals with different categories cannot be compared directly
+        left = left.astype(object).where(defined, "")
+        right = right.astype(object).where(defined, "")
+    return _as_bool(op(left, right)) & defined
+
+
+def _any(masks: List[Mask]) -> Mask:
+    result: Mask = False
+    for mask in masks:
+        if mask is True:
+            return True
+        if mask is not False:
+            result = mask if result is False else result | mask
+    return result
+
+
+def _all(masks: List[Mask]) -> Mask:
+    result: Mask = True
+    for mask in masks:
+        if mask is False:
+            return False
+        if mask is not True:
+            result = mask if result is True else result & mask
+    return result
+
+
+class _RowCompiler:
+    """Evaluates the parsed rules of a policy over all rows of a frame at once"""
+
+    def __init__(self, policy: Policy, frame: pd.DataFrame, subject: Dict[str, Any], resource_key: str):
+        self.policy = policy
+        self.frame = frame
+        self.subject = {key: value for key, value in subject.items() if key != resource_key}
+        self.resource_key = resource_key
+        self._rules: Dict[str, Mask] = {}
+
+    def rule(self, name: str) -> Mask:
+        if name not in self._rules:
+            if name not in self.policy.parsed_rules and name not in self.policy.defaults:
+                raise KeyError(f"{self.policy.package} has no rule {name}")
+            bodies = self.policy.parsed_rules.get(name, [])
+            default = self.policy.defaults.get(name, UNDEFINED)
+            if any(value is not True for value, _ in bodies) or default not in (False, True, UNDEFINED):
+                raise RegoError(f"{self.policy.origin}: row filters only support rules with boolean values")
+            if default is True:
+                self._rules[name] = True
+            else:
+                self._rules[name] = _any([_all([self.expression(e) for e in body]) for _, body in bodies])
+        return self._rules[name]
+
+    def expression(self, expression: Any) -> Mask:
+        if expression[0] == "truthy":
+            _, negated, term = expression
+            mask = self.truthy(term)
+        else:
+            _, negated, op, left, right = expression
+            mask = self.comparison(_COMPARISONS[op], self.term(left), self.term(right))
+        if not negated:
+            return mask
+        return (not mask) if isinstance(mask, bool) else ~mask
+
+    def truthy(self, term: Any) -> Mask:
+        if term[0] == "ref" and term[1] != "input":
+            return self.rule(term[1])
+        kind, value = self.term(term)
+        if kind == "const":
+            return value is not UNDEFINED and value is not False
+        if kind == "members":
+            return any(member is not False for member in value)
+        defined = value.notna().to_numpy()
+        if is_bool_dtype(value.dtype):
+            return _as_bool(value) & defined
+        return defined
+
+    def term(self, term: Any) -> Value:
+        if term[0] == "literal":
+            return "const", term[1]
+        _, root, path, line = term
+        if root != "input":
+            raise RegoError(f"{self.policy.origin}:{line}: row filters cannot compare the value of rule {root}")
+        if path[:1] == [self.resource_key]:
+            if len(path) != 2 or not isinstance(path[1], str):
+                raise RegoError(f"{self.policy.origin}:{line}: row filters only support "
+                                f"input.{self.resource_key}.<column> references to the row")
+            column = path[1]
+            if column not in self.frame.columns:
+                # Like a missing attribute, a missing column is undefined
+                return "const", UNDEFINED
+            return "column", self.frame[column]
+        if not path:
+            raise RegoError(f"{self.policy.origin}:{line}: row filters cannot reference the whole input")
+        if _ITERATE in path:
+            return "members", list(_iterate(path)(self.subject))
+        return "const", _lookup(path)(self.subject)
+
+    def comparison(self, op: Callable[[Any, Any], bool], left: Value, right: Value) -> Mask:
+        (left_kind, a), (right_kind, b) = left, right
+        if left_kind != "column" and right_kind != "column":
+            lefts = a if left_kind == "members" else ([] if a is UNDEFINED else [a])
+            rights = b if right_kind == "members" else ([] if b is UNDEFINED else [b])
+            return any(_compare(op, x, y) for x in lefts for y in rights)
+        if left_kind == "column" and right_kind == "column":
+            return _between_columns(op, a, b)
+        column, other, other_kind = (a, b, right_kind) if left_kind == "column" else (b, a, left_kind)
+        column_left = left_kind == "column"
+        if other_kind == "const":
+            return False if other is UNDEFINED else _against_constant(op, column, other, column_left)
+        if op is operator.eq and other and _column_kind(column) == 3:
+            # Group membership: one hash lookup per row instead of one comparison per member
+            strings = [member for member in other if isinstance(member, str)]
+            return _as_bool(column.isin(strings)) & column.notna().to_numpy()
+        return _any([_against_constant(op, column, member, column_left) for member in other])
+
+
+def row_mask(policy: Policy, frame: pd.DataFrame, subject: Dict[str, Any], rule: str = "allow",
+             resource_key: str = ROW_RESOURCE_KEY) -> np.ndarray:
+    """Return which rows of a frame ``subject`` may see, one bool per row
+
+    Each row is evaluated as ``input[resource_key]`` (its columns are the
+    attributes) with the subject's attributes as the rest of the input, but
+    every expression is computed for all rows at once. References to the row
+    must be plain ``input.<resource_key>.<column>``; other Rego fails with
+    RegoError rather than being filtered wrongly.
+    """
+    mask = _RowCompiler(policy, frame, subject, resource_key).rule(rule)
+    if isinstance(mask, bool):
+        return np.full(len(frame), mask)
+    return mask
+
+
+def subject_key(policy: Policy, subject: Dict[str, Any], rule: str = "allow",
+                resource_key: str = ROW_RESOURCE_KEY) -> Hashable:
+    """Return a key equal for every subject that gets the same row mask from a rule"""
+    key = policy.decision_key({k: v for k, v in subject.items() if k != resource_key}, rule)
+    if key is None:
+        raise ValueError("The subject must be plain JSON")
+    return key
@@ -1,12 +1,20 @@
 """
 CSV/Excel Analyzer Tool for MCP Server
 """
+import hashlib
+import io
+import os
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from src.auth.auth import require_auth
+from src.data.encoding import json_dumps
+from src.data.excel import EXCEL_LOADER
+from src.data.hashing import namespaced
+from src.data.loader import EXCEL_EXTENSIONS
+from src.data.summary import DEFAULT_SUMMARY_DIR, SummaryStore
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -14,6 +22,9 @@ logger = logging.getLogger(__name__)
 
 csv_analyzer_bp = Blueprint('csv_analyzer', __name__)
 
+# Summaries keyed by content hash; the same directory is shared with the MCP server
+SUMMARIES = SummaryStore(os.getenv("MCP_SUMMARY_DIR", DEFAULT_SUMMARY_DIR))
+
 @csv_analyzer_bp.route('/analyze', methods=['POST'])
 @require_auth
 def analyze_file():
@@ -32,23 +43,29 @@ def analyze_file():
         logger.info(f"Analyzing file: {file.filename}")
         
         # Determine file type and read accordingly
+        sheet = request.args.get('sheet')
         if file.filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file)
+            reader = lambda content: pd.read_csv(io.BytesIO(content))
+        elif file.filename.endswith(EXCEL_EXTENSIONS):
+            reader = lambda content: EXCEL_LOADER.read(content, sheet, file.filename)
         else:
             logger.error(f"Unsupported file format: {file.filename}")
             return jsonify({'error': 'Unsupported file format. Please upload CSV or Excel file.'}), 400
         
-        # Generate statistical summary
-        summary = df.describe().to_dict()
+        # Identical uploads share one memoized summary, keyed by content hash
+        content = file.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if sheet is not None:
+            # Same namespace the MCP server uses for a sheet (numpy storage), so the memo is shared
+            digest = namespaced(digest, f":sheet={sheet}")
+        result = SUMMARIES.get_or_compute(digest, lambda: reader(content))
         
-        logger.info(f"Successfully analyzed {len(df)} rows")
-        return jsonify({
-            'summary': summary,
-            'columns': df.columns.tolist(),
-            'rows': len(df)
-        }), 200
+        logger.info(f"Successfully analyzed {result['rows']} rows")
+        return Response(json_dumps({
+            'summary': result['summary'],
+            'columns': result['columns'],
+            'rows': result['rows']
+        }), status=200, mimetype='application/json')
         
     except pd.errors.EmptyDataError:
         logger.error("Uploaded file is empty")
@@ -86,8 +103,8 @@ def visualize_data():
         # Determine file type and read accordingly
         if file.filename.endswith('.csv'):
             df = pd.read_csv(file)
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file)
+        elif file.filename.endswith(EXCEL_EXTENSIONS):
+            df = EXCEL_LOADER.read(file.read(), data.get('sheet'), file.filename)
         else:
             logger.error(f"Unsupported file format: {file.filename}")
             return jsonify({'error': 'Unsupported file format. Please upload CSV or Excel file.'}), 400
@@ -3,8 +3,11 @@ CSV/Excel Reader Tool for MCP Server
 """
 import pandas as pd
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from src.auth.auth import require_auth
+from src.data.encoding import RESULT_FORMATS, encode_page, json_dumps
+from src.data.excel import EXCEL_LOADER
+from src.data.loader import EXCEL_EXTENSIONS
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -26,27 +29,34 @@ def read_file():
         if file.filename == '':
             logger.warning("No file selected")
             return jsonify({'error': 'No file selected'}), 400
+        
+        fmt = request.args.get('format', 'records')
+        if fmt not in RESULT_FORMATS:
+            logger.warning(f"Unknown result format: {fmt}")
+            return jsonify({'error': f"Unknown result format. Use one of: {', '.join(RESULT_FORMATS)}"}), 400
             
         logger.info(f"Processing file: {file.filename}")
         
         # Determine file type and read accordingly
         if file.filename.endswith('.csv'):
             df = pd.read_csv(file)
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file)
+        elif file.filename.endswith(EXCEL_EXTENSIONS):
+            # Parsed in the Excel worker pool; ?sheet= selects a sheet other than the first
+            df = EXCEL_LOADER.read(file.read(), request.args.get('sheet'), file.filename)
         else:
             logger.error(f"Unsupported file format: {file.filename}")
             return jsonify({'error': 'Unsupported file format. Please upload CSV or Excel file.'}), 400
             
-        # Convert to JSON
-        data = df.to_dict(orient='records')
-        
-        logger.info(f"Successfully processed {len(data)} rows")
-        return jsonify({
-            'data': data,
+        # Convert to JSON; NaN becomes null and timestamps ISO strings
+        payload = {
+            **encode_page(df, fmt),
+            'format': fmt,
             'columns': df.columns.tolist(),
-            'rows': len(data)
-        }), 200
+            'rows': len(df)
+        }
+        
+        logger.info(f"Successfully processed {len(df)} rows")
+        return Response(json_dumps(payload), status=200, mimetype='application/json')
         
     except pd.errors.EmptyDataError:
         logger.error("Uploaded file is empty")
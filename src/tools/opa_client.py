@@ -5,8 +5,13 @@ import requests
 import json
 import logging
 import os
+import time
 from flask import Blueprint, request, jsonify
 from src.auth.auth import require_auth
+from src.policy.batch import (DEFAULT_BATCH_MAX_INPUTS, allow_bitmap, batch_inputs, opa_batch_decisions,
+                              opa_batch_query)
+from src.policy.cache import (DEFAULT_DECISION_ENTRIES, DEFAULT_DECISION_TTL, MISSING, DecisionCache,
+                              canonical)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -15,6 +20,22 @@ logger = logging.getLogger(__name__)
 opa_bp = Blueprint('opa', __name__)
 OPA_URL = os.getenv("OPA_URL", "http://localhost:8181")
 
+# OPA decisions keyed by policy and input, with the same limits as the MCP server's
+# cache; they are flushed when OPA reports a new bundle revision
+DECISIONS = DecisionCache(
+    ttl=float(os.getenv("MCP_DECISION_CACHE_TTL", str(DEFAULT_DECISION_TTL))),
+    max_entries=int(os.getenv("MCP_DECISION_CACHE_SIZE", str(DEFAULT_DECISION_ENTRIES))),
+)
+
+# Most inputs one /evaluate/batch request may carry
+POLICY_BATCH_MAX_INPUTS = int(os.getenv("MCP_POLICY_BATCH_MAX_INPUTS", str(DEFAULT_BATCH_MAX_INPUTS)))
+
+
+def bundle_revision(result):
+    """Revision of the bundles behind an OPA response requested with provenance=true"""
+    bundles = result.get('provenance', {}).get('bundles', {})
+    return canonical({name: bundle.get('revision') for name, bundle in bundles.items()}) or ''
+
 @opa_bp.route('/evaluate', methods=['POST'])
 @require_auth
 def evaluate_policy():
@@ -31,19 +52,26 @@ def evaluate_policy():
         
         logger.info(f"Evaluating policy: {policy_name}")
         
-        # Make request to OPA
-        response = requests.post(
-            f"{OPA_URL}/v1/data/{policy_name}/allow",
-            json={"input": input_data},
-            timeout=30  # 30 second timeout
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"OPA request failed with status {response.status_code}: {response.text}")
-            return jsonify({'error': f'OPA request failed: {response.text}'}), 500
+        # The policy text lives in OPA, so the whole input is part of the key
+        key = canonical([policy_name, input_data])
+        allowed = DECISIONS.lookup(key)
+        if allowed is MISSING:
+            # Make request to OPA
+            start = time.perf_counter()
+            response = requests.post(
+                f"{OPA_URL}/v1/data/{policy_name}/allow",
+                params={"provenance": "true"},
+                json={"input": input_data},
+                timeout=30  # 30 second timeout
+            )
             
-        result = response.json()
-        allowed = result.get('result', False)
+            if response.status_code != 200:
+                logger.error(f"OPA request failed with status {response.status_code}: {response.text}")
+                return jsonify({'error': f'OPA request failed: {response.text}'}), 500
+                
+            result = response.json()
+            allowed = result.get('result', False)
+            DECISIONS.store(key, allowed, bundle_revision(result), time.perf_counter() - start)
         
         logger.info(f"Policy evaluation result: {allowed}")
         return jsonify({
@@ -62,6 +90,60 @@ def evaluate_policy():
         logger.error(f"Unexpected error evaluating policy: {str(e)}")
         return jsonify({'error': f'Error evaluating policy: {str(e)}'}), 500
 
+@opa_bp.route('/evaluate/batch', methods=['POST'])
+@require_auth
+def evaluate_policy_batch():
+    """Evaluate a policy for many inputs with a single OPA query and return an allow bitmap"""
+    try:
+        data = request.get_json()
+        if not data:
+            logger.warning("No JSON data provided in request")
+            return jsonify({'error': 'No JSON data provided'}), 400
+            
+        policy_name = data.get('policy', 'simple')
+        resource_key = data.get('resource_key', 'document')
+        try:
+            batch = batch_inputs(data.get('inputs'), data.get('subject'), data.get('resources'),
+                                 resource_key, POLICY_BATCH_MAX_INPUTS)
+            shared = data.get('inputs') is None
+            query = opa_batch_query(policy_name, shared=shared)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.info(f"Evaluating policy {policy_name} for {len(batch)} inputs")
+        
+        # Send the subject once rather than once per resource
+        query_input = ({'subject': data.get('subject') or {}, 'resources': data['resources'], 'key': resource_key}
+                       if shared else {'inputs': batch})
+        response = requests.post(
+            f"{OPA_URL}/v1/query",
+            json={"query": query, "input": query_input},
+            timeout=30  # 30 second timeout
+        )
+        
+        if response.status_code != 200:
+            logger.error(f"OPA request failed with status {response.status_code}: {response.text}")
+            return jsonify({'error': f'OPA request failed: {response.text}'}), 500
+            
+        decisions = opa_batch_decisions(response.json(), len(batch))
+        return jsonify({'policy': policy_name, **allow_bitmap(decisions)}), 200
+        
+    except requests.exceptions.Timeout:
+        logger.error("OPA request timed out")
+        return jsonify({'error': 'OPA request timed out'}), 500
+    except requests.exceptions.ConnectionError:
+        logger.error("Could not connect to OPA service")
+        return jsonify({'error': 'Could not connect to OPA service'}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error evaluating policy batch: {str(e)}")
+        return jsonify({'error': f'Error evaluating policy batch: {str(e)}'}), 500
+
+@opa_bp.route('/cache', methods=['GET'])
+@require_auth
+def decision_cache_stats():
+    """Return decision cache hit ratio and the OPA latency it saved"""
+    return jsonify(DECISIONS.stats()), 200
+
 @opa_bp.route('/policies', methods=['GET'])
 @require_auth
 def list_policies():
@@ -0,0 +1,379 @@
+"""
+Test cases for the dataset cache
+"""
+import gc
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data.cache import DatasetCache, file_signature, frame_nbytes
+from data.dtypes import optimize_frame
+from data.excel import ExcelLoader, engine_available, select_engine
+import data.files
+from data.files import FileReader
+from data.hashing import ContentHasher, content_hash
+from data.loader import read_frame
+from data.sidecar import SidecarStore
+from data.tail import DatasetWatcher, append_rows, read_appended
+from data.workers import WorkerPool
+
+
+def append_csv(path, start, rows):
+    with open(path, 'a') as f:
+        f.writelines(f'{i},name-{i}\n' for i in range(start, start + rows))
+
+
+def tail_appender(entry, signature):
+    tail = read_appended(entry.key, entry.signature[1], signature[1], entry.frame)
+    frame = None if tail is None else append_rows(entry.frame, tail)
+    return None if frame is None else (frame, {})
+
+
+def write_csv(path, rows):
+    pd.DataFrame({'id': range(rows), 'name': [f'name-{i}' for i in range(rows)]}).to_csv(path, index=False)
+
+
+@pytest.fixture
+def csv_files(tmp_path):
+    """Create a few small CSV files"""
+    paths = []
+    for i in range(3):
+        path = tmp_path / f'data{i}.csv'
+        write_csv(path, 100)
+        paths.append(str(path))
+    return paths
+
+
+def test_cache_hit_and_miss(csv_files):
+    """Test that a second lookup is served from the cache"""
+    cache = DatasetCache(max_bytes=10 * 1024 * 1024)
+    first = cache.get_or_load(csv_files[0], pd.read_csv)
+    second = cache.get_or_load(csv_files[0], pd.read_csv)
+    assert first is second
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['bytes'] == frame_nbytes(first.frame)
+
+
+def test_cache_invalidates_rewritten_file(csv_files):
+    """Test that rewriting a file invalidates its cached frame"""
+    cache = DatasetCache(max_bytes=10 * 1024 * 1024)
+    assert len(cache.get_or_load(csv_files[0], pd.read_csv).frame) == 100
+    write_csv(csv_files[0], 50)
+    assert len(cache.get_or_load(csv_files[0], pd.read_csv).frame) == 50
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_cache_appends_rows_of_growing_file(csv_files):
+    """Test that only the rows appended to a file are parsed, and rewrites still reload"""
+    parses = []
+
+    def read(path):
+        parses.append(path)
+        return pd.read_csv(path)
+
+    cache = DatasetCache(max_bytes=10 * 1024 * 1024, appender=tail_appender)
+    cache.get_or_load(csv_files[0], read)
+    append_csv(csv_files[0], 100, 20)
+    entry = cache.get_or_load(csv_files[0], read)
+    pd.testing.assert_frame_equal(entry.frame, pd.read_csv(csv_files[0]))
+    assert entry.signature == file_signature(csv_files[0])
+    assert len(parses) == 1
+    assert cache.stats()['appends'] == 1
+
+    pd.DataFrame({'id': range(200), 'name': 'other'}).to_csv(csv_files[0], index=False)
+    assert len(cache.get_or_load(csv_files[0], read).frame) == 200
+    assert len(parses) == 2
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_partial_line_forces_reload(csv_files):
+    """Test that a half-written row is not appended on its own"""
+    cache = DatasetCache(max_bytes=10 * 1024 * 1024, appender=tail_appender)
+    cache.get_or_load(csv_files[0], pd.read_csv)
+    with open(csv_files[0], 'a') as f:
+        f.write('100,na')
+    assert cache.get(csv_files[0]) is None
+    assert cache.stats()['appends'] == 0
+
+
+def test_append_rows_keeps_optimized_dtypes():
+    """Test that appended values are converted to the dtypes chosen at load time"""
+    frame, _ = optimize_frame(pd.DataFrame({
+        'id': np.arange(1000) % 100,
+        'city': np.array(['oslo', 'rome'])[np.arange(1000) % 2],
+        'day': pd.date_range('2024-01-01', periods=1000).strftime('%Y-%m-%d'),
+    }))
+    tail = pd.DataFrame({'id': [5, 70000], 'city': ['bern', 'oslo'], 'day': ['2030-01-01', '2030-01-02']})
+    combined = append_rows(frame, tail)
+    assert combined['city'].dtype == 'category'
+    assert list(combined['city'].cat.categories) == ['bern', 'oslo', 'rome']
+    assert combined['city'].cat.ordered
+    assert combined['day'].dtype == frame['day'].dtype
+    assert combined['id'].iloc[-1] == 70000
+    assert combined['id'].dtype.itemsize >= 4
+    assert append_rows(frame, tail.assign(day=['soon', 'later'])) is None
+
+
+def test_content_hash_extends_with_appended_bytes(csv_files):
+    """Test that the hash of an appended file is derived from the running hash"""
+    hasher = ContentHasher()
+    hasher.digest(csv_files[0])
+    previous = file_signature(csv_files[0])
+    append_csv(csv_files[0], 100, 5)
+    digest = hasher.extend(csv_files[0], previous, file_signature(csv_files[0]))
+    assert digest == content_hash(csv_files[0])
+    assert hasher.cached(csv_files[0], file_signature(csv_files[0])) == digest
+
+
+def test_watcher_refreshes_cached_datasets(csv_files):
+    """Test that polling appends new rows and reloads rewritten files without a lookup"""
+    cache = DatasetCache(max_bytes=10 * 1024 * 1024, appender=tail_appender)
+    for path in csv_files[:2]:
+        cache.get_or_load(path, pd.read_csv)
+    reloaded = []
+    watcher = DatasetWatcher(cache, 0.01, reload=lambda key: reloaded.append(key))
+    append_csv(csv_files[0], 100, 3)
+    write_csv(csv_files[1], 10)
+    watcher.poll()
+    assert len(cache.refresh(csv_files[0]).frame) == 103
+    assert reloaded == [os.path.realpath(csv_files[1])]
+    assert cache.stats()['hits'] == 0
+
+
+def test_file_reader_line_ranges(tmp_path, monkeypatch):
+    """Test that line ranges are located through checkpoints and capped at whole lines"""
+    monkeypatch.setattr(data.files, 'LINE_CHECKPOINT', 10)
+    monkeypatch.setattr(data.files, '_SCAN_BLOCK', 64)
+    path = tmp_path / 'log.txt'
+    lines = [f'event {i} \u00e9t\u00e9\n' for i in range(1000)]
+    path.write_text(''.join(lines), encoding='utf-8')
+    reader = FileReader(max_bytes=200)
+    
+    part = reader.read(str(path), line=555, lines=3)
+    assert part.data.decode() == ''.join(lines[555:558])
+    assert part.meta['next_line'] == 558
+    assert reader.read(str(path), line=123, lines=1).data.decode() == lines[123]
+    capped = reader.read(str(path), line=0, lines=100)
+    assert capped.meta['truncated'] and capped.data.endswith(b'\n')
+    assert capped.data.decode() == ''.join(lines[:capped.meta['next_line']])
+    last = reader.read(str(path), line=998)
+    assert last.meta['lines'] == 2 and last.meta['next_line'] is None
+    # Byte ranges never split a character
+    assert reader.read(str(path), offset=9, length=4).data.decode() == 't\u00e9'
+    for empty in [{'line': 5, 'lines': 0}, {'offset': 5, 'length': 0}]:
+        with pytest.raises(ValueError):
+            reader.read(str(path), **empty)
+
+
+def test_cache_evicts_least_recently_used(csv_files):
+    """Test that the LRU entry is evicted once the budget is exceeded"""
+    size = frame_nbytes(pd.read_csv(csv_files[0]))
+    cache = DatasetCache(max_bytes=size * 2)
+    cache.get_or_load(csv_files[0], pd.read_csv)
+    cache.get_or_load(csv_files[1], pd.read_csv)
+    cache.get_or_load(csv_files[0], pd.read_csv)
+    cache.get_or_load(csv_files[2], pd.read_csv)
+    assert cache.get(csv_files[0]) is not None
+    assert cache.get(csv_files[1]) is None
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] <= size * 2
+
+
+def test_cache_evicts_least_frequently_used(csv_files):
+    """Test that the LFU entry is evicted once the budget is exceeded"""
+    size = frame_nbytes(pd.read_csv(csv_files[0]))
+    cache = DatasetCache(max_bytes=size * 2, policy='lfu')
+    cache.get_or_load(csv_files[0], pd.read_csv)
+    cache.get_or_load(csv_files[0], pd.read_csv)
+    cache.get_or_load(csv_files[1], pd.read_csv)
+    cache.get_or_load(csv_files[2], pd.read_csv)
+    assert cache.get(csv_files[0]) is not None
+    assert cache.get(csv_files[1]) is None
+
+
+def test_cache_skips_oversized_frames(csv_files):
+    """Test that a frame larger than the budget is returned but not cached"""
+    cache = DatasetCache(max_bytes=1)
+    entry = cache.get_or_load(csv_files[0], pd.read_csv)
+    assert len(entry.frame) == 100
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['oversized'] == 1
+
+
+def test_derived_values_count_against_budget(csv_files):
+    """Test that derived arrays are cached and accounted to their dataset"""
+    cache = DatasetCache(max_bytes=10 * 1024 * 1024)
+    entry = cache.get_or_load(csv_files[0], pd.read_csv)
+    before = cache.stats()['bytes']
+    positions = cache.derive(entry, 'all', lambda df: np.arange(len(df)))
+    assert cache.derive(entry, 'all', lambda df: None) is positions
+    assert cache.stats()['bytes'] == before + positions.nbytes
+
+
+def test_sidecar_keyed_by_content(tmp_path, csv_files):
+    """Test that identical files share one sidecar and rewritten files get a new one"""
+    pytest.importorskip('pyarrow')
+    store = SidecarStore(str(tmp_path / 'sidecars'), 10 * 1024 * 1024)
+    copy = tmp_path / 'copy.csv'
+    copy.write_bytes(open(csv_files[0], 'rb').read())
+    frame = store.read_through(csv_files[0], pd.read_csv)
+    assert store.has_sidecar(str(copy))
+    pd.testing.assert_frame_equal(store.read_through(str(copy), pd.read_csv), frame)
+    write_csv(csv_files[0], 10)
+    assert not store.has_sidecar(csv_files[0])
+
+
+def test_sidecar_directory_is_size_capped(tmp_path, csv_files):
+    """Test that the oldest sidecars are evicted to honour the size cap"""
+    pytest.importorskip('pyarrow')
+    store = SidecarStore(str(tmp_path / 'sidecars'), 10 * 1024 * 1024)
+    store.read_through(csv_files[0], pd.read_csv)
+    size = os.path.getsize(store.path_for(store.digest(csv_files[0])))
+    store.max_bytes = size
+    write_csv(csv_files[1], 90)
+    store.read_through(csv_files[1], pd.read_csv)
+    assert not store.has_sidecar(csv_files[0])
+    assert store.has_sidecar(csv_files[1])
+    assert store.stats()['evictions'] == 1
+
+
+def test_pinned_sidecars_survive_eviction(tmp_path, csv_files):
+    """Test that a sidecar is only evicted once no frame maps it"""
+    pytest.importorskip('pyarrow')
+    store = SidecarStore(str(tmp_path / 'sidecars'), 10 * 1024 * 1024)
+    frame = store.read_through(csv_files[0], pd.read_csv, arrow_backed=True)
+    assert store.stats()['pinned'] == 1
+    store.max_bytes = 0
+    store.evict()
+    assert store.has_sidecar(csv_files[0])
+    del frame
+    gc.collect()
+    assert store.stats()['pinned'] == 0
+    store.evict()
+    assert not store.has_sidecar(csv_files[0])
+
+
+def test_arrow_loads_past_the_size_cap(tmp_path, csv_files):
+    """Test that a new sidecar is mapped even when pinned sidecars fill the cap"""
+    pytest.importorskip('pyarrow')
+    write_csv(csv_files[1], 90)
+    write_csv(csv_files[2], 80)
+    store = SidecarStore(str(tmp_path / 'sidecars'), 1000)
+    first = store.read_through(csv_files[0], pd.read_csv, arrow_backed=True)
+    second = store.read_through(csv_files[1], pd.read_csv, arrow_backed=True)
+    assert (len(first), len(second)) == (100, 90)
+    assert isinstance(second['id'].dtype, pd.ArrowDtype)
+    assert store.stats()['pinned'] == 2
+    assert store.has_sidecar(csv_files[0]) and store.has_sidecar(csv_files[1])
+    del first
+    gc.collect()
+    store.read_through(csv_files[2], pd.read_csv, arrow_backed=True)
+    assert not store.has_sidecar(csv_files[0])
+
+
+def load_shared_sidecar(directory, path, log):
+    """Load a file through a shared sidecar directory, as one server process would"""
+    def reader(file_path):
+        with open(log, 'a') as f:
+            f.write(f'{os.getpid()}\n')
+        time.sleep(0.5)
+        return pd.read_csv(file_path)
+
+    frame = SidecarStore(directory, 10 * 1024 * 1024).read_through(path, reader, arrow_backed=True)
+    # Find the file mapped at the address of the first column's values
+    address = frame['id'].array.__arrow_array__().chunk(0).buffers()[1].address
+    with open('/proc/self/maps') as maps:
+        for line in maps:
+            fields = line.split()
+            low, high = (int(bound, 16) for bound in fields[0].split('-'))
+            if low <= address < high:
+                return len(frame), fields[-1]
+    return len(frame), None
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason='needs /proc/self/maps')
+def test_server_processes_share_one_parse(tmp_path, csv_files):
+    """Test that processes sharing a sidecar directory parse once and map the same pages"""
+    pytest.importorskip('pyarrow')
+    directory = str(tmp_path / 'sidecars')
+    log = str(tmp_path / 'parses.log')
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=3, mp_context=context) as pool:
+        results = list(pool.map(load_shared_sidecar, [directory] * 3, [csv_files[0]] * 3, [log] * 3))
+    with open(log) as f:
+        assert len(f.read().split()) == 1
+    store = SidecarStore(directory, 0)
+    assert results == [(100, store.path_for(store.digest(csv_files[0])))] * 3
+
+
+def test_concurrent_loads_parse_once(csv_files):
+    """Test that concurrent misses for the same file share a single parse"""
+    cache = DatasetCache(max_bytes=10 * 1024 * 1024)
+    parses = []
+
+    def slow_read(path):
+        parses.append(path)
+        time.sleep(0.2)
+        return pd.read_csv(path)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load(csv_files[0], slow_read)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(parses) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.stats()['coalesced_loads'] == 3
+
+
+def test_process_workers_parse_files(csv_files):
+    """Test that process mode parses in a worker process"""
+    pool = WorkerPool(max_in_flight=2, mode='process', processes=1)
+    try:
+        frame = pool.parse(read_frame, csv_files[0], 'numpy')
+    finally:
+        pool.shutdown()
+    pd.testing.assert_frame_equal(frame, pd.read_csv(csv_files[0]))
+
+
+def test_excel_engine_selection():
+    """Test that the fastest installed engine is chosen and explicit choices are checked"""
+    expected = 'calamine' if engine_available('calamine') else 'openpyxl'
+    assert select_engine('book.XLSX') == expected
+    assert select_engine('book.xlsx', 'openpyxl') == 'openpyxl'
+    with pytest.raises(ValueError):
+        select_engine('book.xlsx', 'pyxlsb')
+    with pytest.raises(ValueError):
+        select_engine('book.csv')
+
+
+def test_excel_loader_reads_sheets_in_worker_process(tmp_path):
+    """Test that workbooks (paths or uploaded bytes) parse the same in a worker process"""
+    path = str(tmp_path / 'book.xlsx')
+    frames = {'a': pd.DataFrame({'x': [1, 2]}), 'b': pd.DataFrame({'y': ['p', 'q']})}
+    with pd.ExcelWriter(path) as writer:
+        for name, frame in frames.items():
+            frame.to_excel(writer, sheet_name=name, index=False)
+    loader = ExcelLoader(processes=1)
+    try:
+        assert loader.sheets(path) == ['a', 'b']
+        pd.testing.assert_frame_equal(loader.read(path), frames['a'])
+        with open(path, 'rb') as f:
+            content = f.read()
+        pd.testing.assert_frame_equal(loader.read(content, 'b', 'upload.xlsx'), frames['b'])
+    finally:
+        loader.shutdown()
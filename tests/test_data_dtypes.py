@@ -0,0 +1,91 @@
+"""
+Test cases for load-time dtype optimization
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data.aggregate import aggregate_frame, compile_aggregations
+from data.dtypes import optimize_frame, plan_dtypes
+from data.encoding import encode_page
+from data.indexes import ColumnIndex
+from data.query import compile_predicate, select_positions
+from data.sorting import sort_permutation, top_k_permutation
+
+
+@pytest.fixture
+def frame():
+    """Create a frame shaped like a typical CSV parse: int64, float64 and object columns"""
+    rng = np.random.default_rng(1)
+    rows = 20_000
+    dept = rng.choice(['eng', 'ops', 'hr', None], rows).astype(object)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'age': rng.integers(18, 70, rows),
+        'score': rng.integers(0, 100, rows) / 4,
+        'ratio': rng.normal(0, 1, rows),
+        'dept': dept,
+        'email': [f'user{i}@example.com' for i in range(rows)],
+        'joined': pd.date_range('2020-01-01', periods=rows, freq='h').strftime('%Y-%m-%d %H:%M:%S'),
+        'mixed': ['a' if i % 2 else 1 for i in range(rows)],
+    })
+
+
+def test_optimize_frame_shrinks_columns(frame):
+    """Test the chosen types, lossless values and the memory report"""
+    optimized, report = optimize_frame(frame)
+    assert optimized['id'].dtype == np.int16
+    assert optimized['age'].dtype == np.int8
+    assert optimized['score'].dtype == np.float32
+    assert optimized['ratio'].dtype == np.float64
+    assert isinstance(optimized['dept'].dtype, pd.CategoricalDtype)
+    assert optimized['email'].dtype == object
+    assert pd.api.types.is_datetime64_dtype(optimized['joined'])
+    assert optimized['mixed'].dtype == object
+    for column in ['id', 'age', 'score', 'dept']:
+        assert optimized[column].astype(object).where(optimized[column].notna(), None).tolist() == frame[column].tolist()
+    assert set(report['columns']) == {'id', 'age', 'score', 'dept', 'joined'}
+    assert report['columns']['dept']['dtype_after'] == 'category'
+    assert report['bytes_saved'] > 0
+    assert frame['id'].dtype == np.int64
+
+
+def test_plan_rejects_ambiguous_strings():
+    """Test that non-ISO dates are not parsed and unique strings stay strings"""
+    df = pd.DataFrame({'day': ['01/02/2024', '02/03/2024'] * 10, 'code': [f'c{i}' for i in range(20)]})
+    assert plan_dtypes(df) == {'day': 'category'}
+
+
+def test_optimized_frames_query_identically(frame):
+    """Test that filters, sorts, aggregations and encodings see the same data"""
+    optimized, _ = optimize_frame(frame)
+    for where in [
+        {'column': 'dept', 'op': '==', 'value': 'ops'},
+        {'column': 'dept', 'op': '>', 'value': 'f'},
+        {'column': 'dept', 'op': 'in', 'value': ['hr', 'sales']},
+        {'column': 'dept', 'op': '!=', 'value': 'nope'},
+        {'and': [{'column': 'age', 'op': 'between', 'value': [30, 40]},
+                 {'column': 'dept', 'op': 'contains', 'value': 'n'}]},
+    ]:
+        np.testing.assert_array_equal(select_positions(compile_predicate(where, optimized), optimized),
+                                      select_positions(compile_predicate(where, frame), frame))
+    for column, value in [('dept', 'eng'), ('dept', 'sales'), ('age', 30), ('age', 300)]:
+        np.testing.assert_array_equal(ColumnIndex(optimized[column]).lookup(value),
+                                      ColumnIndex(frame[column]).lookup(value))
+    np.testing.assert_array_equal(sort_permutation(optimized, ['dept', 'age'], [True, False]),
+                                  sort_permutation(frame, ['dept', 'age'], [True, False]))
+    np.testing.assert_array_equal(top_k_permutation(optimized, ['age', 'id'], [False, True], 50),
+                                  top_k_permutation(frame, ['age', 'id'], [False, True], 50))
+    aggregations = [{'func': 'sum', 'column': 'age'}, {'func': 'max', 'column': 'email'},
+                    {'func': 'min', 'column': 'dept'}, {'func': 'mean', 'column': 'score'}]
+    keys, specs = compile_aggregations('dept', aggregations, frame)
+    expected = encode_page(aggregate_frame(frame, keys, specs))
+    assert encode_page(aggregate_frame(optimized, keys, specs)) == expected
+    columns = ['id', 'age', 'score', 'dept']
+    assert encode_page(optimized[columns].head(100)) == encode_page(frame[columns].head(100))
@@ -0,0 +1,232 @@
+"""
+Test cases for the data query helpers
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data.encoding import RESULT_FORMATS, decode_arrow, encode_page, json_dumps
+from data.indexes import ColumnIndex, equality_positions
+from data.pipeline import compile_pipeline
+from data.query import QueryError, compile_predicate, select_positions
+from data.sampling import frame_chunks, sample_frames
+from data.sorting import sort_permutation, top_k_permutation
+from data.sql import SqliteSnapshot, run_sqlite
+
+
+@pytest.fixture
+def frame():
+    """Create a frame with missing values and mixed column types"""
+    rng = np.random.default_rng(0)
+    rows = 500
+    ints = rng.integers(0, 10, rows).astype(float)
+    ints[::7] = np.nan
+    return pd.DataFrame({
+        'num': ints,
+        'name': rng.choice(['a', 'b', 'c', None], rows),
+        'when': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 5, rows), unit='D'),
+    })
+
+
+@pytest.mark.parametrize('column,value', [
+    ('num', 3), ('num', 3.0), ('num', 42), ('num', '3'),
+    ('name', 'b'), ('name', 'z'),
+    ('when', '2024-01-03'),
+])
+def test_column_index_matches_scan(frame, column, value):
+    """Test that index lookups return the same rows as a column scan"""
+    index = ColumnIndex(frame[column])
+    positions = index.lookup(value)
+    assert positions is not None
+    np.testing.assert_array_equal(positions, equality_positions(frame, column, value))
+
+
+def test_column_index_skips_missing_values(frame):
+    """Test that missing values are never returned by a lookup"""
+    index = ColumnIndex(frame['num'])
+    assert len(index.lookup(np.nan)) == 0
+    assert len(index.positions) == frame['num'].notna().sum()
+
+
+def test_column_index_defers_unhashable_values(frame):
+    """Test that values the index cannot probe fall back to a scan"""
+    assert ColumnIndex(frame['name']).lookup(['a']) is None
+
+
+@pytest.mark.parametrize('column', ['num', 'name'])
+def test_column_index_extends_with_appended_rows(frame, column):
+    """Test that extending an index with new rows matches indexing the longer column"""
+    longer = pd.concat([frame, frame.iloc[::-1]], ignore_index=True)
+    longer.loc[len(frame), 'name'] = 'new'
+    extended = ColumnIndex(frame[column]).extend(longer[column].iloc[len(frame):], len(frame))
+    rebuilt = ColumnIndex(longer[column])
+    for value in longer[column].dropna().unique():
+        np.testing.assert_array_equal(extended.lookup(value), rebuilt.lookup(value))
+    assert len(extended.positions) == len(rebuilt.positions)
+
+
+@pytest.mark.parametrize('columns,ascending', [
+    ('num', True), ('num', False), (['num', 'name'], [True, False]), ('when', False),
+])
+def test_top_k_matches_full_sort(frame, columns, ascending):
+    """Test that a top-k selection equals the head of the stable full sort"""
+    expected = sort_permutation(frame, columns, ascending)[:20]
+    np.testing.assert_array_equal(top_k_permutation(frame, columns, ascending, 20), expected)
+
+
+def test_top_k_declines_non_numeric_and_large_prefixes(frame):
+    """Test that top-k defers to a full sort when it would not help"""
+    assert top_k_permutation(frame, 'name', True, 10) is None
+    assert top_k_permutation(frame, 'num', True, len(frame) // 2) is None
+
+
+@pytest.mark.parametrize('where,expected', [
+    ({'column': 'num', 'op': '>=', 'value': 5}, lambda df: df['num'] >= 5),
+    ({'column': 'num', 'op': '!=', 'value': 5}, lambda df: (df['num'] != 5) & df['num'].notna()),
+    ({'column': 'name', 'op': 'in', 'value': ['a', 'c']}, lambda df: df['name'].isin(['a', 'c'])),
+    ({'column': 'num', 'op': 'between', 'value': [2, 4]}, lambda df: df['num'].between(2, 4)),
+    ({'column': 'name', 'op': 'is_null'}, lambda df: df['name'].isna()),
+    ({'column': 'when', 'op': '<', 'value': '2024-01-03'}, lambda df: df['when'] < '2024-01-03'),
+    ({'and': [{'column': 'num', 'op': '==', 'value': 3},
+              {'not': {'column': 'name', 'op': 'contains', 'value': 'b'}}]},
+     lambda df: (df['num'] == 3) & ~df['name'].str.contains('b', na=False).astype(bool)),
+    ({'or': [{'column': 'num', 'op': '<', 'value': 1}, {'column': 'name', 'op': '==', 'value': 'c'}]},
+     lambda df: (df['num'] < 1) | (df['name'] == 'c')),
+])
+def test_select_positions_matches_pandas(frame, where, expected):
+    """Test predicate evaluation with and without column indexes"""
+    predicate = compile_predicate(where, frame)
+    want = np.flatnonzero(expected(frame).to_numpy())
+    np.testing.assert_array_equal(select_positions(predicate, frame), want)
+    indexes = {'num': ColumnIndex(frame['num']), 'name': ColumnIndex(frame['name'])}
+    np.testing.assert_array_equal(select_positions(predicate, frame, indexes), want)
+
+
+@pytest.mark.parametrize('where', [
+    {'column': 'missing', 'op': '==', 'value': 1},
+    {'column': 'num', 'op': '~', 'value': 1},
+    {'column': 'num', 'op': '>', 'value': 'five'},
+    {'column': 'num', 'op': 'contains', 'value': '1'},
+    {'column': 'when', 'op': '>', 'value': 'not a date'},
+    {'and': []},
+])
+def test_compile_predicate_rejects_invalid_trees(frame, where):
+    """Test that predicates are validated against the schema"""
+    with pytest.raises(QueryError):
+        compile_predicate(where, frame)
+
+
+@pytest.mark.parametrize('fmt', RESULT_FORMATS)
+def test_encode_page_formats_agree(frame, fmt):
+    """Test that every result format carries the same values, with NaN as null"""
+    payload = encode_page(frame, fmt)
+    if fmt == 'arrow':
+        pd.testing.assert_frame_equal(decode_arrow(payload['data']), frame, check_dtype=False)
+        return
+    names = list(frame.columns)
+    data = payload['data']
+    if fmt == 'columns':
+        rows = [dict(zip(names, values)) for values in zip(*data.values())]
+    elif fmt == 'split':
+        rows = [dict(zip(names, values)) for values in data]
+    else:
+        rows = data
+    assert len(rows) == len(frame)
+    assert rows[0] == {'num': None, 'name': frame['name'][0], 'when': frame['when'][0].isoformat()}
+    assert rows[1]['num'] == frame['num'][1]
+    assert b'NaN' not in json_dumps(payload)
+
+
+def test_encode_page_rejects_unknown_format(frame):
+    """Test that an unknown result format is refused"""
+    with pytest.raises(ValueError):
+        encode_page(frame, 'xml')
+
+
+def test_compile_pipeline_reorders_and_fuses(frame):
+    """Test that filters move ahead of sorts, sorts fuse and limits end a stage"""
+    plan = compile_pipeline([
+        {'sort': {'by': 'num'}},
+        {'filter': {'column': 'name', 'op': '==', 'value': 'a'}},
+        {'sort': {'by': 'when', 'ascending': False}},
+        {'select': ['num', 'when']},
+        {'limit': 20},
+        {'limit': 10},
+        {'filter': {'column': 'num', 'op': '>', 'value': 2}},
+    ], frame)
+    assert plan == {
+        'stages': [
+            {'where': {'column': 'name', 'op': '==', 'value': 'a'},
+             'sort': [['when', False], ['num', True]], 'limit': 10},
+            {'where': {'column': 'num', 'op': '>', 'value': 2}, 'sort': None, 'limit': None},
+        ],
+        'columns': ['num', 'when'],
+    }
+
+
+@pytest.mark.parametrize('steps', [
+    [],
+    [{'group': 'name'}],
+    [{'sort': {'by': 'missing'}}],
+    [{'limit': -1}],
+    [{'select': ['num']}, {'sort': {'by': 'name'}}],
+    [{'filter': {'column': 'num', 'op': '~', 'value': 1}}],
+])
+def test_compile_pipeline_rejects_invalid_steps(frame, steps):
+    """Test that malformed steps raise QueryError"""
+    with pytest.raises(QueryError):
+        compile_pipeline(steps, frame)
+
+
+def test_sqlite_snapshots_run_read_only_queries(frame):
+    """Test joins with on-demand indexes, row caps, timeouts and rejected writes"""
+    grown = []
+    people = SqliteSnapshot(pd.DataFrame({'id': range(100), 'team': [i % 7 for i in range(100)]}), grown.append)
+    before = people.nbytes
+    snapshots = {'samples': SqliteSnapshot(frame), 'people': people}
+    result, truncated = run_sqlite(
+        'SELECT p.team, COUNT(*) AS n FROM samples s JOIN people p ON p.id = s.num GROUP BY p.team', snapshots, 100, 5)
+    assert not truncated
+    expected = frame['num'].dropna().astype(int).map(lambda i: i % 7).value_counts().sort_index()
+    assert dict(zip(result['team'], result['n'])) == expected.to_dict()
+    assert people.indexes == {('id',)}
+    assert sum(grown) == people.nbytes - before > 0
+    
+    result, truncated = run_sqlite('SELECT name, "when" FROM samples', snapshots, 10, 5)
+    assert truncated and len(result) == 10
+    assert result['when'][0] == frame['when'][0].isoformat()
+    with pytest.raises(TimeoutError):
+        run_sqlite('WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT MAX(x) FROM c',
+                   snapshots, 10, 0.2)
+    for sql in ['DROP TABLE people', 'SELECT 1; DROP TABLE people', "ATTACH 'x.db' AS x", 'PRAGMA table_info(people)',
+                'CREATE INDEX t1.x ON people (team)']:
+        with pytest.raises(ValueError):
+            run_sqlite(sql, snapshots, 10, 5)
+
+
+def test_reservoir_sample_is_uniform_and_reproducible():
+    """Test that every row is equally likely and a seed fixes the sample"""
+    df = pd.DataFrame({'i': np.arange(1000)})
+    counts = np.zeros(len(df))
+    for seed in range(500):
+        sample = sample_frames(frame_chunks(df, 64), 50, seed)
+        assert len(sample) == 50
+        assert sample['i'].tolist() == sorted(sample.index)
+        counts[sample['i']] += 1
+    # Each row is kept with probability 0.05; the first and last chunks get no advantage
+    assert abs(counts[:100].mean() - 25) < 3 and abs(counts[-100:].mean() - 25) < 3
+    assert sample_frames(frame_chunks(df, 64), 50, 7).equals(sample_frames(frame_chunks(df, 64), 50, 7))
+    assert len(sample_frames(frame_chunks(df.head(3), 2), 10)) == 3
+
+
+def test_stratified_sample_keeps_rare_values():
+    """Test that each value of the stratification column gets its own sample"""
+    df = pd.DataFrame({'g': ['rare'] * 3 + ['common'] * 997 + [None] * 5, 'i': range(1005)})
+    sample = sample_frames(frame_chunks(df, 100), 4, 0, 'g')
+    assert sample['g'].value_counts(dropna=False).to_dict() == {'rare': 3, 'common': 4, None: 4}
@@ -0,0 +1,60 @@
+"""
+Test cases for dataset summaries
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from data.summary import SummaryStore, chunk_moments, merge_moments, summarize
+
+
+@pytest.fixture
+def frame():
+    """Create a numeric frame with missing values"""
+    rng = np.random.default_rng(1)
+    values = rng.normal(10, 3, 1000)
+    values[::11] = np.nan
+    return pd.DataFrame({'x': values, 'n': rng.integers(0, 100, 1000)})
+
+
+def test_summary_matches_describe(frame):
+    """Test that the moment-based summary equals DataFrame.describe()"""
+    expected = frame.describe().to_dict()
+    summary = summarize(frame)['summary']
+    for column, stats in expected.items():
+        assert summary[column] == pytest.approx(stats)
+
+
+def test_merged_chunk_moments_match_full_frame(frame):
+    """Test that merging per-chunk moments gives the whole-frame summary"""
+    moments = None
+    for i, start in enumerate(range(0, len(frame), 300)):
+        chunk = chunk_moments(frame.iloc[start:start + 300])
+        moments = chunk if i == 0 else merge_moments(moments, chunk)
+    merged = summarize(frame, moments)['summary']
+    for column, stats in frame.describe().to_dict().items():
+        assert merged[column] == pytest.approx(stats)
+
+
+def test_non_numeric_frames_fall_back_to_describe():
+    """Test that frames describe() treats as categorical are summarized as usual"""
+    frame = pd.DataFrame({'name': ['a', 'b', 'a']})
+    result = summarize(frame)
+    assert result['moments'] is None
+    assert result['summary'] == frame.describe().to_dict()
+
+
+def test_summary_store_persists_across_instances(tmp_path, frame):
+    """Test that summaries are read back from disk by a new store"""
+    store = SummaryStore(str(tmp_path))
+    computed = store.get_or_compute('abc', lambda: frame)
+    reloaded = SummaryStore(str(tmp_path)).get('abc')
+    assert reloaded['rows'] == computed['rows']
+    assert reloaded['summary']['x'] == pytest.approx(computed['summary']['x'])
+    assert reloaded['moments']['n'] == computed['moments']['n']
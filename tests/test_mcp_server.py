@@ -0,0 +1,580 @@
+"""
+Test cases for the MCP Server data tools
+"""
+import asyncio
+import base64
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import mcp_server
+from data.cache import frame_nbytes, object_nbytes
+from data.encoding import decode_arrow
+from data.excel import ExcelLoader
+from data.handles import HandleRegistry
+from data.sidecar import SidecarStore
+from data.sql import SqliteSnapshot
+from data.summary import SummaryStore
+from policy.batch import unpack_bitmap
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(tmp_path, monkeypatch):
+    """Start every test with an empty dataset cache and sidecar directory"""
+    monkeypatch.setattr(mcp_server, 'SIDECARS', SidecarStore(str(tmp_path / 'sidecars'), 1024 * 1024))
+    monkeypatch.setattr(mcp_server, 'SUMMARIES', SummaryStore(str(tmp_path / 'summaries')))
+    monkeypatch.setattr(mcp_server, 'EXCEL_LOADER', ExcelLoader(processes=0))
+    mcp_server.DATASET_CACHE.clear()
+    yield
+    mcp_server.DATASET_CACHE.clear()
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    """Create a small CSV file"""
+    path = tmp_path / 'people.csv'
+    pd.DataFrame({
+        'name': ['alice', 'bob', 'tim', 'eve'],
+        'age': [32, 29, 38, 29],
+        'dept': ['eng', 'ops', 'eng', 'hr'],
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def test_read_csv_excel_uses_cache(csv_file):
+    """Test that repeated reads are served from the dataset cache"""
+    result = asyncio.run(mcp_server.read_csv_excel(csv_file))
+    assert result['rows'] == 4
+    mcp_server.analyze_csv_excel(csv_file)
+    stats = mcp_server.get_cache_stats()
+    assert stats['entries'] == 1
+    assert stats['hits'] == 1
+
+
+def test_filter_and_sort_load_on_demand(csv_file):
+    """Test that filter and sort work without a prior read"""
+    filtered = mcp_server.filter_data(csv_file, 'dept', 'eng')
+    assert [row['name'] for row in filtered['data']] == ['alice', 'tim']
+    sorted_result = mcp_server.sort_data(csv_file, 'age', ascending=False)
+    assert sorted_result['data'][0]['name'] == 'tim'
+
+
+def test_unsupported_format(tmp_path):
+    """Test that unsupported files are rejected"""
+    result = asyncio.run(mcp_server.read_csv_excel(str(tmp_path / 'notes.txt')))
+    assert 'error' in result
+
+
+def test_read_csv_excel_pages_with_cursor(csv_file):
+    """Test that cursors walk through the whole file one page at a time"""
+    first = asyncio.run(mcp_server.read_csv_excel(csv_file, limit=3))
+    assert first['rows'] == 4
+    assert len(first['data']) == 3
+    second = asyncio.run(mcp_server.read_csv_excel(csv_file, limit=3, cursor=first['next_cursor']))
+    assert [row['name'] for row in second['data']] == ['eve']
+    assert second['next_cursor'] is None
+    assert 'limit' in asyncio.run(mcp_server.read_csv_excel(csv_file, limit=0))['error']
+
+
+def test_sort_cursor_is_stable(csv_file):
+    """Test that sorted pages keep a stable order across calls"""
+    first = mcp_server.sort_data(csv_file, 'age', limit=2)
+    assert [row['name'] for row in first['data']] == ['bob', 'eve']
+    second = mcp_server.sort_data(csv_file, 'age', limit=2, cursor=first['next_cursor'])
+    assert [row['name'] for row in second['data']] == ['alice', 'tim']
+
+
+def test_cursor_rejected_after_file_changes(csv_file):
+    """Test that a cursor issued for an old version of the file is refused"""
+    first = mcp_server.filter_data(csv_file, 'age', 29, limit=1)
+    pd.DataFrame({'name': ['zed'], 'age': [29], 'dept': ['hr']}).to_csv(csv_file, index=False)
+    result = mcp_server.filter_data(csv_file, 'age', 29, limit=1, cursor=first['next_cursor'])
+    assert 'stale' in result['error']
+
+
+class ProgressRecorder:
+    """Stand-in for the MCP request context that records progress notifications"""
+
+    def __init__(self):
+        self.updates = []
+
+    async def report_progress(self, progress, total=None, message=None):
+        self.updates.append((progress, total, message))
+
+
+def test_streaming_read_reports_progress(csv_file):
+    """Test that a streaming read parses in chunks and reports progress per chunk"""
+    ctx = ProgressRecorder()
+    result = asyncio.run(mcp_server.read_csv_excel(csv_file, stream=True, chunksize=1, ctx=ctx))
+    assert result['rows'] == 4
+    assert len(ctx.updates) == 4
+    assert ctx.updates[-1][0] == ctx.updates[-1][1] == os.path.getsize(csv_file)
+    assert mcp_server.get_cache_stats()['entries'] == 1
+
+
+def test_reads_page_through_streaming_load_in_progress(csv_file):
+    """Test that rows parsed so far are served while a streaming load runs"""
+    load, created = mcp_server.STREAMING_LOADS.start(csv_file, chunksize=2)
+    assert created
+    try:
+        chunks = load.chunks()
+        next(chunks)
+        result = asyncio.run(mcp_server.read_csv_excel(csv_file))
+        assert result['rows'] == 2
+        assert result['progress']['complete'] is False
+        assert result['progress']['rows_parsed'] == 2
+    finally:
+        mcp_server.STREAMING_LOADS.finish(load)
+
+
+def test_sidecar_reused_after_restart(csv_file):
+    """Test that a reload after clearing the in-memory cache comes from the sidecar"""
+    pytest.importorskip('pyarrow')
+    first = asyncio.run(mcp_server.read_csv_excel(csv_file))
+    mcp_server.DATASET_CACHE.clear()
+    second = asyncio.run(mcp_server.read_csv_excel(csv_file))
+    assert second['data'] == first['data']
+    sidecar = mcp_server.get_cache_stats()['sidecar']
+    assert sidecar['writes'] == 1
+    assert sidecar['hits'] == 1
+
+
+def test_arrow_storage_mode(csv_file, monkeypatch):
+    """Test that the data tools work on Arrow-backed frames"""
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(mcp_server, 'STORAGE_MODE', 'arrow')
+    monkeypatch.setattr(mcp_server, 'SIDECAR_NAMESPACE', 'arrow')
+    result = asyncio.run(mcp_server.read_csv_excel(csv_file))
+    assert result['rows'] == 4
+    frame = mcp_server.load_dataset(csv_file).frame
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in frame.dtypes)
+    filtered = mcp_server.filter_data(csv_file, 'dept', 'eng')
+    assert [row['name'] for row in filtered['data']] == ['alice', 'tim']
+    sorted_result = mcp_server.sort_data(csv_file, 'age', ascending=False, limit=1)
+    assert sorted_result['data'] == [{'name': 'tim', 'age': 38, 'dept': 'eng'}]
+
+
+def test_filter_builds_column_index_once(csv_file):
+    """Test that equality filters share one lazily built index per column"""
+    mcp_server.filter_data(csv_file, 'age', 29)
+    dataset = mcp_server.load_dataset(csv_file)
+    index = dataset.derived[('index', 'age')]
+    result = mcp_server.filter_data(csv_file, 'age', 32)
+    assert dataset.derived[('index', 'age')] is index
+    assert [row['name'] for row in result['data']] == ['alice']
+    assert mcp_server.get_cache_stats()['bytes'] == dataset.nbytes
+
+
+def test_sort_by_multiple_columns(csv_file):
+    """Test sorting by several columns with per-column directions"""
+    result = mcp_server.sort_data(csv_file, ['age', 'name'], [True, False])
+    assert [row['name'] for row in result['data']] == ['eve', 'bob', 'alice', 'tim']
+    dataset = mcp_server.load_dataset(csv_file)
+    assert ('sort', ('age', 'name'), (True, False)) in dataset.derived
+
+
+def test_query_data_with_projection(csv_file):
+    """Test the multi-predicate query tool returns only projected columns"""
+    where = {'or': [{'column': 'dept', 'op': '==', 'value': 'hr'},
+                    {'column': 'age', 'op': '>', 'value': 35}]}
+    result = mcp_server.query_data(csv_file, where=where, columns=['name'])
+    assert result['columns'] == ['name']
+    assert result['data'] == [{'name': 'tim'}, {'name': 'eve'}]
+    assert 'error' in mcp_server.query_data(csv_file, where={'column': 'nope', 'op': '==', 'value': 1})
+
+
+def test_analyze_memoized_by_content(csv_file, tmp_path):
+    """Test that identical files share one summary, which survives a restart"""
+    first = mcp_server.analyze_csv_excel(csv_file)
+    assert first['summary']['age']['max'] == 38
+    copy = tmp_path / 'copy.csv'
+    copy.write_bytes(open(csv_file, 'rb').read())
+    assert mcp_server.analyze_csv_excel(str(copy)) == first
+    restarted = SummaryStore(mcp_server.SUMMARIES.directory)
+    digest = mcp_server.CONTENT_HASHES.digest(csv_file)
+    assert restarted.get(digest)['summary'] == first['summary']
+    assert mcp_server.get_cache_stats()['summaries']['hits'] == 1
+
+
+def test_streaming_read_computes_summary(csv_file):
+    """Test that a streamed load leaves a summary merged from per-chunk moments"""
+    asyncio.run(mcp_server.read_csv_excel(csv_file, stream=True, chunksize=1))
+    result = mcp_server.analyze_csv_excel(csv_file)
+    assert result['summary']['age']['mean'] == pytest.approx(32.0)
+    assert mcp_server.get_cache_stats()['summaries'] == {'entries': 1, 'hits': 1, 'misses': 0}
+
+
+def test_group_aggregate(csv_file):
+    """Test grouped aggregations return one row per group"""
+    result = mcp_server.group_aggregate(csv_file, 'dept', [
+        {'func': 'size'},
+        {'func': 'mean', 'column': 'age'},
+        {'func': 'quantile', 'column': 'age', 'q': 0.5, 'alias': 'median_age'},
+        {'func': 'nunique', 'column': 'name'},
+    ])
+    assert result['columns'] == ['dept', 'size', 'age_mean', 'median_age', 'name_nunique']
+    assert result['data'][0] == {'dept': 'eng', 'size': 2, 'age_mean': 35.0, 'median_age': 35.0, 'name_nunique': 2}
+    assert result['rows'] == 3
+    filtered = mcp_server.group_aggregate(csv_file, ['dept'], [{'func': 'max', 'column': 'age'}],
+                                          where={'column': 'age', 'op': '<', 'value': 35})
+    assert filtered['data'] == [{'dept': 'eng', 'age_max': 32}, {'dept': 'hr', 'age_max': 29},
+                                {'dept': 'ops', 'age_max': 29}]
+    assert 'error' in mcp_server.group_aggregate(csv_file, 'dept', [{'func': 'sum', 'column': 'name'}])
+
+
+def test_columnar_result_formats(csv_file):
+    """Test that tools can return pages column-wise or as Arrow IPC"""
+    result = mcp_server.filter_data(csv_file, 'dept', 'eng', format='columns')
+    assert result['format'] == 'columns'
+    assert result['data'] == {'name': ['alice', 'tim'], 'age': [32, 38], 'dept': ['eng', 'eng']}
+    split = mcp_server.sort_data(csv_file, 'age', format='split', limit=2)
+    assert split['data'] == [['bob', 29, 'ops'], ['eve', 29, 'hr']]
+    arrow = asyncio.run(mcp_server.read_csv_excel(csv_file, format='arrow'))
+    assert arrow['encoding'] == 'arrow-ipc-stream+base64'
+    assert decode_arrow(arrow['data'])['name'].tolist() == ['alice', 'bob', 'tim', 'eve']
+    assert 'error' in mcp_server.query_data(csv_file, format='xml')
+
+
+def test_blocking_tools_leave_event_loop_free(csv_file, monkeypatch):
+    """Test that cheap tools stay fast while a slow parse runs on the worker pool"""
+    parse = mcp_server.parse_dataset
+    parses = []
+
+    def slow_parse(path, sheet=None):
+        parses.append(path)
+        time.sleep(0.5)
+        return parse(path, sheet)
+
+    monkeypatch.setattr(mcp_server, 'parse_dataset', slow_parse)
+
+    async def scenario():
+        start = time.perf_counter()
+        filters = [asyncio.create_task(mcp_server.mcp.call_tool(
+            'filter_data', {'file_path': csv_file, 'column': 'dept', 'value': 'eng'})) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        await mcp_server.mcp.call_tool('list_tools', {})
+        cheap = time.perf_counter() - start
+        await asyncio.gather(*filters)
+        return cheap
+
+    # The parse takes 0.5s; list_tools must not wait for it
+    assert asyncio.run(scenario()) < 0.3
+    assert len(parses) == 1
+    workers = mcp_server.get_cache_stats()['workers']
+    assert workers['completed'] >= 2
+    assert workers['running'] == 0 and workers['queued'] == 0
+
+
+def test_excel_sheet_selection(tmp_path):
+    """Test that each sheet of a workbook is listed, parsed and cached separately"""
+    path = str(tmp_path / 'book.xlsx')
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'city': ['oslo', 'rome'], 'pop': [0.7, 2.8]}).to_excel(writer, sheet_name='cities', index=False)
+        pd.DataFrame({'name': ['alice', 'bob'], 'age': [32, 29]}).to_excel(writer, sheet_name='people', index=False)
+    assert mcp_server.list_sheets(path) == {'sheets': ['cities', 'people']}
+    first = asyncio.run(mcp_server.read_csv_excel(path))
+    assert first['columns'] == ['city', 'pop']
+    people = asyncio.run(mcp_server.read_csv_excel(path, sheet='people'))
+    assert people['data'] == [{'name': 'alice', 'age': 32}, {'name': 'bob', 'age': 29}]
+    assert mcp_server.filter_data(path, 'age', 29, sheet='people')['data'] == [{'name': 'bob', 'age': 29}]
+    assert mcp_server.analyze_csv_excel(path, sheet='people')['summary']['age']['max'] == 32
+    assert mcp_server.load_dataset(path).version != mcp_server.load_dataset(path, 'people').version
+    assert 'error' in asyncio.run(mcp_server.read_csv_excel(path, sheet='missing'))
+
+
+def test_excel_sheet_handles(tmp_path):
+    """Test that the handle of a sheet keeps working with every data tool"""
+    path = str(tmp_path / 'book.xlsx')
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'city': ['oslo', 'rome'], 'pop': [0.7, 2.8]}).to_excel(writer, sheet_name='cities', index=False)
+        pd.DataFrame({'name': ['alice', 'bob', 'tim'], 'age': [32, 29, 38]}).to_excel(
+            writer, sheet_name='people', index=False)
+    handle = asyncio.run(mcp_server.read_csv_excel(path, sheet='people'))['dataset']['id']
+    assert mcp_server.filter_data(path, 'age', 29, sheet='people')['dataset']['id'] != handle
+    assert asyncio.run(mcp_server.read_csv_excel(handle))['rows'] == 3
+    assert mcp_server.filter_data(handle, 'age', 29)['data'] == [{'name': 'bob', 'age': 29}]
+    assert mcp_server.sort_data(handle, 'age', ascending=False)['data'][0]['name'] == 'tim'
+    assert mcp_server.analyze_csv_excel(handle)['summary']['age']['max'] == 38
+    # A handle of the sheet obtained through a data tool rather than a read
+    filtered = mcp_server.filter_data(path, 'age', 30, sheet='people')
+    assert filtered['rows'] == 0 and 'error' not in mcp_server.sort_data(filtered['dataset']['id'], 'age')
+
+
+def test_optimized_dtypes(tmp_path, monkeypatch):
+    """Test that optimized datasets report their savings and answer queries unchanged"""
+    monkeypatch.setattr(mcp_server, 'OPTIMIZE_DTYPES', True)
+    monkeypatch.setattr(mcp_server, 'SIDECAR_NAMESPACE', ':optimized')
+    path = str(tmp_path / 'orders.csv')
+    pd.DataFrame({
+        'id': range(1000),
+        'region': ['north', 'south', 'east', 'west'] * 250,
+        'day': pd.date_range('2024-01-01', periods=1000, freq='h').strftime('%Y-%m-%d %H:%M:%S'),
+    }).to_csv(path, index=False)
+    report = mcp_server.get_memory_report(path)
+    assert report['columns']['region']['dtype'] == 'category'
+    assert report['optimization']['columns']['id']['dtype_after'] == 'int16'
+    assert report['optimization']['bytes_saved'] > 0
+    filtered = mcp_server.filter_data(path, 'region', 'east', limit=2)
+    assert filtered['data'] == [{'id': 2, 'region': 'east', 'day': '2024-01-01T02:00:00'},
+                                {'id': 6, 'region': 'east', 'day': '2024-01-01T06:00:00'}]
+    sorted_result = mcp_server.sort_data(path, ['region', 'id'], ascending=[True, False], limit=1)
+    assert sorted_result['data'][0]['id'] == 998
+    assert mcp_server.analyze_csv_excel(path)['summary']['id']['max'] == 999
+
+
+def test_dataset_handles(csv_file, tmp_path, monkeypatch):
+    """Test that handles stand in for paths and chain derived views"""
+    handle = asyncio.run(mcp_server.read_csv_excel(csv_file, limit=1))['dataset']
+    assert handle['schema'] == {'name': 'object', 'age': 'int64', 'dept': 'object'}
+    monkeypatch.chdir(tmp_path)
+    assert asyncio.run(mcp_server.read_csv_excel('./people.csv'))['dataset']['id'] == handle['id']
+    assert mcp_server.filter_data(handle['id'], 'dept', 'eng')['rows'] == 2
+    
+    young = mcp_server.query_data(handle['id'], {'column': 'age', 'op': '<', 'value': 35}, columns=['name', 'age'])
+    assert young['dataset']['schema'] == {'name': 'object', 'age': 'int64'}
+    by_age = mcp_server.sort_data(young['dataset']['id'], ['age', 'name'], ascending=[False, True])
+    assert [row['name'] for row in by_age['data']] == ['alice', 'bob', 'eve']
+    page = asyncio.run(mcp_server.read_csv_excel(by_age['dataset']['id'], limit=2))
+    assert page['data'] == [{'name': 'alice', 'age': 32}, {'name': 'bob', 'age': 29}]
+    rest = asyncio.run(mcp_server.read_csv_excel(by_age['dataset']['id'], cursor=page['next_cursor']))
+    assert rest['data'] == [{'name': 'eve', 'age': 29}]
+    
+    twenties = mcp_server.filter_data(by_age['dataset']['id'], 'age', 29)
+    assert [row['name'] for row in twenties['data']] == ['bob', 'eve']
+    grouped = mcp_server.group_aggregate(young['dataset']['id'], 'dept', [{'func': 'size', 'alias': 'n'}])
+    assert grouped['data'] == [{'dept': 'eng', 'n': 1}, {'dept': 'hr', 'n': 1}, {'dept': 'ops', 'n': 1}]
+    assert mcp_server.analyze_csv_excel(twenties['dataset']['id'])['rows'] == 2
+    assert 'error' in mcp_server.query_data(young['dataset']['id'], columns=['dept'])
+    
+    # Views are tied to the file version they were computed on; the dataset handle follows the file
+    time.sleep(0.01)
+    pd.DataFrame({'name': ['zed'], 'age': [50], 'dept': ['eng']}).to_csv(csv_file, index=False)
+    os.utime(csv_file, (time.time() + 5, time.time() + 5))
+    assert 'changed' in mcp_server.sort_data(young['dataset']['id'], 'age')['error']
+    assert mcp_server.filter_data(handle['id'], 'dept', 'eng')['data'] == [{'name': 'zed', 'age': 50, 'dept': 'eng'}]
+    
+    # Only ids the registry issues are handles; anything else is a file path
+    pd.DataFrame({'week': [1, 2]}).to_csv(tmp_path / 'ds-report.csv', index=False)
+    assert asyncio.run(mcp_server.read_csv_excel('ds-report.csv'))['data'] == [{'week': 1}, {'week': 2}]
+    assert mcp_server.filter_data('ds-report.csv', 'week', 2)['rows'] == 1
+
+    monkeypatch.setattr(mcp_server, 'HANDLES', HandleRegistry(ttl=-1))
+    expired = asyncio.run(mcp_server.read_csv_excel(csv_file))['dataset']['id']
+    assert 'expired' in mcp_server.filter_data(expired, 'dept', 'eng')['error']
+
+
+def test_run_pipeline(tmp_path):
+    """Test that a pipeline matches the equivalent pandas chain and caches its plan"""
+    path = str(tmp_path / 'sales.csv')
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'region': rng.choice(['north', 'south', 'east'], 2000),
+        'revenue': rng.integers(0, 500, 2000),
+        'units': rng.integers(1, 20, 2000),
+    })
+    df.to_csv(path, index=False)
+    steps = [
+        {'sort': {'by': 'revenue', 'ascending': False}},
+        {'filter': {'column': 'region', 'op': '==', 'value': 'east'}},
+        {'select': ['revenue', 'units']},
+        {'limit': 50},
+    ]
+    result = mcp_server.run_pipeline(path, steps, limit=20)
+    expected = (df[df['region'] == 'east'].sort_values('revenue', ascending=False, kind='stable')
+                .head(50)[['revenue', 'units']])
+    assert result['rows'] == 50
+    assert result['columns'] == ['revenue', 'units']
+    assert result['data'] == expected.head(20).to_dict('records')
+    rest = mcp_server.run_pipeline(path, steps, cursor=result['next_cursor'], limit=100)
+    assert rest['data'] == expected.iloc[20:].to_dict('records')
+    dataset = mcp_server.load_dataset(path)
+    assert ('view', result['dataset']['id']) in dataset.derived
+    
+    chained = mcp_server.run_pipeline(result['dataset']['id'], [{'sort': {'by': 'units'}}, {'limit': 3}])
+    assert chained['data'] == expected.sort_values('units', kind='stable').head(3).to_dict('records')
+    assert 'error' in mcp_server.run_pipeline(path, [{'select': ['units']}, {'filter': {'column': 'revenue', 'op': '>', 'value': 1}}])
+
+
+def test_sql_query(csv_file, tmp_path, monkeypatch):
+    """Test SQL joins across files and handles, paging and the row cap"""
+    teams = str(tmp_path / 'teams.csv')
+    pd.DataFrame({'dept': ['eng', 'ops', 'hr'], 'floor': [3, 1, 2]}).to_csv(teams, index=False)
+    sql = 'SELECT p.name, t.floor FROM people p JOIN teams t ON t.dept = p.dept ORDER BY t.floor, p.name'
+    first = mcp_server.sql_query(sql, {'people': csv_file, 'teams': teams}, limit=3)
+    assert first['rows'] == 4 and first['truncated'] is False
+    assert first['data'] == [{'name': 'bob', 'floor': 1}, {'name': 'eve', 'floor': 2}, {'name': 'alice', 'floor': 3}]
+    rest = mcp_server.sql_query(sql, {'people': csv_file, 'teams': teams}, cursor=first['next_cursor'])
+    assert rest['data'] == [{'name': 'tim', 'floor': 3}]
+    # Indexes the join persisted into the snapshots count against the cache budget
+    datasets = [mcp_server.load_dataset(path) for path in (csv_file, teams)]
+    assert any(isinstance(value, SqliteSnapshot) and value.indexes
+               for dataset in datasets for value in dataset.derived.values())
+    for dataset in datasets:
+        assert dataset.nbytes == frame_nbytes(dataset.frame) + sum(map(object_nbytes, dataset.derived.values()))
+    assert mcp_server.get_cache_stats()['bytes'] == sum(dataset.nbytes for dataset in datasets)
+    
+    book = str(tmp_path / 'book.xlsx')
+    with pd.ExcelWriter(book) as writer:
+        pd.DataFrame({'x': [1]}).to_excel(writer, sheet_name='first', index=False)
+        pd.DataFrame({'dept': ['eng', 'hr'], 'budget': [10, 4]}).to_excel(writer, sheet_name='budgets', index=False)
+    budgets = asyncio.run(mcp_server.read_csv_excel(book, sheet='budgets'))['dataset']['id']
+    joined = mcp_server.sql_query('SELECT p.name, b.budget FROM people p JOIN budgets b ON b.dept = p.dept '
+                                  'ORDER BY p.name', {'people': csv_file, 'budgets': budgets})
+    assert joined['data'] == [{'name': 'alice', 'budget': 10}, {'name': 'eve', 'budget': 4},
+                              {'name': 'tim', 'budget': 10}]
+    
+    eng = mcp_server.filter_data(csv_file, 'dept', 'eng')['dataset']['id']
+    grouped = mcp_server.sql_query('SELECT dept, AVG(age) AS age FROM people GROUP BY dept', {'people': eng})
+    assert grouped['data'] == [{'dept': 'eng', 'age': 35.0}]
+    
+    monkeypatch.setattr(mcp_server, 'SQL_MAX_ROWS', 2)
+    capped = mcp_server.sql_query('SELECT * FROM people', {'people': csv_file})
+    assert capped['rows'] == 2 and capped['truncated'] is True
+    assert 'error' in mcp_server.sql_query('DELETE FROM people', {'people': csv_file})
+    assert 'error' in mcp_server.sql_query('SELECT 1', {'bad name': csv_file})
+
+
+def test_sample_dataset(tmp_path, monkeypatch):
+    """Test that streamed and cached samples agree and the stream path loads nothing"""
+    monkeypatch.setattr(mcp_server, 'DEFAULT_CHUNK_ROWS', 300)
+    path = str(tmp_path / 'events.csv')
+    pd.DataFrame({'id': range(2000), 'kind': ['a', 'b', 'c', 'd'] * 500}).to_csv(path, index=False)
+    streamed = mcp_server.sample_dataset(path, n=20, seed=3)
+    assert streamed['source'] == 'stream' and streamed['rows'] == 20
+    assert mcp_server.get_cache_stats()['entries'] == 0
+    mcp_server.load_dataset(path)
+    cached = mcp_server.sample_dataset(path, n=20, seed=3)
+    assert cached['source'] == 'cache' and cached['data'] == streamed['data']
+    assert mcp_server.sample_dataset(path, n=20, seed=4)['data'] != streamed['data']
+    stratified = mcp_server.sample_dataset(path, n=2, stratify_by='kind', format='columns')
+    assert sorted(stratified['data']['kind']) == ['a', 'a', 'b', 'b', 'c', 'c', 'd', 'd']
+    assert 'error' in mcp_server.sample_dataset(path, n=-1)
+
+
+def test_appended_rows_extend_cached_dataset(csv_file):
+    """Test that rows appended to a CSV extend the cached frame, its indexes and its summary"""
+    mcp_server.filter_data(csv_file, 'dept', 'eng')
+    assert mcp_server.analyze_csv_excel(csv_file)['rows'] == 4
+    before = mcp_server.get_cache_stats()
+    with open(csv_file, 'a') as f:
+        f.write('zoe,41,eng\nbob,29,ops\n')
+    
+    filtered = mcp_server.filter_data(csv_file, 'dept', 'eng')
+    assert [row['name'] for row in filtered['data']] == ['alice', 'tim', 'zoe']
+    dataset = mcp_server.load_dataset(csv_file)
+    assert ('index', 'dept') in dataset.derived
+    # The summary of the longer file was merged in while appending
+    digest = mcp_server.CONTENT_HASHES.digest(csv_file, mcp_server.SIDECAR_NAMESPACE)
+    assert mcp_server.SUMMARIES.get(digest) is not None
+    analysis = mcp_server.analyze_csv_excel(csv_file)
+    assert analysis['rows'] == 6
+    assert analysis['summary']['age']['max'] == 41
+    assert analysis['summary']['age']['mean'] == pytest.approx(pd.read_csv(csv_file)['age'].mean())
+    stats = mcp_server.get_cache_stats()
+    assert stats['appends'] == before['appends'] + 1
+    assert stats['invalidations'] == before['invalidations']
+
+
+def test_read_appends_rows_off_the_event_loop(csv_file, monkeypatch):
+    """Test that read_csv_excel does not append grown files on the event loop thread"""
+    asyncio.run(mcp_server.read_csv_excel(csv_file))
+    with open(csv_file, 'a') as f:
+        f.write('zoe,41,eng\n')
+    appended_on = []
+    append = mcp_server.DATASET_CACHE._append
+    monkeypatch.setattr(mcp_server.DATASET_CACHE, '_append', lambda *args: appended_on.append(
+        threading.get_ident()) or append(*args))
+    
+    async def read():
+        return threading.get_ident(), await mcp_server.read_csv_excel(csv_file)
+    loop_thread, result = asyncio.run(read())
+    assert result['rows'] == 5
+    assert appended_on and loop_thread not in appended_on
+
+
+def test_file_resource_ranges(tmp_path, monkeypatch):
+    """Test that the file resource serves bounded ranges with ETags and detects binary files"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(mcp_server, 'FILE_READER', mcp_server.FileReader(max_bytes=64))
+    (tmp_path / 'app.log').write_text(''.join(f'line {i}\n' for i in range(100)))
+    first = mcp_server.get_file_content('app.log')
+    assert first.text.startswith('line 0\n') and len(first.text) == 64
+    assert first.meta['next_offset'] == 64 and first.meta['size'] == 790
+    
+    lines = mcp_server.get_file_content('app.log?line=10&lines=2')
+    assert lines.text == 'line 10\nline 11\n'
+    assert lines.meta['next_line'] == 12
+    unchanged = mcp_server.get_file_content(f"app.log?offset=64&if_none_match={first.meta['etag']}")
+    assert unchanged.text == '' and unchanged.meta['not_modified']
+    assert 'Error' in mcp_server.get_file_content('app.log?rows=1').text
+    
+    (tmp_path / 'image.bin').write_bytes(bytes(range(256)))
+    blob = mcp_server.get_file_content('image.bin?length=16')
+    assert blob.meta['binary'] and blob.mimeType == 'application/octet-stream'
+    assert blob.blob == base64.b64encode(bytes(range(16))).decode()
+
+
+def test_evaluate_opa_policy_uses_compiled_policies():
+    """Test that the policy tool evaluates the Rego files in-process"""
+    group_member = {'user': {'role': 'user', 'groups': ['eng']}, 'document': {'group': 'eng'}}
+    assert mcp_server.evaluate_opa_policy('attribute_based', group_member)['allowed'] is True
+    assert mcp_server.evaluate_opa_policy('simple', {'user': {'role': 'user'}, 'action': 'write'})['allowed'] is False
+    assert mcp_server.evaluate_opa_policy('missing', {'user': {'role': 'admin'}})['allowed'] is False
+
+
+def test_row_level_security(tmp_path):
+    """Test that reads and filters with a subject only see the rows the policy allows"""
+    path = str(tmp_path / 'docs.csv')
+    pd.DataFrame({
+        'title': ['plan', 'budget', 'roadmap', 'payroll', 'memo'],
+        'classification_level': [1, 3, 2, 3, 0],
+        'group': ['eng', 'eng', 'ops', 'hr', 'ops'],
+    }).to_csv(path, index=False)
+    engineer = {'user': {'role': 'user', 'clearance_level': 2, 'groups': ['eng']}}
+    result = asyncio.run(mcp_server.read_csv_excel(path, subject=engineer, limit=2))
+    assert result['rows'] == 4 and [row['title'] for row in result['data']] == ['plan', 'budget']
+    following = asyncio.run(mcp_server.read_csv_excel(path, subject=engineer, limit=2, cursor=result['next_cursor']))
+    assert [row['title'] for row in following['data']] == ['roadmap', 'memo']
+    # The returned handle stays restricted for other tools
+    assert mcp_server.filter_data(result['dataset']['id'], 'group', 'hr')['rows'] == 0
+    assert mcp_server.filter_data(path, 'group', 'ops', subject=engineer)['rows'] == 2
+    assert mcp_server.filter_data(path, 'group', 'hr', subject={'user': {'role': 'admin'}})['rows'] == 1
+    assert asyncio.run(mcp_server.read_csv_excel(path, subject={'user': {'role': 'guest'}}))['rows'] == 0
+    assert asyncio.run(mcp_server.read_csv_excel(path))['rows'] == 5
+    # One mask per subject attributes, kept with the dataset
+    dataset = mcp_server.DATASET_CACHE.get(path)
+    assert len([name for name in dataset.derived if name[0] == 'policy']) == 3
+
+
+def test_evaluate_opa_policy_batch():
+    """Test that the batch tool answers with a bitmap and does not echo the inputs"""
+    user = {'user': {'role': 'user', 'department': 'eng'}, 'action': 'write'}
+    documents = [{'department': 'eng' if i % 3 == 0 else 'ops', 'id': i} for i in range(10)]
+    result = mcp_server.evaluate_opa_policy_batch('advanced', subject=user, resources=documents)
+    assert set(result) == {'policy', 'count', 'allowed_count', 'bitmap'}
+    assert unpack_bitmap(result['bitmap'], result['count']) == [i % 3 == 0 for i in range(10)]
+    inputs = [{**user, 'document': document} for document in documents]
+    assert mcp_server.evaluate_opa_policy_batch('advanced', inputs=inputs)['bitmap'] == result['bitmap']
+    assert mcp_server.evaluate_opa_policy_batch('missing', inputs=inputs)['allowed_count'] == 0
+    assert 'error' in mcp_server.evaluate_opa_policy_batch('advanced', subject=user)
+
+
+def test_evaluate_opa_policy_caches_decisions():
+    """Test that repeated questions are answered from the decision cache"""
+    before = mcp_server.get_cache_stats()['policy_decisions']
+    # simple reads input.user.role and input.action, so the other attributes share one entry
+    for request_id in range(4):
+        admin = {'user': {'role': 'admin', 'session': request_id}, 'action': 'read', 'trace': request_id}
+        assert mcp_server.evaluate_opa_policy('simple', admin)['allowed'] is True
+    assert mcp_server.evaluate_opa_policy('simple', {'user': {'role': 'admin'}, 'action': 'write'})['allowed'] is True
+    after = mcp_server.get_cache_stats()['policy_decisions']
+    assert after['misses'] - before['misses'] == 2
+    assert after['hits'] - before['hits'] == 3 and after['revision'] == mcp_server.POLICIES.revision
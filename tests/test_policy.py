@@ -0,0 +1,202 @@
+"""
+Test cases for the in-process Rego policy engine
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from policy.batch import (allow_bitmap, batch_inputs, opa_batch_decisions, opa_batch_query,
+                          unpack_bitmap)
+from policy.cache import MISSING, DecisionCache
+from policy.rego import UNDEFINED, Policy, PolicyEngine, RegoError
+from policy.rows import row_mask, subject_key
+
+POLICY_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'policies'))
+
+
+@pytest.fixture(scope='module')
+def engine():
+    """Compile the policies shipped with the server"""
+    return PolicyEngine.from_directory(POLICY_DIR)
+
+
+@pytest.mark.parametrize('package,input_data,allowed', [
+    ('simple', {'user': {'role': 'admin'}, 'action': 'delete'}, True),
+    ('simple', {'user': {'role': 'user'}, 'action': 'read'}, True),
+    ('simple', {'user': {'role': 'user'}, 'action': 'write'}, False),
+    ('simple', {}, False),
+    ('advanced', {'user': {'role': 'user', 'department': 'eng'}, 'action': 'write',
+                  'document': {'department': 'eng'}}, True),
+    ('advanced', {'user': {'role': 'user', 'department': 'eng'}, 'action': 'write',
+                  'document': {'department': 'ops'}}, False),
+    ('attribute_based', {'user': {'role': 'user', 'clearance_level': 3},
+                         'document': {'classification_level': 3}}, True),
+    ('attribute_based', {'user': {'role': 'user', 'clearance_level': 2},
+                         'document': {'classification_level': 3}}, False),
+    ('attribute_based', {'user': {'role': 'user', 'groups': ['hr', 'eng']}, 'document': {'group': 'eng'}}, True),
+    # Missing attributes leave a comparison undefined rather than defaulting to 0
+    ('attribute_based', {'user': {'role': 'user'}, 'document': {}}, False),
+])
+def test_shipped_policies(engine, package, input_data, allowed):
+    """Test the decisions of the policies in policies/"""
+    assert engine.evaluate(package, input_data) is allowed
+
+
+def test_rule_references_negation_and_values():
+    """Test helper rules, not, iteration over objects, rule values and Rego's typed equality"""
+    policy = Policy.parse('''
+package example
+import rego.v1
+
+default allow := false
+
+is_admin if { input.user.role == "admin" }
+allow if { is_admin }
+allow { not input.blocked; input.items[_].size > 2 }
+tier = "gold" { input.tags[_] == 1 }
+''')
+    assert policy.evaluate({'user': {'role': 'admin'}}) is True
+    assert policy.evaluate({'items': {'a': {'size': 1}, 'b': {'size': 3}}}) is True
+    assert policy.evaluate({'items': [{'size': 3}], 'blocked': True}) is False
+    assert policy.evaluate({'tags': [True]}, 'tier') is UNDEFINED
+    assert policy.evaluate({'tags': [1.0]}, 'tier') == 'gold'
+    assert policy.rules == ['allow', 'is_admin', 'tier']
+
+
+@pytest.mark.parametrize('source,message', [
+    ('allow { x := 1 }', 'local variables'),
+    ('a { b }\nb { a }', 'recursive'),
+    ('allow { data.admins == input.user }', 'unsupported reference'),
+    ('allow { input.groups[i] == "x" }', 'only literal keys'),
+])
+def test_unsupported_rego_is_rejected(source, message):
+    """Test that Rego outside the supported subset fails at compile time"""
+    with pytest.raises(RegoError, match=message):
+        Policy.parse('package example\n' + source)
+
+
+def test_decision_key_covers_only_attributes_read(engine):
+    """Test that decision keys ignore attributes the policy never reads"""
+    base = {'user': {'role': 'user', 'clearance_level': 2}, 'document': {'classification_level': 1}}
+    noisy = {**base, 'request_id': 'abc', 'action': 'read'}
+    assert engine.decision_key('attribute_based', base) == engine.decision_key('attribute_based', noisy)
+    # simple reads input.action, so it is part of that key
+    assert engine.decision_key('simple', base) != engine.decision_key('simple', noisy)
+    # Missing, null and differently typed values are different keys
+    keys = {engine.decision_key('simple', {'action': value}) for value in (None, 1, 1.5, True, '1')}
+    assert len(keys | {engine.decision_key('simple', {})}) == 6
+    policy = Policy.parse('package p\nhelper { input.a.b == 1 }\nallow { helper; input.a.c[_] == 2 }')
+    assert policy.decision_key({'a': {'b': 1, 'c': [2]}, 'z': 0}) == policy.decision_key({'a': {'b': 1, 'c': [2]}})
+    assert policy.decision_key({'a': {'b': {1, 2}}}) is None
+
+
+def test_decision_cache_ttl_size_and_revision():
+    """Test decision expiry, LRU eviction and the flush on a new policy revision"""
+    now = [0.0]
+    cache = DecisionCache(ttl=10, max_entries=2, clock=lambda: now[0])
+    calls = []
+
+    def decide(key, revision='r1'):
+        return cache.decide(key, revision, lambda: calls.append(key) or str(key).upper())
+
+    assert [decide('a'), decide('a'), decide('b'), decide('c'), decide('a')] == ['A'] * 2 + ['B', 'C', 'A']
+    assert calls == ['a', 'b', 'c', 'a']
+    now[0] = 11
+    decide('a')
+    decide('a', 'r2')
+    decide(None, 'r2')
+    stats = cache.stats()
+    assert calls == ['a', 'b', 'c', 'a', 'a', 'a', None]
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['expirations'], stats['flushes']) == (1, 7, 2, 1, 1)
+    assert stats['revision'] == 'r2' and stats['saved_seconds'] >= 0
+    assert cache.lookup('a', 'r3') is MISSING and cache.stats()['entries'] == 0
+
+
+def test_engine_reload_changes_revision(tmp_path):
+    """Test that edited policy files are recompiled and get a new revision"""
+    (tmp_path / 'p.rego').write_text('package p\nallow { input.x == 1 }\n')
+    engine = PolicyEngine.from_directory(str(tmp_path))
+    revision = engine.revision
+    assert engine.reload() is False
+    (tmp_path / 'p.rego').write_text('package p\nallow { input.x == 2 }\n')
+    assert engine.reload() is True and engine.revision != revision
+    assert engine.evaluate('p', {'x': 2}) is True
+    (tmp_path / 'p.rego').write_text('package p\nallow { x := 1 }\n')
+    assert engine.reload() is False and engine.evaluate('p', {'x': 2}) is True
+    (tmp_path / '.manifest').write_text('{"revision": "v7"}')
+    (tmp_path / 'p.rego').write_text('package p\nallow { input.x == 3 }\n')
+    assert engine.reload() is True and engine.revision == 'v7'
+
+
+def test_evaluate_many_matches_single_decisions(engine):
+    """Test that a batch of one subject and many resources decides like separate calls"""
+    subject = {'user': {'role': 'user', 'clearance_level': 2, 'groups': ['eng']}, 'action': 'read'}
+    resources = [{'classification_level': level % 4, 'group': group, 'id': level}
+                 for level in range(20) for group in ('eng', 'hr')]
+    batch = batch_inputs(subject=subject, resources=resources)
+    decisions = engine.evaluate_many('attribute_based', batch, vary='document')
+    assert decisions == [engine.evaluate('attribute_based', item) for item in batch]
+    assert engine.evaluate_many('attribute_based', batch) == decisions
+    packed = allow_bitmap(decisions)
+    assert packed['count'] == 40 and packed['allowed_count'] == sum(decisions)
+    assert unpack_bitmap(packed['bitmap'], packed['count']) == decisions
+    assert len(packed['bitmap']) == 8
+    with pytest.raises(ValueError, match='at most 39'):
+        batch_inputs(subject=subject, resources=resources, max_inputs=39)
+    with pytest.raises(ValueError, match='either inputs'):
+        batch_inputs(inputs=batch, resources=resources)
+
+
+def test_opa_batch_query():
+    """Test the single OPA query used by the Flask batch route"""
+    query = opa_batch_query('rbac/documents', shared=True)
+    assert 'data.rbac.documents.allow with input as doc' in query
+    assert 'object.union(input.subject' in query
+    with pytest.raises(ValueError, match='Invalid policy'):
+        opa_batch_query('simple; true')
+    response = {'result': [{'decisions': {'0': True, '2': True, '3': False}}]}
+    assert opa_batch_decisions(response, 4) == [True, False, True, False]
+    assert opa_batch_decisions({'result': []}, 2) == [False, False]
+
+
+@pytest.mark.parametrize('subject', [
+    {'user': {'role': 'user', 'clearance_level': 2, 'groups': ['eng']}},
+    {'user': {'role': 'user', 'clearance_level': 1.5, 'groups': ['hr', 'ops']}},
+    {'user': {'role': 'admin'}},
+    {'user': {'role': 'user'}},
+])
+@pytest.mark.parametrize('categorical', [False, True])
+def test_row_mask_matches_per_row_decisions(engine, subject, categorical):
+    """Test that the vectorized row filter agrees with evaluating the policy for every row"""
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({'classification_level': rng.integers(0, 4, 300).astype(float),
+                          'group': rng.choice(['eng', 'hr', 'ops'], 300)})
+    frame.loc[::7, 'classification_level'] = np.nan
+    frame.loc[::11, 'group'] = None
+    if categorical:
+        frame['group'] = frame['group'].astype('category')
+    expected = []
+    for row in frame.astype(object).to_dict('records'):
+        document = {key: value for key, value in row.items() if not pd.isna(value)}
+        expected.append(engine.evaluate('attribute_based', {**subject, 'document': document}) is True)
+    mask = row_mask(engine.policies['attribute_based'], frame, subject)
+    assert mask.tolist() == expected
+
+
+def test_row_mask_rejects_unsupported_rows():
+    """Test that policies the row filter cannot vectorize fail instead of filtering wrongly"""
+    frame = pd.DataFrame({'tags': ['a'], 'level': [1]})
+    policy = Policy.parse('package p\nallow { input.document.tags[_] == "a" }')
+    with pytest.raises(RegoError, match='input.document.<column>'):
+        row_mask(policy, frame, {})
+    policy = Policy.parse('package p\nallow { input.document.missing == 1 }\nallow { not input.document.level > 2 }')
+    assert row_mask(policy, frame, {}).tolist() == [True]
+    # Subjects differing only in attributes the policy never reads share a key
+    policy = PolicyEngine.from_directory(POLICY_DIR).policies['attribute_based']
+    assert subject_key(policy, {'user': {'role': 'user'}, 'trace': 1}) == subject_key(policy, {'user': {'role': 'user'}})